@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+"""
+比较CoreReadMixin和ORM列表查询的耗时和内存峰值, 使用临时的SQLite数据库:
+
+    python examples/benchmark_core.py --rows 20000 --limit 1000 --offset 2000
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask  # noqa: E402
+from flask_sqlalchemy import SQLAlchemy  # noqa: E402
+from marshmallow import fields  # noqa: E402
+from sqlalchemy import Column, INTEGER, VARCHAR  # noqa: E402
+from sqlalchemy.sql.operators import eq as eq_op  # noqa: E402
+
+from flask_serializer import FlaskSerializer  # noqa: E402
+from flask_serializer.func_field.filter import Filter  # noqa: E402
+from flask_serializer.func_field.query import Query  # noqa: E402
+from flask_serializer.mixins.core import CoreReadMixin  # noqa: E402
+from flask_serializer.mixins.lists import ListMixin, ListModelMixin  # noqa: E402
+
+db_file = tempfile.NamedTemporaryFile(suffix=".db", delete=False)
+db_file.close()
+
+app = Flask(__name__)
+app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///" + db_file.name
+app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+
+db = SQLAlchemy(app)
+fs = FlaskSerializer(app, strict=False)
+
+
+class Product(db.Model):
+    __tablename__ = "product"
+
+    id = Column(INTEGER, primary_key=True, autoincrement=True)
+    product_name = Column(VARCHAR(255), nullable=False)
+    sku_name = Column(VARCHAR(64), index=True, nullable=False)
+
+
+def make_schema(base, core):
+    bases = ((CoreReadMixin, ) if core else ()) + (base, fs.Schema)
+    attrs = dict(__model__=Product,
+                 id=fields.Integer(query=Query()),
+                 product_name=fields.String(query=Query()),
+                 sku_name=fields.String(query=Query(), filter=Filter(eq_op)))
+    return type("%s%sSchema" % ("Core" if core else "Orm", base.__name__), bases, attrs)()
+
+
+def measure(schema, data, repeat):
+    """:return: (平均耗时(秒), tracemalloc的内存峰值(字节))"""
+    schema.load(data)
+    db.session.remove()
+
+    start = time.perf_counter()
+    for _ in range(repeat):
+        schema.load(data)
+        db.session.remove()
+    elapsed = (time.perf_counter() - start) / repeat
+
+    tracemalloc.start()
+    schema.load(data)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    db.session.remove()
+    return elapsed, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=20000)
+    parser.add_argument("--limit", type=int, default=1000)
+    parser.add_argument("--offset", type=int, default=2000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    data = {"limit": args.limit, "offset": args.offset, "sku_name": "SKU-1"}
+    with app.app_context():
+        db.create_all()
+        db.session.bulk_insert_mappings(Product, [dict(product_name="product-%05d" % i, sku_name="SKU-%d" % (i % 2))
+                                                  for i in range(args.rows)])
+        db.session.commit()
+
+        print("%-16s %-6s %10s %10s" % ("mixin", "query", "time", "peak"))
+        for base in (ListModelMixin, ListMixin):
+            orm, core = make_schema(base, False), make_schema(base, True)
+            assert orm.dump(orm.load(data), many=True) == core.dump(core.load(data), many=True)
+            for name, schema in (("ORM", orm), ("Core", core)):
+                elapsed, peak = measure(schema, data, args.repeat)
+                print("%-16s %-6s %8.2fms %8.0fKB" % (base.__name__, name, elapsed * 1000, peak / 1024.0))
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    finally:
+        os.remove(db_file.name)
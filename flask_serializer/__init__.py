@@ -1,12 +1,34 @@
 # -*- coding: utf-8 -*-
 
-from collections import OrderedDict
+import logging
+import threading
+import time
+from collections import OrderedDict, namedtuple
 
-from flask import Flask
+from flask import Flask, current_app
 from marshmallow.schema import SchemaMeta, BaseSchema as _BaseSchema
 from six import string_types
+from sqlalchemy.orm import configure_mappers
 
+from flask_serializer.cache_object.cached import model_registry
+from flask_serializer.cli import serializer_cli
 from flask_serializer.mixins import _MixinBase
+from flask_serializer.mixins.details import DetailMixIn
+from flask_serializer.mixins.lists import ListBase
+from flask_serializer.utils import advisor, query_log
+from flask_serializer.utils.fragment_cache import FragmentCache
+
+
+logger = logging.getLogger("flask_serializer")
+
+# 所有带有__model__的schema类, 用于warmup
+schema_registry = []
+
+# warmup的结果, error为拼接SQL时出现的异常(依赖请求参数的KeyError除外)
+WarmupResult = namedtuple("WarmupResult", ("seconds", "error"))
+
+# 多个线程同时第一次实例化同一个schema时, 只能有一个线程初始化功能性field; 父类在子类的锁中初始化, 所以需要可重入
+_finalize_lock = threading.RLock()
 
 
 # 重写metaclass, 处理一些fields
@@ -16,19 +38,21 @@ class NewSchemaMeta(SchemaMeta):
 
     def _init_function_field(self):
         if not getattr(self, "__model__", None):
-            return (), (), ()
+            return (), (), (), ()
 
         filter_fields = getattr(self, "filter_fields", tuple())
         query_fields = getattr(self, "query_fields", tuple())
         foreign_fields = getattr(self, "foreign_fields", tuple())
+        loader_fields = getattr(self, "loader_fields", tuple())
 
         func_fields = OrderedDict(
-            filter=filter_fields, query=query_fields, foreign=foreign_fields)
+            filter=filter_fields, query=query_fields, foreign=foreign_fields, loader=loader_fields)
 
         for field_name, field_obj in self._declared_fields.items():
-            for func_name in ("filter", "query", "foreign"):
+            for func_name in ("filter", "query", "foreign", "loader"):
                 field = self.init_filed_function_instance(func_name, field_name, field_obj, self.db, self.__model__)
-                if field:
+                # 父类的field也在_declared_fields中, 不能重复添加
+                if field and field not in func_fields[func_name]:
                     func_fields[func_name] += (field,)
 
         return func_fields.values()
@@ -49,7 +73,6 @@ class NewSchemaMeta(SchemaMeta):
             return
 
         model = self.__model__
-        self.filter_fields, self.query_fields, self.foreign_fields = self._init_function_field()
 
         # DO NOT OVERRIDE property description, there is NO instance yet
         # self.model = model
@@ -58,6 +81,70 @@ class NewSchemaMeta(SchemaMeta):
         else:
             self._model = model
 
+        # 功能性field的初始化推迟到第一次实例化或者warmup时进行
+        self._finalized = False
+        schema_registry.append(self)
+
+    def __call__(self, *args, **kwargs):
+        if self.__dict__.get("_finalized") is False:
+            self._finalize()
+        return super(NewSchemaMeta, self).__call__(*args, **kwargs)
+
+    def _finalize(self):
+        """初始化功能性field, 父类先于子类初始化, 保证子类能继承父类的功能性field"""
+        with _finalize_lock:
+            # 等待锁的时候可能已经被其他线程初始化了
+            if self.__dict__.get("_finalized") is not False:
+                return
+
+            for base in reversed(self.__mro__[1:]):
+                if isinstance(base, NewSchemaMeta) and base.__dict__.get("_finalized") is False:
+                    base._finalize()
+
+            self.filter_fields, self.query_fields, self.foreign_fields, self.loader_fields = \
+                self._init_function_field()
+            self._finalized = True
+
+        if getattr(self, "_index_advisor", False):
+            advisor.warn(advisor.advise(self))
+
+    def _warmup(self):
+        """
+        在fork之前做完第一次请求时才会做的事情:
+            1. 初始化功能性field
+            2. 解析__model__和func field的Column, 外键信息
+            3. 实例化一次, 生成marshmallow的field映射, 解析主键
+            4. 编译一次没有参数时的SQL, 填充SQLAlchemy中各种memoized属性
+        :return: 拼接SQL时出现的异常, 没有则返回None
+        """
+        if self.__dict__.get("_finalized") is False:
+            self._finalize()
+
+        if getattr(self, "_model", None) is None and getattr(self, "_model_str", None):
+            self._model = model_registry(self.db.Model)[self._model_str]
+
+        for func_field in tuple(self.filter_fields) + tuple(self.query_fields) + tuple(self.foreign_fields) + \
+                tuple(self.loader_fields):
+            func_field.warmup()
+
+        instance = self()
+        if isinstance(instance, DetailMixIn):
+            # 主键缓存在类上, 所有实例共享
+            self._pk_field = instance.pk_field
+
+        if isinstance(instance, ListBase):
+            try:
+                query = instance.filtered_query({})
+                query.statement.compile(dialect=self.db.engine.dialect)
+            except KeyError:
+                # 一些schema的modify_before_query等方法依赖请求参数, 没有参数时不能拼接SQL, 跳过即可
+                pass
+            except Exception as e:
+                # 其他异常通常是配置错误(例如Query/Filter的列不存在), 不能等到第一次请求才发现
+                logger.exception("warmup %s时拼接SQL失败", self.__name__)
+                return e
+        return None
+
 
 class BaseSchema(_BaseSchema):
     pass
@@ -71,16 +158,21 @@ def make_meta(meta):
     return type("Meta", (), meta)
 
 
-def schema_maker(db, meta):
+def schema_maker(db, meta, index_advisor=False, fragment_cache=None, statement_timeout=None):
     """
     create a Schema class with db bind
     :param db:
     :param meta: dict key value in class Meta
+    :param index_advisor: 初始化schema时是否检查索引
+    :param fragment_cache: FragmentCacheMixin使用的FragmentCache
+    :param statement_timeout: 默认的语句超时(秒), schema中可以使用statement_timeout覆盖
     :return:
     """
     # meta["db"] = db
     meta = make_meta(meta)
-    return NewSchemaMeta("BaseSchema", (BaseSchema,), dict(Meta=meta, db=db))
+    return NewSchemaMeta("BaseSchema", (BaseSchema,), dict(Meta=meta, db=db, _index_advisor=index_advisor,
+                                                           fragment_cache=fragment_cache,
+                                                           statement_timeout=statement_timeout))
 
 
 class FlaskSerializer(object):
@@ -88,9 +180,11 @@ class FlaskSerializer(object):
         """
         :param schema_meta: meta config for marshmallow Schema
         """
+        self.app = app
         self.db = db
         self.schema_meta = schema_meta
         self.Schema = None
+        self.fragment_cache = None
         if app is not None:
             self.init_app(app)
 
@@ -107,7 +201,44 @@ class FlaskSerializer(object):
             _sa = app.extensions["sqlalchemy"]
             self.db = db = _sa.db
 
-        schema_class = schema_maker(db, self.schema_meta)
+        if self.fragment_cache is None:
+            self.fragment_cache = FragmentCache(backend=app.config.get("SERIALIZER_FRAGMENT_CACHE_BACKEND"),
+                                                maxsize=app.config.get("SERIALIZER_FRAGMENT_CACHE_SIZE", 1024))
+        if app.config.get("SERIALIZER_FRAGMENT_CACHE_BACKEND") is not None:
+            # 共享的缓存可能被其他进程写入, 只修改数据不dump的进程也需要移出缓存; 进程内的缓存在第一次dump时安装
+            self.fragment_cache.install(db.session)
+
+        schema_class = schema_maker(db, self.schema_meta, app.config.get("SERIALIZER_INDEX_ADVISOR", False),
+                                    self.fragment_cache, app.config.get("SERIALIZER_STATEMENT_TIMEOUT"))
         # FieldFunctionBase.db = db
         app.extensions['flaskserializer'] = schema_class
         self.Schema = schema_class
+
+        app.cli.add_command(serializer_cli)
+
+        if app.config.get("SERIALIZER_SQL_COMMENT") or app.config.get("SERIALIZER_SLOW_QUERY_THRESHOLD") is not None:
+            with app.app_context():
+                query_log.install(db.engine,
+                                  comment=app.config.get("SERIALIZER_SQL_COMMENT", False),
+                                  slow_threshold=app.config.get("SERIALIZER_SLOW_QUERY_THRESHOLD"),
+                                  explain=app.config.get("SERIALIZER_SLOW_QUERY_EXPLAIN", False))
+
+    def warmup(self, app=None):
+        """
+        在fork之前(如gunicorn的preload_app)调用, 提前完成所有schema的初始化工作,
+        避免每个worker在第一次请求时重复这些工作, 也能保持copy-on-write的内存页共享
+        :return: OrderedDict, schema类 -> WarmupResult(耗时(秒), 拼接SQL时出现的异常或者None)
+        """
+        app = app or self.app or current_app
+        report = OrderedDict()
+
+        with app.app_context():
+            configure_mappers()
+            for schema_class in schema_registry:
+                if schema_class.db is not self.db:
+                    continue
+                start = time.time()
+                error = schema_class._warmup()
+                report[schema_class] = WarmupResult(time.time() - start, error)
+
+        return report
@@ -1,6 +1,14 @@
 from six import string_types
 
 
+def model_registry(base):
+    """declarative base中 类名 -> 模型 的映射"""
+    registry = getattr(base, "_decl_class_registry", None)
+    if registry is None:
+        registry = base.registry._class_registry  # SQLAlchemy 1.4+
+    return registry
+
+
 class CachedModel(object):
     # _model_str, _model, _column_str, _column = None
 
@@ -15,7 +23,7 @@ class CachedModel(object):
 
         model_str = instance._model_str
 
-        instance._model = instance.db.Model._decl_class_registry[model_str]
+        instance._model = model_registry(instance.db.Model)[model_str]
         return instance._model
 
     def __set__(self, instance, value):
@@ -31,6 +39,11 @@ class CachedField(object):
         if getattr(instance, "_column", None) is not None:
             return instance._column
 
+        if getattr(instance, "_column_factory", None) is not None:
+            # SQL表达式, 等到模型可以解析时再生成
+            instance._column = instance._column_factory(instance.model)
+            return instance._column
+
         if instance._column_str is None:
             instance._column_str = instance.field_name
 
@@ -53,7 +66,10 @@ class CachedField(object):
                 model = instance.model
                 column = getattr(model, value)
 
-        value 非字符串: Mapper.column对象
+        value 函数: 接收模型, 返回SQL表达式(计算列, 聚合或者关联子查询)
+            1. instance._column_factory = value
+
+        value 非字符串: Mapper.column对象或者SQL表达式
             1. instance._cache = value
         :param instance:
         :param value:
@@ -70,4 +86,8 @@ class CachedField(object):
                 instance._column_str = value
             return
 
+        if callable(value) and not hasattr(value, "__clause_element__"):
+            instance._column_factory = value
+            return
+
         setattr(instance, "_column", value)
@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+import click
+from flask import current_app
+from flask.cli import AppGroup
+
+serializer_cli = AppGroup("serializer", help="flask-serializer的命令")
+
+
+def registered_schemas():
+    """当前app的db所注册的schema类"""
+    from flask_serializer import schema_registry
+
+    db = current_app.extensions["flaskserializer"].db
+    return [schema_class for schema_class in schema_registry if schema_class.db is db]
+
+
+@serializer_cli.command("indexes")
+def indexes_command():
+    """检查所有schema的Filter/排序/查询字段是否有索引"""
+    from flask_serializer.utils.advisor import report
+
+    lines = report(registered_schemas())
+    if not lines:
+        click.echo("没有发现问题")
+    for line in lines:
+        click.echo(line)
+
+
+def find_schema(name):
+    """根据类名或者"模块.类名"找到注册的schema"""
+    for schema_class in registered_schemas():
+        if name in (schema_class.__name__, "%s.%s" % (schema_class.__module__, schema_class.__name__)):
+            return schema_class
+    raise click.BadParameter("找不到schema: %s" % name, param_hint="SCHEMA")
+
+
+@serializer_cli.command("ingest")
+@click.argument("schema")
+@click.argument("path", type=click.Path(exists=True, dir_okay=False))
+@click.option("--format", "fmt", type=click.Choice(["ndjson", "csv"]), default=None, help="默认根据扩展名判断")
+@click.option("--errors", default=None, help="错误文件, 默认为<PATH>.errors.ndjson")
+@click.option("--processes", type=int, default=None, help="验证使用的进程数, 默认为CPU核数")
+@click.option("--chunk-size", type=int, default=None, help="每一块的行数")
+def ingest_command(schema, path, fmt, errors, processes, chunk_size):
+    """使用IngestMixin的schema从NDJSON/CSV文件批量导入数据"""
+    from flask_serializer.mixins.ingest import IngestMixin
+
+    schema_class = find_schema(schema)
+    if not issubclass(schema_class, IngestMixin):
+        raise click.BadParameter("%s没有使用IngestMixin" % schema_class.__name__, param_hint="SCHEMA")
+
+    errors = errors or path + ".errors.ndjson"
+
+    def progress(result):
+        click.echo("已读取%d行, 写入%d行, 拒绝%d行" % result, err=True)
+
+    result = schema_class().ingest(path, fmt=fmt, errors=errors, processes=processes, chunk_size=chunk_size,
+                                   progress=progress)
+    click.echo("完成: 读取%d行, 写入%d行, 拒绝%d行" % result)
+    if result.rejected:
+        click.echo("被拒绝的数据见%s" % errors)
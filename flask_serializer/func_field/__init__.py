@@ -4,16 +4,23 @@ from flask_serializer.cache_object.cached import CachedModel, CachedField
 class FieldFunctionBase(object):
     """
     这里类只能在filed中发光发热, 不能单独使用
+
+    每个字段都会有一个实例, 使用__slots__而不是__dict__保存属性, 子类也需要声明自己的__slots__
     """
 
-    db = None
+    __slots__ = ("_model", "_model_str", "_column", "_column_str", "_first_set", "_column_factory", "field_name")
 
-    _model_str = _column_str = field_name = None  # type: str
+    db = None
 
     model = CachedModel()
 
     column = CachedField()
 
+    def __init__(self):
+        self._model = self._model_str = self._column = self._column_str = None
+        self._first_set = self._column_factory = None
+        self.field_name = None  # type: str
+
     def full_init_self(self, db, field_name, model):
         """cls hold db while self hold field_name, and model"""
         if not self.db:
@@ -21,3 +28,7 @@ class FieldFunctionBase(object):
 
         self.field_name = field_name
         self.model = model  # property
+
+    def warmup(self):
+        """提前解析model和column, 而不是等到第一次请求"""
+        return self.model, self.column
@@ -25,9 +25,17 @@ PROCESSOR[ilike_op] = _like_right_side
 class Filter(FieldFunctionBase):
     """当一个字段被传入, 应该使用Filter来制造一个传入Query.filter的对象"""
 
-    def __init__(self, operator, field=None, value_process=True, default=Empty, **extra):
-        """:type operator callable"""
+    __slots__ = ("having", "operator", "extra", "value_process", "default")
+
+    def __init__(self, operator, field=None, value_process=True, default=Empty, having=False, **extra):
+        """
+        :type operator callable
+        :param field: 和Query一样, 可以是列名, SQL表达式或者接收模型返回SQL表达式的函数
+        :param having: field是聚合函数时, 条件需要放在HAVING中
+        """
+        super(Filter, self).__init__()
         self.column = field
+        self.having = having
         self.operator = operator
         self.extra = extra
         self.value_process = value_process
@@ -4,7 +4,10 @@ from . import FieldFunctionBase
 
 class Foreign(FieldFunctionBase):
 
+    __slots__ = ("_is_init", "one_table", "many_table", "many_primary_key", "one_primary_key")
+
     def __init__(self, foreign_key_column):
+        super(Foreign, self).__init__()
         self.column = foreign_key_column
         self._is_init = False
 
@@ -28,6 +31,12 @@ class Foreign(FieldFunctionBase):
             raise ValueError("{}找不到主键".format(self.many_table.name))
 
         self.one_primary_key = self.many_table.primary_key.columns_autoinc_first[0]
+        self._is_init = True
+
+    def warmup(self):
+        super(Foreign, self).warmup()
+        if not self._is_init:
+            self._init_foreign()
 
     def foreign_check(self, foreign_ids):
         """
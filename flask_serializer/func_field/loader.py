@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+from collections import defaultdict
+
+from flask import g
+from sqlalchemy import select
+
+from . import FieldFunctionBase
+
+
+class Loader(FieldFunctionBase):
+    """
+    dump时批量获取关联的数据, 需要配合LoaderMixin使用. 一页数据中所有的key只查询一次:
+
+        SELECT product.id, product.product_name FROM product WHERE product.id IN (<这一页所有的product_id>)
+
+    同一个请求中已经查询过的key会被缓存在flask.g中
+    """
+
+    __slots__ = ("key", "target_key", "many", "default")
+
+    def __init__(self, field, key, target_key=None, many=False, default=None):
+        """
+        :param field: 需要获取的列, 可以是列或者"Model.column"
+        :param key: dump的对象上保存关联值的属性名, 例如"product_id"
+        :param target_key: 和key对应的列, 默认为field所在表的主键
+        :param many: 一个key对应多行时为True, 结果为列表
+        :param default: 找不到关联数据时的值
+        """
+        super(Loader, self).__init__()
+        self.column = field
+        self.key = key
+        self.target_key = target_key
+        self.many = many
+        self.default = default
+
+    def _target_key(self):
+        if self.target_key is not None:
+            return self.target_key
+
+        column = self.column
+        if hasattr(column, "__clause_element__"):
+            column = column.__clause_element__()
+        primary_key = list(column.table.primary_key.columns)
+        if len(primary_key) != 1:
+            raise ValueError("{}主键不唯一, 需要设置target_key".format(column.table.name))
+        self.target_key = primary_key[0]
+        return self.target_key
+
+    def _memo(self):
+        """当前请求(app context)中已经查询过的结果"""
+        memo = g.setdefault("_flask_serializer_loader", {})
+        return memo.setdefault(self, {})
+
+    def prime(self, objs):
+        """查询objs中所有还没有查询过的key"""
+        memo = self._memo()
+        keys = set()
+        for obj in objs:
+            value = getattr(obj, self.key, None)
+            if value is not None and value not in memo:
+                keys.add(value)
+
+        if keys:
+            target_key = self._target_key()
+            rows = self.db.session.execute(select([target_key, self.column]).where(target_key.in_(keys)))
+            if self.many:
+                loaded = defaultdict(list)
+                for key, value in rows:
+                    loaded[key].append(value)
+            else:
+                loaded = dict(rows.fetchall())
+            for key in keys:
+                memo[key] = loaded.get(key, [] if self.many else self.default)
+
+    def resolve(self, obj):
+        key = getattr(obj, self.key, None)
+        if key is None:
+            return [] if self.many else self.default
+        return self._memo().get(key, [] if self.many else self.default)
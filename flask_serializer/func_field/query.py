@@ -1,14 +1,32 @@
 # -*- coding: utf-8 -*-
+from sqlalchemy.orm.attributes import QueryableAttribute
+
 from . import FieldFunctionBase
 
 
 class Query(FieldFunctionBase):
+    """
+    ListMixin需要查询的列, field可以是:
+        - None: 模型中和字段同名的列
+        - 字符串: 模型中的列名, 或者"Model.column"
+        - SQL表达式, 或者接收模型返回SQL表达式的函数, 在数据库中计算, 例如:
+
+            total_price = fields.Decimal(query=Query(lambda m: m.price * m.quantities))
+            line_count = fields.Integer(query=Query(lambda m: select([func.count(OrderLine.id)])
+                                                    .where(OrderLine.order_id == m.id).as_scalar()))
+    """
+
+    __slots__ = ("label",)
 
     def __init__(self, field=None, label=None):
+        super(Query, self).__init__()
         self.column = field
         self.label = label
 
     def to_query(self):
         if self.column is None:
             self.column = getattr(self.model, self.field_name)
-        return self.column.label(self.label) if self.label else self.column
+        column = self.column
+        # 表达式没有名字, 默认使用字段名, 这样查询结果才能被dump
+        label = self.label or (None if isinstance(column, QueryableAttribute) else self.field_name)
+        return column.label(label) if label else column
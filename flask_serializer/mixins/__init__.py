@@ -1,6 +1,8 @@
 from marshmallow import post_load
 
 from flask_serializer.cache_object.cached import CachedModel
+from flask_serializer.utils.query_log import sql_context
+from flask_serializer.utils.timeout import statement_timeout
 
 
 class _MixinBase(object):
@@ -10,6 +12,15 @@ class _MixinBase(object):
 
     model = CachedModel()
 
+    def load(self, data, *args, **kwargs):
+        # 给load过程中执行的SQL加上schema的注释, timeout为这次load的语句超时(秒), 默认使用schema的statement_timeout
+        timeout = kwargs.pop("timeout", None)
+        with sql_context(self), statement_timeout(self, self._statement_timeout(timeout), data):
+            return super(_MixinBase, self).load(data, *args, **kwargs)
+
+    def _statement_timeout(self, timeout):
+        return getattr(self, "statement_timeout", None) if timeout is None else timeout
+
     @post_load
     def make_queries(self, data, **kwargs):
         """
@@ -0,0 +1,186 @@
+import csv
+import io
+
+from sqlalchemy import types
+
+from flask_serializer.mixins.lists import ListMixin
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover
+    np = None
+
+try:
+    import pyarrow as pa
+except ImportError:  # pragma: no cover
+    pa = None
+
+ARROW = "arrow"
+NUMPY = "numpy"
+CSV = "csv"
+
+ARROW_MIMETYPE = "application/vnd.apache.arrow.stream"
+CSV_MIMETYPE = "text/csv"
+
+
+def _numpy_dtype(sa_type):
+    if isinstance(sa_type, types.Boolean):
+        return "bool"
+    if isinstance(sa_type, types.Integer):
+        return "int64"
+    if isinstance(sa_type, (types.Float, types.Numeric)):
+        return "float64"
+    if isinstance(sa_type, types.DateTime):
+        return "datetime64[us]"
+    if isinstance(sa_type, types.Date):
+        return "datetime64[D]"
+    return object
+
+
+def _arrow_type(sa_type):
+    """返回None表示让arrow根据第一批数据推断"""
+    if isinstance(sa_type, types.Boolean):
+        return pa.bool_()
+    if isinstance(sa_type, types.Integer):
+        return pa.int64()
+    if isinstance(sa_type, types.Float):
+        return pa.float64()
+    if isinstance(sa_type, types.Numeric):
+        # 精度取最大, 避免由第一批数据推断出的精度装不下之后的数据
+        return pa.decimal128(38, sa_type.scale) if sa_type.scale is not None else None
+    if isinstance(sa_type, types.DateTime):
+        return pa.timestamp("us")
+    if isinstance(sa_type, types.Date):
+        return pa.date32()
+    if isinstance(sa_type, types.String):
+        return pa.string()
+    return None
+
+
+def _numpy_array(values, dtype):
+    try:
+        return np.asarray(values, dtype=dtype)
+    except (TypeError, ValueError):
+        # 有NULL值的整数列/布尔列等
+        return np.asarray(values, dtype=object)
+
+
+class ColumnarMixin(ListMixin):
+    """
+    列式输出, 不再为每一行构造dict, 而是按批从游标中取出元组, 转置成有类型的列数组
+
+    - `load_columns(data)`: 有pyarrow时返回pyarrow.Table, 否则返回{列名: numpy数组}
+
+    - `dump_columns(data)`: 序列化成Arrow IPC流, 没有pyarrow时使用CSV, 返回(bytes, mimetype)
+
+    列的名字和类型由query_fields(Query的label或者字段名)决定
+    """
+
+    columnar_batch_size = 10000
+
+    def column_info(self, query):
+        """:return: [(列名, SQLAlchemy类型), ...]"""
+        return [(desc["name"], desc["type"]) for desc in query.column_descriptions]
+
+    def iter_column_batches(self, data, transpose=True):
+        """
+        按批执行查询, 每一批都转置成列
+        :param transpose: 为False时不转置, 直接产出这一批的行
+        :return: (列信息, 生成器), 生成器每次产出一个列元组的元组
+        """
+        query = self.to_sql(data)
+        columns = self.column_info(query)
+        result = self.db.session.execute(query.statement)
+
+        def batches():
+            try:
+                while True:
+                    rows = result.fetchmany(self.columnar_batch_size)
+                    if not rows:
+                        return
+                    yield tuple(zip(*rows)) if transpose else rows
+            finally:
+                result.close()
+
+        return columns, batches()
+
+    def load_columns(self, data, backend=None, **kwargs):
+        """
+        :param data: 未经验证的查询参数
+        :param backend: arrow 或者 numpy, 默认有pyarrow时使用arrow
+        """
+        backend = backend or (ARROW if pa is not None else NUMPY)
+        data = self.load_data(data, **kwargs)
+        columns, batches = self.iter_column_batches(data)
+
+        if backend == ARROW:
+            if pa is None:
+                raise ImportError("使用arrow输出需要安装pyarrow")
+            arrow_schema, record_batches = self._arrow_batches(columns, batches)
+            return pa.Table.from_batches(list(record_batches), schema=arrow_schema)
+
+        if backend == NUMPY:
+            if np is None:
+                raise ImportError("使用numpy输出需要安装numpy")
+            chunks = [[] for _ in columns]
+            for batch in batches:
+                for chunk, (_, sa_type), values in zip(chunks, columns, batch):
+                    chunk.append(_numpy_array(values, _numpy_dtype(sa_type)))
+            return {
+                name: np.concatenate(chunk) if chunk else np.asarray([], dtype=_numpy_dtype(sa_type))
+                for (name, sa_type), chunk in zip(columns, chunks)
+            }
+
+        raise ValueError("不支持的列式输出%s" % backend)
+
+    def _arrow_batches(self, columns, batches):
+        """第一批决定arrow schema(推断未知类型), 之后的每一批都按这个schema构造"""
+        names = [name for name, _ in columns]
+        arrow_types = [_arrow_type(sa_type) for _, sa_type in columns]
+
+        first = next(batches, None)
+        if first is None:
+            arrow_schema = pa.schema([(name, arrow_type or pa.null()) for name, arrow_type in zip(names, arrow_types)])
+            return arrow_schema, iter(())
+
+        first_batch = pa.RecordBatch.from_arrays(
+            [pa.array(values, type=arrow_type) for values, arrow_type in zip(first, arrow_types)], names=names)
+        arrow_schema = first_batch.schema
+
+        def record_batches():
+            yield first_batch
+            for batch in batches:
+                yield pa.RecordBatch.from_arrays(
+                    [pa.array(values, type=field.type) for values, field in zip(batch, arrow_schema)],
+                    schema=arrow_schema)
+
+        return arrow_schema, record_batches()
+
+    def dump_columns(self, data, fmt=None, **kwargs):
+        """
+        :param fmt: arrow 或者 csv, 默认有pyarrow时使用arrow
+        :return: (bytes, mimetype)
+        """
+        fmt = fmt or (ARROW if pa is not None else CSV)
+        data = self.load_data(data, **kwargs)
+        columns, batches = self.iter_column_batches(data, transpose=fmt != CSV)
+
+        if fmt == ARROW:
+            if pa is None:
+                raise ImportError("使用arrow输出需要安装pyarrow")
+            arrow_schema, record_batches = self._arrow_batches(columns, batches)
+            sink = pa.BufferOutputStream()
+            with pa.ipc.new_stream(sink, arrow_schema) as writer:
+                for record_batch in record_batches:
+                    writer.write_batch(record_batch)
+            return sink.getvalue().to_pybytes(), ARROW_MIMETYPE
+
+        if fmt == CSV:
+            f = io.StringIO()
+            writer = csv.writer(f)
+            writer.writerow([name for name, _ in columns])
+            for rows in batches:
+                writer.writerows(rows)
+            return f.getvalue().encode("utf-8"), CSV_MIMETYPE
+
+        raise ValueError("不支持的列式输出%s" % fmt)
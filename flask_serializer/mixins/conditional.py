@@ -0,0 +1,88 @@
+import datetime
+import hashlib
+import json
+
+from flask import Response, request
+from sqlalchemy import func, types
+
+from flask_serializer.mixins.lists import ListBase
+from flask_serializer.utils.response import dump_response
+
+
+class ConditionalMixin(ListBase):
+    """
+    HTTP条件请求(ETag/Last-Modified), 数据没有变化时返回304, 不再执行分页查询和dump
+
+    使用和列表查询相同的过滤条件, 执行一条很便宜的聚合查询: `SELECT max(update_date), count(*) ... WHERE <filters>`,
+    再加上schema和请求参数生成ETag. mixin应该放在ListMixin/ListModelMixin之前
+
+        @app.route("/products")
+        def products():
+            return ProductListSchema().conditional_response()
+
+    **特别说明**:
+        - fingerprint_column的精度决定了能否发现修改, 必须是DateTime类型的列, 并且每次修改都会更新;
+          DATE类型的列在同一天内的修改不会改变ETag, 会抛出ValueError
+    """
+
+    fingerprint_column = "update_date"
+
+    @property
+    def fingerprint_update_column(self):
+        column = getattr(self.model, self.fingerprint_column)
+        if isinstance(column.type, types.Date):
+            raise ValueError("ConditionalMixin的fingerprint_column(%s.%s)不能是DATE类型, 需要精确的DateTime"
+                             % (self.model.__name__, self.fingerprint_column))
+        return column
+
+    def fingerprint(self, data):
+        """:return: (最后修改时间, 行数)"""
+        column = self.fingerprint_update_column
+        return self.filtered_query(data).with_entities(func.max(column), func.count()).one()
+
+    def make_etag(self, data, fingerprint):
+        last_modified, count = fingerprint
+        value = json.dumps([type(self).__module__, type(self).__name__, data,
+                            last_modified, count], sort_keys=True, default=str)
+        return hashlib.md5(value.encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def _last_modified(value):
+        if value is None:
+            return None
+        if not isinstance(value, datetime.datetime):
+            value = datetime.datetime(value.year, value.month, value.day)
+        # HTTP日期的精度为秒
+        return value.replace(microsecond=0)
+
+    def not_modified(self, etag, last_modified):
+        """判断当前请求是否可以返回304, If-None-Match优先于If-Modified-Since"""
+        if request.if_none_match:
+            return request.if_none_match.contains(etag)
+
+        if_modified_since = request.if_modified_since
+        if if_modified_since is not None and last_modified is not None:
+            return last_modified <= if_modified_since.replace(tzinfo=None)
+        return False
+
+    def conditional_response(self, data=None, **kwargs):
+        """
+        :param data: 未经验证的查询参数, 默认为request.args
+        :return: 304的Response, 或者dump了查询结果并带有ETag/Last-Modified的Response
+        """
+        data = self.load_data(request.args.to_dict() if data is None else data, **kwargs)
+
+        fingerprint = self.fingerprint(data)
+        etag = self.make_etag(data, fingerprint)
+        last_modified = self._last_modified(fingerprint[0])
+
+        if self.not_modified(etag, last_modified):
+            response = Response(status=304)
+        else:
+            result = self.make_queries(data)
+            response = dump_response(self, result, many=isinstance(result, list))
+
+        response.set_etag(etag)
+        if last_modified is not None:
+            response.last_modified = last_modified
+        return response
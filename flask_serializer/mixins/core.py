@@ -0,0 +1,64 @@
+from marshmallow import post_load
+from sqlalchemy import select
+
+from flask_serializer.mixins.lists import ListBase
+
+
+class CoreReadMixin(ListBase):
+    """
+    只读的列表查询: 使用Core的select()拼接SQL, 在连接池的连接上直接执行, 不经过session,
+    没有autoflush, ORM查询编译和identity map的开销, 返回轻量的行(或者dict). mixin应该放在ListMixin/ListModelMixin之前
+
+        SELECT <query_fields或者模型所有的列> FROM ... WHERE <filter_fields> ORDER BY ... LIMIT ... OFFSET ...
+
+    **特别说明**:
+        - 不在session的事务中执行, 看不到session中还没有提交的修改
+
+        - ListModelMixin也返回行而不是模型实例
+
+        - JOIN等需要在modify_before_select中修改select; 只重写了modify_before_query时, 使用ORM拼接SQL, 但依然不经过session执行
+    """
+
+    core_as_dict = False  # 为True时返回dict
+
+    def modify_before_select(self, statement, data):
+        """和modify_before_query一样, 修改的是Core的select"""
+        return statement
+
+    def _uses_query_hook(self):
+        cls = type(self)
+        return cls.modify_before_query is not ListBase.modify_before_query and \
+            cls.modify_before_select is CoreReadMixin.modify_before_select
+
+    def core_select(self, data):
+        if self._uses_query_hook():
+            return self.to_sql(data).statement
+
+        columns = [query_field.to_query() for query_field in self.query_fields] or \
+            list(self.model.__table__.columns)
+        statement = select(columns).select_from(self.model.__table__)
+        statement = self.modify_before_select(statement, data)
+        statement = statement.where(self.get_filters(data))
+
+        having = self.get_having(data)
+        if having is not None:
+            statement = statement.having(having)
+
+        order_by = self.order_by(data)
+        statement = statement.order_by(*(order_by if isinstance(order_by, (list, tuple)) else [order_by]))
+        return self.modify_after_query(statement, data)
+
+    def core_execute(self, data):
+        engine = self.db.get_engine(bind=getattr(self.model, "__bind_key__", None))
+        with engine.connect() as connection:
+            rows = connection.execute(self.core_select(data)).fetchall()
+        if self.core_as_dict:
+            # SQLAlchemy 1.4之后Row需要通过_mapping转换为dict
+            return [dict(getattr(row, "_mapping", row)) for row in rows]
+        return rows
+
+    @post_load
+    def make_queries(self, data, **kwargs):
+        if self._load_data_only:
+            return data
+        return self.core_execute(data)
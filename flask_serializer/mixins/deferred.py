@@ -0,0 +1,45 @@
+from sqlalchemy import and_, inspect
+
+from flask_serializer.mixins.lists import ListBase
+
+
+class DeferredJoinMixin(ListBase):
+    """
+    OFFSET很大时, 数据库需要读取并丢弃前面所有的整行. 使用延迟JOIN, 先只查询这一页的主键(可以只扫描索引),
+    再JOIN回原来的表查询整行, mixin应该放在ListMixin/ListModelMixin之前:
+
+        SELECT product.* FROM product
+        JOIN (SELECT id FROM product WHERE ... ORDER BY ..., id LIMIT 10 OFFSET 100000) AS page ON product.id = page.id
+        WHERE ... ORDER BY ..., product.id
+
+    **特别说明**:
+        - 主键会被加在排序的最后, 保证分页的顺序是确定的
+
+        - modify_before_query中的JOIN不能使一行变成多行(例如一对多的JOIN), 否则主键会重复
+    """
+
+    deferred_join_offset = 0  # offset大于等于这个值时才使用延迟JOIN
+
+    def use_deferred_join(self, data):
+        offset = data.get("offset")
+        return offset is not None and offset >= self.deferred_join_offset
+
+    def _order_by_clauses(self, data):
+        order_by = self.order_by(data)
+        return list(order_by) if isinstance(order_by, (list, tuple)) else [order_by]
+
+    def to_sql(self, data):
+        if not self.use_deferred_join(data):
+            return super(DeferredJoinMixin, self).to_sql(data)
+
+        primary_key = list(inspect(self.model).primary_key)
+        order_by = self._order_by_clauses(data) + primary_key
+        labels = ["_deferred_pk_%d" % i for i in range(len(primary_key))]
+
+        page = self.filtered_query(data) \
+            .with_entities(*[column.label(label) for column, label in zip(primary_key, labels)]) \
+            .order_by(*order_by)
+        page = self.modify_after_query(page, data).subquery("deferred_page")
+
+        on = and_(*[column == page.c[label] for column, label in zip(primary_key, labels)])
+        return self.filtered_query(data).join(page, on).order_by(*order_by)
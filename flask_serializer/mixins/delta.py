@@ -0,0 +1,112 @@
+import base64
+import json
+from collections import namedtuple
+
+from marshmallow import fields, post_load
+from marshmallow.exceptions import ValidationError
+from sqlalchemy import inspect, tuple_, types
+
+from flask_serializer.mixins.lists import ListBase
+
+Delta = namedtuple("Delta", ("rows", "tombstones", "since"))
+
+
+class DeltaMixin(ListBase):
+    """
+    增量同步, 只返回水位线(update_date, 主键)之后变化的行, 按(update_date, 主键)排序,
+    配合`(update_date, id)`的联合索引, 轮询的开销只和变化的行数有关, 而和表的大小无关.
+    mixin应该放在ListMixin/ListModelMixin之前
+
+    参数:
+        - since: 上一次返回的水位线, 不传则从头开始
+        - limit: 本次最多返回多少行, 默认为delta_limit
+
+    delta_column必须是DateTime(时间戳)类型的列, 并且每次修改都会更新, DATE类型的列会抛出ValueError
+
+    load的结果为`Delta(rows, tombstones, since)`:
+        - rows: 变化的行
+        - tombstones: 被软删除的行的主键
+        - since: 下一次请求使用的水位线
+    """
+
+    since = fields.String(load_only=True)
+    limit = fields.Integer(load_only=True)
+
+    _paginate = False  # 不需要limit/offset或者page/size
+
+    delta_column = "update_date"  # 模型中记录修改时间的列, 不能是DATE类型
+
+    delta_tombstone = ("is_active", False)  # (软删除的列, 被删除时的值), 设置为None时不处理软删除
+
+    delta_limit = 1000
+
+    @property
+    def delta_pk(self):
+        primary_key = inspect(self.model).primary_key
+        if len(primary_key) != 1:
+            raise ValueError("模型%s主键不唯一" % str(self.model))
+        return primary_key[0]
+
+    @property
+    def delta_update_column(self):
+        column = getattr(self.model, self.delta_column)
+        if isinstance(column.type, types.Date):
+            # 同一天之内后来修改的, 主键小于水位线主键的行会被永远跳过
+            raise ValueError("DeltaMixin的delta_column(%s.%s)不能是DATE类型, 需要精确的DateTime"
+                             % (self.model.__name__, self.delta_column))
+        return column
+
+    def encode_since(self, update, pk):
+        value = json.dumps([update.isoformat(), pk]).encode("utf-8")
+        return base64.urlsafe_b64encode(value).decode("ascii")
+
+    def decode_since(self, since):
+        """:return: (update, pk)"""
+        python_type = self.delta_update_column.type.python_type
+        try:
+            update, pk = json.loads(base64.urlsafe_b64decode(since.encode("ascii")).decode("utf-8"))
+            return python_type.fromisoformat(update), pk
+        except (TypeError, ValueError):
+            raise ValidationError("水位线格式错误", field_name="since")
+
+    def to_sql(self, data):
+        update_column = self.delta_update_column
+        pk = self.delta_pk
+
+        query = self.get_query(data)
+        query = self.modify_before_query(query, data)
+
+        exclude = ()
+        columns = [update_column.label("_delta_update"), pk.label("_delta_pk")]
+        if self.delta_tombstone is not None:
+            # 软删除的行也需要扫描出来, 作为tombstone返回
+            exclude = (self.delta_tombstone[0],)
+            columns.append(getattr(self.model, self.delta_tombstone[0]).label("_delta_deleted"))
+
+        query = query.add_columns(*columns).filter(self.get_filters(data, exclude=exclude))
+
+        if data.get("since"):
+            since_update, since_pk = self.decode_since(data["since"])
+            query = query.filter(tuple_(update_column, pk) > tuple_(since_update, since_pk))
+
+        return query.order_by(update_column, pk).limit(data.get("limit") or self.delta_limit)
+
+    @post_load
+    def make_queries(self, data, **kwargs):
+        if self._load_data_only:
+            return data
+
+        query = self.to_sql(data)
+        # ListModelMixin查询的是模型, add_columns之后第一个元素是模型实例; ListMixin多出来的列不影响dump
+        entity_query = isinstance(query.column_descriptions[0]["expr"], type)
+
+        rows, tombstones = [], []
+        since = data.get("since")
+        for row in query:
+            since = self.encode_since(row._delta_update, row._delta_pk)
+            if self.delta_tombstone is not None and row._delta_deleted == self.delta_tombstone[1]:
+                tombstones.append(row._delta_pk)
+                continue
+            rows.append(row[0] if entity_query else row)
+
+        return Delta(rows, tombstones, since)
@@ -1,8 +1,14 @@
-from copy import deepcopy
-
+from flask import abort
 from marshmallow import post_load, validates_schema
 from marshmallow.exceptions import ValidationError
-from sqlalchemy import inspect
+from sqlalchemy import and_, inspect, or_
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+
+try:
+    from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+except ImportError:  # SQLAlchemy < 1.4
+    sqlite_insert = None
 
 from flask_serializer.mixins import _MixinBase
 
@@ -54,14 +60,13 @@ class DetailMixIn(_MixinBase):
         `fk`用于在这里创建关联.
         默认使用id作为主键
         """
-        _data = deepcopy(data)
-        if _data.get(self.pk_field):
-            # update
-            _id = _data.pop(self.pk_field)
-            instance = self.get_instance(_id)
-            for k, v in _data.items():
-
-                if hasattr(instance, k):
+        pk_field = self.pk_field
+        if data.get(pk_field):
+            # update, 不复制data, 跳过主键即可
+            instance = self.get_instance(data[pk_field])
+            for k, v in data.items():
+
+                if k != pk_field and hasattr(instance, k):
                     # 这里处理relationship, 使用extend来处理, 而不是setattr, 保证正确性, 这个方法是真的丑陋啊
                     if hasattr(getattr(instance, k), "extend"):
 
@@ -74,14 +79,14 @@ class DetailMixIn(_MixinBase):
                     setattr(instance, k, v)
         else:
             # create
-            instance = self.model(**_data)
+            instance = self.model(**data)
 
-        _id = getattr(instance, self.pk_field)
+        _id = getattr(instance, pk_field)
 
         # 为了保证线程安全, 这里不能使用实例来存储数据
         for func_foreign in self.foreign_fields:
-            if _data.get(func_foreign.field_name):
-                foreign_ids = _data.get(func_foreign.field_name)
+            if data.get(func_foreign.field_name):
+                foreign_ids = data.get(func_foreign.field_name)
                 if isinstance(foreign_ids, list):
                     func_foreign.update_foreign(_id, foreign_ids)
         
@@ -95,7 +100,223 @@ class DetailMixIn(_MixinBase):
         # self.check_foreign_key(data)
         return self.make_instance(data)
 
+    def evict_fragment(self, instance_id):
+        """不经过flush的修改, 需要主动把这一行移出FragmentCacheMixin的缓存"""
+        cache = getattr(self, "fragment_cache", None)
+        if cache is not None:
+            cache.evict(self.model, (instance_id, ), self.db.session())
+
     def get_instance(self, instance_id):
         """获取一个模型, 修改这个方法添加逻辑删除规则"""
         instance = self.db.session.query(self.model).get_or_404(instance_id)
         return instance
+
+
+class UpsertMixIn(DetailMixIn):
+    """
+    使用一条`INSERT ... ON CONFLICT DO UPDATE`(PostgreSQL/SQLite)或者`INSERT ... ON DUPLICATE KEY UPDATE`(MySQL)
+    完成创建或者更新, 不再先SELECT再flush, 适合幂等的同步任务
+
+    - 单条: `schema.load(data)` 返回这一行
+
+    - 批量: `schema.load(data_list, many=True)`, 每upsert_batch_size条数据使用一条语句
+
+    **特别说明**:
+        - 返回的是数据库中的行(支持RETURNING时直接返回, 否则再查询一次), 而不是模型实例, 也不会放入session的identity map
+
+        - 只处理模型的Column, relationship字段会被忽略; 外键列表(`Foreign`)和DetailMixIn一样会被更新
+
+        - 返回的行通过冲突列和data对应, 没有冲突列(默认为主键)的数据每一条使用一条语句
+
+        - Column的onupdate如果是需要context参数的函数, 则不能使用
+    """
+
+    upsert_index_elements = None  # 判断冲突的列名, 默认使用主键, MySQL会使用所有的唯一索引
+
+    upsert_batch_size = 500
+
+    @post_load(pass_many=True)
+    def make_queries(self, data, many, **kwargs):
+        rows = self.upsert(data if many else [data])
+        return rows if many else rows[0]
+
+    def upsert(self, data_list):
+        """:return: 和data_list一一对应的行"""
+        mapper = inspect(self.model)
+        table = mapper.local_table
+        dialect = self.db.engine.dialect
+        index_elements = list(self.upsert_index_elements or (column.name for column in mapper.primary_key))
+        # SQLAlchemy 2.0使用insert_returning来表示方言是否支持INSERT ... RETURNING
+        returning = dialect.name == "postgresql" or getattr(dialect, "insert_returning", False)
+
+        rows = []
+        for start in range(0, len(data_list), self.upsert_batch_size):
+            values = [self._upsert_values(mapper, data) for data in data_list[start:start + self.upsert_batch_size]]
+
+            # 批量INSERT时每一行的列必须一致; 结果通过冲突列和data对应, 没有冲突列的行只能逐条插入
+            groups = []
+            for value in values:
+                can_batch = all(name in value for name in index_elements)
+                if groups and can_batch and groups[-1][1] and set(groups[-1][0][0]) == set(value):
+                    groups[-1][0].append(value)
+                else:
+                    groups.append(([value], can_batch))
+
+            for group, _ in groups:
+                rows.extend(self._execute_upsert(dialect, table, group, index_elements, returning))
+
+        pk = self.pk_field
+        for data, row in zip(data_list, rows):
+            self.evict_fragment(row[pk])
+            for func_foreign in self.foreign_fields:
+                foreign_ids = data.get(func_foreign.field_name)
+                if foreign_ids and isinstance(foreign_ids, list):
+                    func_foreign.update_foreign(row[pk], foreign_ids)
+
+        return rows
+
+    @staticmethod
+    def _upsert_values(mapper, data):
+        """data的key是模型的属性名, 转换为列名"""
+        return {prop.columns[0].name: data[prop.key] for prop in mapper.column_attrs if prop.key in data}
+
+    @staticmethod
+    def _onupdate_value(column):
+        onupdate = column.onupdate
+        if onupdate.is_callable:
+            return onupdate.arg(None)
+        return onupdate.arg
+
+    def upsert_statement(self, dialect, table, values, index_elements):
+        """根据方言拼接upsert语句"""
+        columns = set(values[0])
+        # 单条数据不使用multi VALUES, 否则拿不到inserted_primary_key
+        values = values if len(values) > 1 else values[0]
+        set_ = {column.name: self._onupdate_value(column) for column in table.columns
+                if column.onupdate is not None and column.name not in columns}
+
+        if dialect.name in ("postgresql", "sqlite"):
+            if dialect.name == "sqlite" and sqlite_insert is None:
+                raise NotImplementedError("SQLite的upsert需要SQLAlchemy>=1.4")
+            insert = postgresql_insert if dialect.name == "postgresql" else sqlite_insert
+            statement = insert(table).values(values)
+            set_.update({name: statement.excluded[name] for name in columns if name not in index_elements})
+            # 没有需要更新的列时也使用DO UPDATE, 否则冲突的行不会被RETURNING
+            set_ = set_ or {index_elements[0]: statement.excluded[index_elements[0]]}
+            return statement.on_conflict_do_update(index_elements=index_elements, set_=set_)
+
+        if dialect.name == "mysql":
+            statement = mysql_insert(table).values(values)
+            set_.update({name: statement.inserted[name] for name in columns if name not in index_elements})
+            set_ = set_ or {index_elements[0]: statement.inserted[index_elements[0]]}
+            return statement.on_duplicate_key_update(**set_)
+
+        raise NotImplementedError("%s不支持upsert" % dialect.name)
+
+    def _execute_upsert(self, dialect, table, values, index_elements, returning):
+        statement = self.upsert_statement(dialect, table, values, index_elements)
+        session = self.db.session
+        keyed = all(name in values[0] for name in index_elements)
+
+        if returning:
+            rows = session.execute(statement.returning(*table.columns)).fetchall()
+            if not keyed:
+                # 单条插入
+                return rows
+            # RETURNING的顺序不一定和VALUES一致, 通过冲突列对应
+            return self._match_rows(rows, values, [table.columns[name] for name in index_elements])
+
+        result = session.execute(statement)
+        if keyed:
+            keys = [tuple(value[name] for name in index_elements) for value in values]
+            key_columns = [table.columns[name] for name in index_elements]
+        else:
+            # 单条插入, 通过inserted_primary_key找回这一行
+            keys = [tuple(result.inserted_primary_key)]
+            key_columns = list(table.primary_key.columns)
+
+        condition = or_(*(and_(*(column == v for column, v in zip(key_columns, key))) for key in keys))
+        found = {tuple(row[column.name] for column in key_columns): row
+                 for row in session.execute(table.select().where(condition))}
+        return [found.get(key) for key in keys]
+
+    @staticmethod
+    def _match_rows(rows, values, key_columns):
+        """:return: 和values一一对应的行"""
+        found = {tuple(row[column.name] for column in key_columns): row for row in rows}
+        return [found.get(tuple(value[column.name] for column in key_columns)) for value in values]
+
+
+class PartialUpdateMixIn(DetailMixIn):
+    """
+    partial=True并且带有主键时, 不再先查询出模型再逐个setattr, 而是直接执行一条
+    `UPDATE ... SET <传入的列> WHERE pk = :id [AND version = :version]`, 返回数据库中更新后的这一行
+
+    **特别说明**:
+        - 返回的是数据库中的行(支持RETURNING时直接返回, 否则再查询一次), 而不是模型实例, 也不会放入session的identity map
+
+        - 设置了`version_column`时, data中需要带上这一列的旧值, 更新时会+1, 旧值不一致时抛出ValidationError
+
+        - 找不到这一行时和`get_instance`一样返回404
+
+        - data中带有relationship等非Column字段时, 依然使用DetailMixIn的方式更新
+    """
+
+    version_column = None  # 乐观锁使用的列名(模型的属性名)
+
+    @post_load
+    def make_queries(self, data, partial=None, **kwargs):
+        if partial and data.get(self.pk_field):
+            return self.partial_update(data)
+        return self.make_instance(data)
+
+    def partial_update(self, data):
+        mapper = inspect(self.model)
+        columns = {prop.key: prop.columns[0] for prop in mapper.column_attrs}
+        if any(k not in columns and not self._is_foreign_field(k) for k in data):
+            return self.make_instance(data)
+
+        table = mapper.local_table
+        pk_column = columns[self.pk_field]
+        _id = data[self.pk_field]
+        condition = pk_column == _id
+        versioned = self.version_column is not None and data.get(self.version_column) is not None
+
+        values = {columns[k].name: v for k, v in data.items()
+                  if k in columns and k not in (self.pk_field, self.version_column)}
+
+        if versioned:
+            version_column = columns[self.version_column]
+            condition = and_(condition, version_column == data[self.version_column])
+            values[version_column.name] = version_column + 1
+
+        session = self.db.session
+        if not values:
+            row = session.execute(table.select().where(condition)).first()
+            if row is None:
+                abort(404)
+            return row
+
+        statement = table.update().where(condition).values(**values)
+        dialect = self.db.engine.dialect
+        if dialect.name == "postgresql" or getattr(dialect, "update_returning", False):
+            row = session.execute(statement.returning(*table.columns)).first()
+        else:
+            result = session.execute(statement)
+            row = session.execute(table.select().where(pk_column == _id)).first() if result.rowcount else None
+
+        if row is None:
+            if versioned and session.execute(table.select().where(pk_column == _id)).first() is not None:
+                raise ValidationError("数据已经被修改, 请刷新后重试", field_name=self.version_column)
+            abort(404)
+
+        self.evict_fragment(_id)
+        for func_foreign in self.foreign_fields:
+            foreign_ids = data.get(func_foreign.field_name)
+            if foreign_ids and isinstance(foreign_ids, list):
+                func_foreign.update_foreign(_id, foreign_ids)
+
+        return row
+
+    def _is_foreign_field(self, key):
+        return any(func_foreign.field_name == key for func_foreign in self.foreign_fields)
@@ -0,0 +1,202 @@
+import csv
+import io
+import json
+import multiprocessing
+import os
+import shutil
+import tempfile
+
+from flask import current_app
+from six import string_types
+from sqlalchemy import create_engine, func, inspect
+from sqlalchemy.orm import scoped_session, sessionmaker
+
+from flask_serializer.mixins.lists import ListBase
+
+NDJSON = "ndjson"
+CSV = "csv"
+
+# 子进程的状态, 由Pool的initializer在每个子进程中设置, 父进程中不使用
+_worker_state = {}
+
+
+def _init_worker(state):
+    """
+    子进程初始化: fork时通过initializer的参数继承app和schema, 不需要pickle;
+    从父进程继承来的连接不能再使用(会和父进程共用同一个socket),
+    因此每个子进程都创建自己的engine, 并把db.session替换成绑定到这个engine的session
+    """
+    db = state["schema"].db
+    with state["app"].app_context():
+        engine = create_engine(db.engine.url)
+    db.session = scoped_session(sessionmaker(bind=engine))
+    _worker_state.update(state)
+
+
+def _write_partition(state, task):
+    """查询并序列化一个主键分区, 写入文件, 返回(分区序号, 行数, 文件路径)"""
+    index, lower, upper, last, path = task
+    with io.open(path, "w", encoding="utf-8", newline="") as f:
+        rows = state["schema"].write_partition(f, state["data"], lower, upper, last,
+                                               fmt=state["fmt"], header=state["header"])
+    return index, rows, path
+
+
+def _export_partition(task):
+    """在子进程中执行一个分区"""
+    schema = _worker_state["schema"]
+    with _worker_state["app"].app_context():
+        try:
+            return _write_partition(_worker_state, task)
+        finally:
+            schema.db.session.remove()
+
+
+class ExportMixin(ListBase):
+    """
+    将过滤后的结果按主键范围分区, 在进程池中并行查询和序列化, 导出为NDJSON或者CSV,
+    mixin应该放在ListMixin/ListModelMixin之前
+
+    - 每个分区写入一个文件: `schema.export(data, "/tmp/export/")`
+
+    - 合并成一个流: `schema.export(data, response_stream)`
+
+    **特别说明**:
+        - 只支持单一整数主键的模型
+
+        - 子进程通过fork继承父进程中的app和schema, 因此只支持有fork的平台; processes=1时在当前进程中执行
+    """
+
+    export_batch_size = 1000  # 每个分区内yield_per的大小
+
+    @property
+    def export_pk(self):
+        """分区使用的主键列"""
+        primary_key = inspect(self.model).primary_key
+        if len(primary_key) != 1:
+            raise ValueError("模型%s主键不唯一" % str(self.model))
+        return primary_key[0]
+
+    def export_fields(self):
+        """CSV的表头, 即dump出来的字段名"""
+        return [field.data_key or name for name, field in self.dump_fields.items()]
+
+    def partition_ranges(self, data, partitions):
+        """
+        根据过滤后的最小/最大主键, 切分成partitions个左闭右开的区间, 最后一个区间是闭区间
+        :return: [(lower, upper, last), ...]
+        """
+        pk = self.export_pk
+        lower, upper = self.filtered_query(data).with_entities(func.min(pk), func.max(pk)).one()
+        if lower is None:
+            return []
+
+        step = max((upper - lower + 1) // partitions, 1)
+        ranges = []
+        start = lower
+        while start <= upper:
+            end = start + step
+            last = end > upper or len(ranges) == partitions - 1
+            ranges.append((start, upper if last else end, last))
+            if last:
+                break
+            start = end
+        return ranges
+
+    def partition_query(self, data, lower, upper, last=False):
+        """某一个主键分区的query, 按主键排序"""
+        pk = self.export_pk
+        upper_filter = pk <= upper if last else pk < upper
+        return self.filtered_query(data).filter(pk >= lower, upper_filter).order_by(pk)
+
+    def write_partition(self, f, data, lower, upper, last=False, fmt=NDJSON, header=False):
+        """查询并序列化一个分区, 分批写入f, 返回写入的行数"""
+        query = self.partition_query(data, lower, upper, last).yield_per(self.export_batch_size)
+
+        writer = None
+        if fmt == CSV:
+            writer = csv.DictWriter(f, fieldnames=self.export_fields(), extrasaction="ignore")
+            if header:
+                writer.writeheader()
+
+        rows = 0
+        batch = []
+        for row in query:
+            batch.append(row)
+            if len(batch) >= self.export_batch_size:
+                rows += self._write_batch(f, writer, batch)
+                batch = []
+        if batch:
+            rows += self._write_batch(f, writer, batch)
+        return rows
+
+    def _write_batch(self, f, writer, batch):
+        dumped = self.dump(batch, many=True)
+        if writer is not None:
+            writer.writerows(dumped)
+        else:
+            f.writelines(json.dumps(item, ensure_ascii=False, default=str) + "\n" for item in dumped)
+        return len(dumped)
+
+    def export(self, data, output, fmt=NDJSON, processes=None, partitions=None, progress=None, **kwargs):
+        """
+        :param data: 未经验证的查询参数, 不需要分页参数
+        :param output: 目录路径则每个分区写一个文件; 可写的文件对象则按主键顺序合并写入
+        :param fmt: ndjson 或者 csv
+        :param processes: 进程数, 默认为CPU核数
+        :param partitions: 分区数, 默认为进程数的4倍, 分区越多负载越均衡
+        :param progress: callable(done, total, rows), 每完成一个分区调用一次
+        :return: 导出的总行数
+        """
+        if fmt not in (NDJSON, CSV):
+            raise ValueError("不支持的导出格式%s" % fmt)
+
+        data = self.load_data(data, paginate=False, **kwargs)
+        processes = processes or multiprocessing.cpu_count()
+        partitions = partitions or processes * 4
+
+        merge = not isinstance(output, string_types)
+        workdir = tempfile.mkdtemp(prefix="flask_serializer_export_") if merge else output
+        if not merge and not os.path.isdir(workdir):
+            os.makedirs(workdir)
+
+        ranges = self.partition_ranges(data, partitions)
+        tasks = [(i, lower, upper, last, os.path.join(workdir, "part-%05d.%s" % (i, fmt)))
+                 for i, (lower, upper, last) in enumerate(ranges)]
+
+        # 每次导出一份状态, 同时进行的导出互不影响
+        state = dict(app=current_app._get_current_object(), schema=self, data=data, fmt=fmt, header=not merge)
+        results = {}
+        total_rows = 0
+        try:
+            if processes == 1 or len(tasks) <= 1:
+                # 在当前进程中执行, 使用调用者的app context和session, 不能push新的app context,
+                # 否则teardown时会remove调用者的session
+                done_iter = (_write_partition(state, task) for task in tasks)
+                pool = None
+            else:
+                pool = multiprocessing.get_context("fork").Pool(min(processes, len(tasks)), _init_worker, (state,))
+                done_iter = pool.imap_unordered(_export_partition, tasks)
+
+            try:
+                for index, rows, path in done_iter:
+                    results[index] = path
+                    total_rows += rows
+                    if progress is not None:
+                        progress(len(results), len(tasks), total_rows)
+            finally:
+                if pool is not None:
+                    pool.close()
+                    pool.join()
+
+            if merge:
+                if fmt == CSV:
+                    csv.DictWriter(output, fieldnames=self.export_fields()).writeheader()
+                for index in sorted(results):
+                    with io.open(results[index], encoding="utf-8", newline="") as f:
+                        shutil.copyfileobj(f, output)
+        finally:
+            if merge:
+                shutil.rmtree(workdir, ignore_errors=True)
+
+        return total_rows
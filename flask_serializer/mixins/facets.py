@@ -0,0 +1,131 @@
+from collections import OrderedDict
+
+from marshmallow import post_load
+from sqlalchemy import case, func, literal, or_, tuple_, type_coerce, union_all
+from sqlalchemy.types import NullType
+
+from flask_serializer.mixins.lists import ListBase
+
+GROUPING_SETS_DIALECTS = ("postgresql", "oracle", "mssql")
+
+
+class FacetMixin(ListBase):
+    """
+    一条SQL计算多个Filter字段的分面统计(例如每个分类, 每个状态下各有多少条), 每个分面都使用除了自己以外的所有过滤条件
+
+    - 支持GROUPING SETS的数据库(PostgreSQL等): 一次扫描, `GROUP BY GROUPING SETS ((a), (b))`, 每个分面使用自己的条件聚合
+
+    - 其他数据库: 在`facet_values`中给出了取值的分面使用条件聚合(一次扫描),
+      没有给出取值的分面各自GROUP BY之后UNION ALL
+
+    load的结果为: {字段名: {值: 数量}}, 数量为0的值不会出现
+
+        class ProductFacetSchema(FacetMixin, BaseSchema):
+            __model__ = Product
+            facets = ("sku_name", "is_active")
+            facet_values = {"is_active": (True, False)}
+
+            sku_name = fields.String(filter=Filter(eq_op))
+            is_active = fields.Boolean(filter=Filter(eq_op, default=True))
+    """
+
+    facets = ()  # 需要分面统计的Filter字段名
+
+    facet_values = {}  # 已知取值的分面, {字段名: (值, ...)}
+
+    facet_grouping_sets = None  # 是否使用GROUPING SETS, None则根据方言判断
+
+    def facet_filters(self):
+        """:return: OrderedDict(字段名 -> Filter)"""
+        filter_fields = {filter_field.field_name: filter_field for filter_field in self.filter_fields}
+        return OrderedDict((name, filter_fields[name]) for name in self.facets)
+
+    def facet_conditions(self, data):
+        """每个分面的过滤条件: 除了自己以外的所有过滤条件"""
+        return OrderedDict((name, self.get_filters(data, exclude=(name,))) for name in self.facets)
+
+    def _facet_base_query(self, data, *entities):
+        query = self.db.session.query(*entities).select_from(self.model)
+        return self.modify_before_query(query, data)
+
+    def _use_grouping_sets(self):
+        if self.facet_grouping_sets is not None:
+            return self.facet_grouping_sets
+        return self.db.engine.dialect.name in GROUPING_SETS_DIALECTS
+
+    def facet_counts(self, data):
+        filters = self.facet_filters()
+        conditions = self.facet_conditions(data)
+        counts = OrderedDict((name, OrderedDict()) for name in filters)
+        if not filters:
+            return counts
+
+        if self._use_grouping_sets():
+            self._grouping_sets_counts(data, filters, conditions, counts)
+            return counts
+
+        known = [name for name in filters if name in self.facet_values]
+        unknown = [name for name in filters if name not in self.facet_values]
+        if known:
+            self._conditional_counts(data, known, filters, conditions, counts)
+        if unknown:
+            self._union_counts(data, unknown, filters, conditions, counts)
+        return counts
+
+    def _grouping_sets_counts(self, data, filters, conditions, counts):
+        columns = [filter_field.column for filter_field in filters.values()]
+        groupings = [func.grouping(column) for column in columns]
+        aggregates = [func.sum(case([(condition, 1)], else_=0)) for condition in conditions.values()]
+
+        query = self._facet_base_query(data, *(columns + groupings + aggregates)) \
+            .filter(or_(*conditions.values())) \
+            .group_by(func.grouping_sets(*[tuple_(column) for column in columns]))
+
+        size = len(columns)
+        for row in query:
+            for i, name in enumerate(filters):
+                # GROUPING()为0说明这一行是按这一列分组的结果
+                if size == 1 or row[size + i] == 0:
+                    count = row[size * 2 + i]
+                    if count:
+                        counts[name][row[i]] = int(count)
+                    break
+
+    def _conditional_counts(self, data, names, filters, conditions, counts):
+        keys = []
+        aggregates = []
+        for name in names:
+            column = filters[name].column
+            for value in self.facet_values[name]:
+                keys.append((name, value))
+                aggregates.append(func.sum(case([(conditions[name] & (column == value), 1)], else_=0)))
+
+        query = self._facet_base_query(data, *aggregates).filter(or_(*(conditions[name] for name in names)))
+        row = query.one()
+        for (name, value), count in zip(keys, row):
+            if count:
+                counts[name][value] = int(count)
+
+    def _union_counts(self, data, names, filters, conditions, counts):
+        dialect = self.db.engine.dialect
+        selects = []
+        processors = []
+        for i, name in enumerate(names):
+            column = filters[name].column
+            # UNION ALL的结果只会使用第一个SELECT的类型, 取出原始值之后再按每个分面自己的类型转换
+            query = self._facet_base_query(data, literal(i).label("facet"),
+                                           type_coerce(column, NullType()).label("value"),
+                                           func.count().label("count")) \
+                .filter(conditions[name]).group_by(column)
+            selects.append(query.statement)
+            processors.append(column.type.result_processor(dialect, None))
+
+        for facet, value, count in self.db.session.execute(union_all(*selects)):
+            processor = processors[facet]
+            counts[names[facet]][processor(value) if processor is not None else value] = int(count)
+
+    @post_load
+    def make_queries(self, data, **kwargs):
+        if self._load_data_only:
+            return data
+        return self.facet_counts(data)
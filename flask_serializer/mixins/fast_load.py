@@ -0,0 +1,232 @@
+import math
+
+from marshmallow import fields, EXCLUDE, INCLUDE, RAISE
+from marshmallow.decorators import PRE_LOAD, POST_LOAD, VALIDATES, VALIDATES_SCHEMA
+from marshmallow.error_store import ErrorStore
+from marshmallow.exceptions import ValidationError
+from marshmallow.utils import missing
+
+from flask_serializer.utils.query_log import sql_context
+from flask_serializer.utils.timeout import statement_timeout
+
+
+class _Fallback(Exception):
+    """快速转换失败, 交给field.deserialize处理(得到和marshmallow完全一致的值或者错误)"""
+
+
+def _to_int(value, field):
+    if type(value) is int or (type(value) is str and not field.strict):
+        return int(value)
+    raise _Fallback
+
+
+def _to_float(value, field):
+    if type(value) in (int, float, str):
+        num = float(value)
+        if not field.allow_nan and (math.isnan(num) or math.isinf(num)):
+            raise _Fallback
+        return num
+    raise _Fallback
+
+
+def _to_str(value, field):
+    if type(value) is str:
+        return value
+    raise _Fallback
+
+
+def _to_bool(value, field):
+    if type(value) in (str, int, bool) and field.truthy:
+        if value in field.truthy:
+            return True
+        if value in field.falsy:
+            return False
+    raise _Fallback
+
+
+CONVERTERS = {
+    fields.Integer: _to_int,
+    fields.Float: _to_float,
+    fields.String: _to_str,
+    fields.Boolean: _to_bool,
+}
+
+
+def _converter(field):
+    """
+    返回field的快速转换函数, 不支持的field返回None(直接调用field.deserialize)
+    只支持精确的类型, 子类可能重写了_deserialize
+    """
+    if field.validators:
+        return None
+
+    if type(field) is fields.List:
+        inner = _converter(field.inner)
+        if inner is None:
+            return None
+
+        def _to_list(value, _field):
+            if type(value) is not list:
+                raise _Fallback
+            return [inner(item, _field.inner) for item in value]
+
+        return _to_list
+
+    return CONVERTERS.get(type(field))
+
+
+def _load_default(field):
+    if hasattr(field, "load_default"):
+        return field.load_default
+    return field.missing  # marshmallow < 3.13
+
+
+class FastLoadMixin(object):
+    """
+    为查询字符串这种扁平的输入提供一个快速的load, mixin应该放在ListModelMixin/ListMixin之前
+
+    每个schema类(以及每一组load_fields)只生成一次转换计划, 之后一次遍历完成所有字段的转换,
+    转换失败时交给field.deserialize, 因此得到的data和错误和marshmallow完全一致;
+    pre_load/validates_schema/post_load依然按marshmallow的顺序执行
+
+    以下情况使用marshmallow原本的load:
+        - many/partial
+        - 使用了pass_many的hook或者validates装饰器
+        - field的attribute中带有`.`
+        - 第一次快速load时marshmallow的内部接口(_invoke_load_processors等)抛出TypeError/AttributeError,
+          说明marshmallow的版本不兼容, 这个schema类之后都使用原本的load
+    """
+
+    _fast_unsupported = False  # 第一次快速load失败之后为True
+
+    def _fast_plan(self):
+        """
+        :return: ((attr_name, data_key, key, converter, 缺失时是否需要deserialize), ...),
+        不支持快速load时返回None
+        """
+        cls = type(self)
+        cache = cls.__dict__.get("_fast_plan_cache")
+        if cache is None:
+            cache = {}
+            setattr(cls, "_fast_plan_cache", cache)
+
+        load_fields = self.load_fields
+        cache_key = tuple(load_fields)
+        if cache_key in cache:
+            return cache[cache_key]
+
+        hooks = getattr(cls, "_hooks", None)
+        if cls._fast_unsupported or hooks is None or not hasattr(self, "_invoke_load_processors"):
+            # marshmallow版本不支持
+            plan = None
+        elif hooks[(VALIDATES, False)] or any(hooks[(tag, True)] for tag in (PRE_LOAD, POST_LOAD, VALIDATES_SCHEMA)):
+            plan = None
+        else:
+            plan = []
+            for attr_name, field_obj in load_fields.items():
+                key = field_obj.attribute or attr_name
+                if "." in key:
+                    plan = None
+                    break
+                data_key = field_obj.data_key if field_obj.data_key is not None else attr_name
+                deserialize_missing = field_obj.required or _load_default(field_obj) is not missing
+                plan.append((attr_name, data_key, key, _converter(field_obj), deserialize_missing))
+            plan = tuple(plan) if plan is not None else None
+
+        cache[cache_key] = plan
+        return plan
+
+    def load(self, data, many=None, partial=None, unknown=None, timeout=None):
+        plan = self._fast_plan()
+        if plan is None or many or partial or self.many or self.partial or not isinstance(data, dict):
+            return super(FastLoadMixin, self).load(data, many=many, partial=partial, unknown=unknown, timeout=timeout)
+        with sql_context(self), statement_timeout(self, self._statement_timeout(timeout), data):
+            if type(self).__dict__.get("_fast_verified"):
+                return self._fast_load(plan, data, self.unknown if unknown is None else unknown)
+            try:
+                result = self._fast_load(plan, data, self.unknown if unknown is None else unknown)
+            except (TypeError, AttributeError):
+                # marshmallow私有接口的签名或者结构和这里不一致
+                cls = type(self)
+                cls._fast_unsupported = True
+                cls._fast_plan_cache = {}
+            else:
+                type(self)._fast_verified = True
+                return result
+        return super(FastLoadMixin, self).load(data, many=many, partial=partial, unknown=unknown, timeout=timeout)
+
+    def _fast_load(self, plan, data, unknown):
+        error_store = ErrorStore()
+        errors = {}
+        result = None
+
+        try:
+            processed_data = self._invoke_load_processors(
+                PRE_LOAD, data, many=False, original_data=data, partial=None)
+        except ValidationError as err:
+            errors = err.normalized_messages()
+
+        if not errors:
+            result = self._fast_deserialize(plan, processed_data, error_store, unknown)
+
+            if self._has_processors(VALIDATES_SCHEMA):
+                self._invoke_schema_validators(
+                    error_store=error_store, pass_many=False, data=result, original_data=data,
+                    many=False, partial=None, field_errors=bool(error_store.errors))
+
+            errors = error_store.errors
+            if not errors:
+                try:
+                    result = self._invoke_load_processors(
+                        POST_LOAD, result, many=False, original_data=data, partial=None)
+                except ValidationError as err:
+                    errors = err.normalized_messages()
+
+        if errors:
+            exc = ValidationError(errors, data=data, valid_data=result)
+            self.handle_error(exc, data, many=False, partial=None)
+            raise exc
+
+        return result
+
+    def _fast_deserialize(self, plan, data, error_store, unknown):
+        result = self.dict_class()
+        load_fields = self.load_fields
+
+        for attr_name, data_key, key, converter, deserialize_missing in plan:
+            raw_value = data.get(data_key, missing)
+            field_obj = load_fields[attr_name]
+
+            if raw_value is missing:
+                if deserialize_missing:
+                    value = self._fallback(field_obj, raw_value, data_key, data, error_store)
+                else:
+                    continue
+            elif converter is None or raw_value is None:
+                value = self._fallback(field_obj, raw_value, data_key, data, error_store)
+            else:
+                try:
+                    value = converter(raw_value, field_obj)
+                except (_Fallback, TypeError, ValueError, OverflowError):
+                    value = self._fallback(field_obj, raw_value, data_key, data, error_store)
+
+            if value is not missing:
+                result[key] = value
+
+        if unknown != EXCLUDE:
+            known = set(item[1] for item in plan)
+            for key in set(data) - known:
+                if unknown == INCLUDE:
+                    result[key] = data[key]
+                elif unknown == RAISE:
+                    error_store.store_error([self.error_messages["unknown"]], key)
+
+        return result
+
+    @staticmethod
+    def _fallback(field_obj, raw_value, data_key, data, error_store):
+        try:
+            return field_obj.deserialize(raw_value, data_key, data, partial=None)
+        except ValidationError as error:
+            error_store.store_error(error.messages, data_key)
+            return error.valid_data or missing
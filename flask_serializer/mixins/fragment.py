@@ -0,0 +1,87 @@
+from sqlalchemy import inspect
+from sqlalchemy.exc import NoInspectionAvailable
+
+from flask_serializer.mixins import _MixinBase
+
+
+class FragmentCacheMixin(_MixinBase):
+    """
+    缓存每一行dump之后的结果, key为(schema类, only, exclude, 主键), 并且比较版本列(默认为update_date),
+    命中时跳过marshmallow的dump. mixin应该放在其他mixin之前
+
+    - 通过session flush修改或者删除的实例, 以及DetailMixIn系列mixin修改的行, 会自动被移出缓存.
+      session的监听在第一次dump时安装, 使用共享的缓存后端时在init_app中安装(其他进程可能只修改不dump)
+
+    - dump的对象可以是模型实例, 也可以是ListMixin查询出来的行(需要查询主键列), 拿不到主键的对象不会被缓存
+
+    **特别说明**:
+        - 命中时返回的是缓存中的对象, 不要修改dump的结果
+
+        - 不经过session的修改(例如直接执行的UPDATE)需要自己调用`fragment_cache.evict(Model, (pk, ))`
+
+        - dump结果依赖context或者请求参数的schema不要使用
+    """
+
+    fragment_version_column = "update_date"  # 版本列(模型的属性名), 为None时只依靠主动删除
+
+    def fragment_variant(self):
+        only = tuple(sorted(self.only)) if self.only else None
+        exclude = tuple(sorted(self.exclude)) if self.exclude else None
+        return "%s.%s|%s|%s" % (type(self).__module__, type(self).__name__, only, exclude)
+
+    def fragment_identity(self, obj):
+        """:return: 主键tuple, 拿不到主键时返回None"""
+        try:
+            state = inspect(obj)
+        except NoInspectionAvailable:
+            state = None
+
+        if state is not None:
+            return state.key[1] if state.key is not None else None
+
+        mapper = inspect(self.model)
+        identity = []
+        for column in mapper.primary_key:
+            value = getattr(obj, mapper.get_property_by_column(column).key, None)
+            if value is None:
+                return None
+            identity.append(value)
+        return tuple(identity)
+
+    def fragment_version(self, obj):
+        if self.fragment_version_column is None:
+            return None
+        version = getattr(obj, self.fragment_version_column, None)
+        return None if version is None else str(version)
+
+    def dump(self, obj, many=None):
+        cache = getattr(self, "fragment_cache", None)
+        if cache is None:
+            return super(FragmentCacheMixin, self).dump(obj, many=many)
+        cache.install(self.db.session)
+
+        many = self.many if many is None else bool(many)
+        objs = list(obj) if many else [obj]
+        variant = self.fragment_variant()
+
+        result = [None] * len(objs)
+        missing = []
+        for i, item in enumerate(objs):
+            identity = self.fragment_identity(item)
+            key = version = None
+            if identity is not None:
+                key = cache.identity_key(self.model, identity)
+                version = self.fragment_version(item)
+                result[i] = cache.get(key, variant, version)
+            if result[i] is None:
+                missing.append((i, key, version))
+
+        if missing:
+            # 没有命中的一次dump完
+            dumped = super(FragmentCacheMixin, self).dump([objs[i] for i, _, _ in missing], many=True)
+            for (i, key, version), fragment in zip(missing, dumped):
+                result[i] = fragment
+                if key is not None:
+                    cache.set(key, variant, version, fragment)
+
+        return result if many else result[0]
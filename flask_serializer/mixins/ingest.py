@@ -0,0 +1,265 @@
+import csv
+import io
+import json
+import multiprocessing
+from collections import deque, namedtuple
+from copy import copy
+
+from flask import current_app
+from marshmallow import post_load, validates_schema
+from marshmallow.exceptions import ValidationError
+from six import string_types
+from sqlalchemy import inspect
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.orm.exc import StaleDataError
+
+from flask_serializer.mixins.details import DetailMixIn
+from flask_serializer.mixins.export import _init_worker, _worker_state
+
+NDJSON = "ndjson"
+CSV = "csv"
+
+IngestResult = namedtuple("IngestResult", ("rows", "written", "rejected"))
+
+
+def _validate_chunk(schema, task):
+    """
+    反序列化和验证一批数据, 不访问数据库
+    :return: (通过验证的[(行号, data, 原始数据)], 被拒绝的[(行号, 错误, 原始数据)])
+    """
+    fmt, records = task
+    valid, rejects = [], []
+
+    for row_no, record in records:
+        if fmt == NDJSON:
+            try:
+                record = json.loads(record)
+            except ValueError as e:
+                rejects.append((row_no, {"_schema": [str(e)]}, record.rstrip("\n")))
+                continue
+        try:
+            valid.append((row_no, schema.load(record), record))
+        except ValidationError as e:
+            rejects.append((row_no, e.messages, record))
+
+    return valid, rejects
+
+
+def _ingest_chunk(task):
+    """在子进程中验证一批数据"""
+    schema = _worker_state["schema"]
+    with _worker_state["app"].app_context():
+        try:
+            return _validate_chunk(schema, task)
+        finally:
+            schema.db.session.remove()
+
+
+def _read_records(f, fmt):
+    """:return: 迭代(行号, 原始数据), NDJSON为字符串, CSV为dict(空字符串视为没有传值)"""
+    if fmt == NDJSON:
+        for row_no, line in enumerate(f, 1):
+            if line.strip():
+                yield row_no, line
+        return
+
+    reader = csv.DictReader(f)
+    for row in reader:
+        yield reader.line_num, {k: v for k, v in row.items() if v != ""}
+
+
+def _chunks(records, chunk_size):
+    chunk = []
+    for record in records:
+        chunk.append(record)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+class IngestMixin(DetailMixIn):
+    """
+    从NDJSON/CSV文件流式导入大量数据:
+
+        1. 主进程分块读取文件, 子进程池中并行反序列化和验证, 同时最多有processes * 2块在处理中, 内存占用有上限
+
+        2. 每一块的外键只检查一次: `SELECT id FROM one WHERE id IN (<这一块所有的外键>)`
+
+        3. 通过检查的数据使用bulk_insert_mappings/bulk_update_mappings写入(带有主键时更新), 每一块提交一次
+
+        4. 没有通过的数据和行号写入错误文件(NDJSON): `{"row": 3, "errors": {...}, "data": ...}`
+
+    也可以使用命令行: `flask serializer ingest ProductSchema products.ndjson`
+
+    **特别说明**:
+        - 子进程通过fork继承父进程中的app和schema, 因此只支持有fork的平台; processes=1时在当前进程中执行
+
+        - 只写入模型的Column, relationship字段会被忽略; 外键列表(`Foreign`)和DetailMixIn一样会被更新
+
+        - 每一块单独提交, 中途失败时已经提交的块不会回滚
+
+        - 写入时数据库出错(违反约束, 数据过长, 要更新的主键不存在等)的块会整块回滚,
+          这一块通过验证的数据全部写入错误文件, 然后继续导入
+    """
+
+    _ingesting = False  # 为True时只反序列化和验证, 外键检查和写入由ingest批量完成
+
+    ingest_chunk_size = 1000
+
+    @validates_schema
+    def check_foreign_key(self, data, **kwargs):
+        if self._ingesting:
+            return data
+        return super(IngestMixin, self).check_foreign_key(data, **kwargs)
+
+    @post_load
+    def make_queries(self, data, **kwargs):
+        if self._ingesting:
+            return data
+        return super(IngestMixin, self).make_queries(data, **kwargs)
+
+    def ingest(self, source, fmt=None, errors=None, processes=None, chunk_size=None, progress=None):
+        """
+        :param source: 文件路径或者文本文件对象
+        :param fmt: ndjson 或者 csv, 默认根据文件扩展名判断
+        :param errors: 错误文件的路径或者文件对象, None则不记录
+        :param processes: 验证使用的进程数, 默认为CPU核数
+        :param chunk_size: 每一块的行数, 默认为ingest_chunk_size
+        :param progress: callable(IngestResult), 每写入一块调用一次
+        :return: IngestResult(读取的行数, 写入的行数, 被拒绝的行数)
+        """
+        if fmt is None:
+            fmt = CSV if isinstance(source, string_types) and source.lower().endswith(".csv") else NDJSON
+        if fmt not in (NDJSON, CSV):
+            raise ValueError("不支持的导入格式%s" % fmt)
+
+        processes = processes or multiprocessing.cpu_count()
+        chunk_size = chunk_size or self.ingest_chunk_size
+
+        source_file = io.open(source, encoding="utf-8", newline="") if isinstance(source, string_types) else source
+        error_file = io.open(errors, "w", encoding="utf-8") if isinstance(errors, string_types) else errors
+
+        # 为了保证线程安全, 不在共享的schema实例上存储状态, 而是浅拷贝一份
+        schema = copy(self)
+        schema._ingesting = True
+
+        result = IngestResult(0, 0, 0)
+        pool = None
+        try:
+            tasks = ((fmt, chunk) for chunk in _chunks(_read_records(source_file, fmt), chunk_size))
+            if processes == 1:
+                done_iter = (_validate_chunk(schema, task) for task in tasks)
+            else:
+                # fork时通过initializer的参数继承app和schema, 不需要pickle
+                state = dict(app=current_app._get_current_object(), schema=schema)
+                pool = multiprocessing.get_context("fork").Pool(processes, _init_worker, (state,))
+                done_iter = self._bounded_imap(pool, tasks, processes * 2)
+
+            for valid, rejects in done_iter:
+                rows = len(valid) + len(rejects)
+                valid, foreign_rejects = self.ingest_check_foreign_keys(valid)
+                rejects += foreign_rejects
+                try:
+                    written = self.ingest_write([data for _, data, _ in valid])
+                except (StaleDataError, DBAPIError) as e:
+                    # 违反约束, 数据库拒绝(如字符串过长)或者要更新的主键不存在
+                    self.db.session.rollback()
+                    written = 0
+                    message = str(getattr(e, "orig", e))
+                    rejects += [(row_no, {"_schema": [message]}, raw) for row_no, _, raw in valid]
+                rejects.sort(key=lambda reject: reject[0])
+
+                if error_file is not None:
+                    for row_no, messages, raw in rejects:
+                        error_file.write(json.dumps({"row": row_no, "errors": messages, "data": raw},
+                                                    ensure_ascii=False, default=str) + "\n")
+
+                result = IngestResult(result.rows + rows, result.written + written, result.rejected + len(rejects))
+                if progress is not None:
+                    progress(result)
+        finally:
+            if pool is not None:
+                pool.close()
+                pool.join()
+            if source_file is not source:
+                source_file.close()
+            if error_file is not None and error_file is not errors:
+                error_file.close()
+
+        return result
+
+    @staticmethod
+    def _bounded_imap(pool, tasks, max_pending):
+        """和imap一样按顺序返回结果, 但是最多只提交max_pending个任务, 不会把整个文件读进内存"""
+        pending = deque()
+        for task in tasks:
+            pending.append(pool.apply_async(_ingest_chunk, (task,)))
+            if len(pending) >= max_pending:
+                yield pending.popleft().get()
+        while pending:
+            yield pending.popleft().get()
+
+    def ingest_check_foreign_keys(self, valid):
+        """
+        每个Foreign字段只查询一次这一块中所有的外键
+        :return: (通过检查的[(行号, data, 原始数据)], 被拒绝的[(行号, 错误, 原始数据)])
+        """
+        rejects = []
+        for func_foreign in self.foreign_fields:
+            name = func_foreign.field_name
+            func_foreign.warmup()
+
+            ids = set()
+            for _, data, _ in valid:
+                value = data.get(name)
+                if value:
+                    ids.update(value if isinstance(value, list) else [value])
+            if not ids:
+                continue
+
+            column = func_foreign.many_primary_key
+            existing = set(row[0] for row in self.db.session.query(column).filter(column.in_(ids)))
+
+            checked = []
+            for row_no, data, raw in valid:
+                value = data.get(name)
+                values = (value if isinstance(value, list) else [value]) if value else []
+                if all(v in existing for v in values):
+                    checked.append((row_no, data, raw))
+                else:
+                    rejects.append((row_no, {name: ["外键{}检查失败".format(name)]}, raw))
+            valid = checked
+
+        return valid, rejects
+
+    def ingest_write(self, data_list):
+        """批量写入一块数据并提交, 返回写入的行数"""
+        if not data_list:
+            return 0
+
+        mapper = inspect(self.model)
+        column_keys = set(prop.key for prop in mapper.column_attrs)
+        list_foreigns = [func_foreign for func_foreign in self.foreign_fields
+                         if any(isinstance(data.get(func_foreign.field_name), list) for data in data_list)]
+
+        inserts, updates = [], []
+        for data in data_list:
+            values = {k: v for k, v in data.items() if k in column_keys}
+            (updates if values.get(self.pk_field) else inserts).append((values, data))
+
+        session = self.db.session
+        # 需要更新外键列表时才取回自增的主键, bulk_insert_mappings会把主键写回values中
+        session.bulk_insert_mappings(self.model, [values for values, _ in inserts],
+                                     return_defaults=bool(list_foreigns))
+        session.bulk_update_mappings(self.model, [values for values, _ in updates])
+
+        for values, data in inserts + updates:
+            for func_foreign in list_foreigns:
+                foreign_ids = data.get(func_foreign.field_name)
+                if foreign_ids and isinstance(foreign_ids, list):
+                    func_foreign.update_foreign(values[self.pk_field], foreign_ids)
+
+        session.commit()
+        return len(data_list)
@@ -1,4 +1,4 @@
-from functools import reduce
+from copy import copy
 
 from marshmallow import fields
 from marshmallow import pre_load, post_load, validates_schema
@@ -23,18 +23,34 @@ class PreLoadListMixin:
         :param data
         :return:
         """
-        data = data.copy()
-        fs = self.fields
-        list_fields = [k for k, v in fs.items() if isinstance(v, fields.List)]
-        for l in list_fields:
-            if data.get(l):
-                data[l] = data[l].split(",")
-        return data
+        result = data
+        for name, field in self.fields.items():
+            if isinstance(field, fields.List) and data.get(name):
+                if result is data:
+                    # 有需要转换的字段时才复制, 不修改传入的data
+                    result = data.copy()
+                result[name] = data[name].split(",")
+        return result
 
 
 class ListBase(_MixinBase):
     """将Filter字段转换为Filter, 将各种条件拼接成SQL"""
 
+    _load_data_only = False  # 为True时post_load不执行查询, 直接返回验证后的data
+
+    _paginate = True  # 为False时不检查分页参数
+
+    def load_data(self, data, paginate=True, **kwargs):
+        """
+        只做反序列化和验证, 不执行查询, 返回验证后的data, 供导出等需要自己拼接SQL的场景使用
+        :param paginate: 是否检查分页参数
+        """
+        # 为了保证线程安全, 不在共享的schema实例上存储状态, 而是浅拷贝一份
+        schema = copy(self)
+        schema._load_data_only = True
+        schema._paginate = paginate
+        return schema.load(data, **kwargs)
+
     def fields_to_filters(self, fields_info):
         """
         重写这个方法来自定义过滤条件, 正常情况下, 使用AND对条件进行连接
@@ -45,7 +61,7 @@ class ListBase(_MixinBase):
             # field_value 可能是Empty
             filter_list.append(filter_field.to_filter(field_value))
 
-        return reduce(and_, filter_list) if filter_list else true()
+        return and_(*filter_list) if filter_list else true()
 
     def order_by(self, data):
         return true()
@@ -63,25 +79,52 @@ class ListBase(_MixinBase):
         :param data  验证的数据
         将query套用在Model上, 重写这个方法来修改sql
         """
+        query = self.filtered_query(data)
+        order_by = self.order_by(data)
+        return self.modify_after_query(query.order_by(order_by), data)
+
+    def filtered_query(self, data):
+        """拼接了JOIN和过滤条件, 但还没有排序和分页的query"""
         query = self.get_query(data)
         query = self.modify_before_query(query, data)
         filters = self.get_filters(data)
-        order_by = self.order_by(data)
-        return self.modify_after_query(query.filter(filters).order_by(order_by), data)
+        query = query.filter(filters)
+
+        having = self.get_having(data)
+        if having is not None:
+            query = query.having(having)
+        return query
 
     def get_query(self, data):
         """获得需要查询的东西, 一般来说是一个模型, 也可以是联合查询, 重写这个方法来获得想要的query, 例如一些join"""
         return self.db.session.query(self.model)
 
-    def get_filters(self, data):
-        real_query_field = {field_info: data.get(
-            field_info.field_name, Empty) for field_info in self.filter_fields}
+    def _to_filters(self, data, having, exclude=()):
+        """Filter字段转换为条件, 没有重写fields_to_filters时直接生成条件, 不需要中间的dict"""
+        filter_fields = (field_info for field_info in self.filter_fields
+                         if bool(field_info.having) is having and field_info.field_name not in exclude)
+
+        if type(self).fields_to_filters is not ListBase.fields_to_filters:
+            return self.fields_to_filters({field_info: data.get(field_info.field_name, Empty)
+                                           for field_info in filter_fields})
 
-        filters = self.fields_to_filters(real_query_field)
-        return filters
+        filter_list = [field_info.to_filter(data.get(field_info.field_name, Empty)) for field_info in filter_fields]
+        return and_(*filter_list) if filter_list else true()
+
+    def get_filters(self, data, exclude=()):
+        """:param exclude: 不参与过滤的字段名, 连同默认值也不会使用"""
+        return self._to_filters(data, False, exclude)
+
+    def get_having(self, data):
+        """聚合函数的过滤条件, 没有时返回None, GROUP BY需要在modify_before_query中添加"""
+        if not any(field_info.having for field_info in self.filter_fields):
+            return None
+        return self._to_filters(data, True)
 
     @post_load
     def make_queries(self, data, **kwargs):
+        if self._load_data_only:
+            return data
         return self.to_sql(data).all()
 
 
@@ -98,6 +141,9 @@ class ListModelMixin(ListBase):
     @validates_schema
     def validate_for_pagination(self, data, **kwargs):
         """验证limit和offset或者page/size"""
+        if not self._paginate:
+            return
+
         limit = data.get("limit")
         offset = data.get("offset")
         page = data.get("page")
@@ -151,4 +197,6 @@ class CountMixin(ListBase):
 
     @post_load
     def make_queries(self, data, **kwargs):
+        if self._load_data_only:
+            return data
         return self.to_sql(data).first()[0]
@@ -0,0 +1,40 @@
+from marshmallow import pre_dump
+
+from flask_serializer.mixins import _MixinBase
+
+
+class LoaderMixin(_MixinBase):
+    """
+    ListMixin查询出来的行没有relationship, 使用Loader字段批量获取关联的数据, 一页数据的查询次数是固定的:
+
+        class OrderLineListSchema(LoaderMixin, ListMixin, BaseSchema):
+            __model__ = OrderLine
+
+            product_id = fields.Integer(query=Query())
+            product_name = fields.String(dump_only=True, loader=Loader("Product.product_name", key="product_id"))
+
+    mixin应该放在其他mixin之前
+    """
+
+    @pre_dump(pass_many=True)
+    def prime_loaders(self, data, many, **kwargs):
+        """dump之前, 每个Loader字段使用一条IN查询获取所有的关联数据"""
+        objs = list(data) if many else [data]
+        for loader in self.loaders.values():
+            loader.prime(objs)
+        return objs if many else data
+
+    def get_attribute(self, obj, attr, default):
+        loader = self.loaders.get(attr)
+        if loader is None:
+            return super(LoaderMixin, self).get_attribute(obj, attr, default)
+        return loader.resolve(obj)
+
+    @property
+    def loaders(self):
+        """attribute -> Loader, 只和only/exclude有关, 缓存在实例上"""
+        if "_loaders" not in self.__dict__:
+            loaders = {loader.field_name: loader for loader in self.loader_fields}
+            self._loaders = {field.attribute or name: loaders[name]
+                             for name, field in self.dump_fields.items() if name in loaders}
+        return self._loaders
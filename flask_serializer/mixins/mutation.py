@@ -0,0 +1,183 @@
+from collections import namedtuple
+
+from marshmallow import fields, post_load
+from marshmallow.exceptions import ValidationError
+from sqlalchemy import func, inspect, select
+
+from flask_serializer.mixins.lists import ListBase
+from flask_serializer.utils.empty import Empty
+
+UPDATE = "update"
+DELETE = "delete"
+
+MutationResult = namedtuple("MutationResult", ("rows", "dry_run"))
+
+
+class BulkMutationMixin(ListBase):
+    """
+    使用Filter字段拼接条件, 一条`UPDATE ... WHERE <filters>`或者`DELETE ... WHERE <filters>`批量修改/删除,
+    不需要先查询出每一个实例再逐个flush
+
+        class ProductDeactivateSchema(BulkMutationMixin, BaseSchema):
+            __model__ = Product
+            mutation = "update"
+            update_values = {"is_active": False}  # 软删除
+            mutation_max_rows = 10000
+
+            sku_name = fields.String(filter=Filter(eq_op))
+
+    参数:
+        - dry_run: 为True时只返回会被影响的行数
+
+    load的结果为`MutationResult(rows, dry_run)`
+
+    **特别说明**:
+        - 没有任何过滤条件时(会影响整张表)抛出ValidationError, 除非设置了mutation_allow_all = True
+
+        - 设置了mutation_max_rows时, 执行之前先计数, 执行之后再检查实际影响的行数, 超过时抛出ValidationError.
+          每次执行都在一个SAVEPOINT(session.begin_nested())中, 只回滚这一次执行, session中其他未提交的修改不受影响
+
+        - 设置了mutation_chunk_size时, 按主键范围分批执行, 每一批提交一次, 避免长时间锁表; 否则由调用者提交.
+          分批执行时超过mutation_max_rows只能回滚当前这一批
+
+        - 被修改/删除的行会被移出FragmentCacheMixin的缓存, 为此需要获取这些行的主键
+          (支持RETURNING时直接返回, 否则多执行一次SELECT), 不需要时设置mutation_evict_fragments = False
+
+        - modify_before_query中有JOIN时, 条件为`主键 IN (SELECT 主键 ...)`, MySQL不支持这种写法
+
+        - session中已经加载的实例不会被同步
+    """
+
+    dry_run = fields.Boolean(load_only=True)
+
+    _paginate = False
+
+    mutation = UPDATE  # update 或者 delete
+
+    update_values = {}  # UPDATE时设置的值, {模型的属性名: 值}
+
+    mutation_max_rows = None  # 影响的行数超过这个值时抛出ValidationError
+
+    mutation_chunk_size = None  # 按主键范围分批执行时, 每一批的主键范围大小
+
+    mutation_allow_all = False  # 为True时允许没有过滤条件, 修改/删除整张表
+
+    mutation_evict_fragments = True  # 是否把影响的行移出FragmentCacheMixin的缓存
+
+    @property
+    def mutation_pk(self):
+        primary_key = inspect(self.model).primary_key
+        if len(primary_key) != 1:
+            raise ValueError("模型%s主键不唯一" % str(self.model))
+        return primary_key[0]
+
+    def get_update_values(self, data):
+        """重写这个方法根据参数决定UPDATE的值"""
+        mapper = inspect(self.model)
+        return {mapper.column_attrs[key].columns[0].name: value for key, value in self.update_values.items()}
+
+    def mutation_condition(self, data):
+        """UPDATE/DELETE的WHERE条件"""
+        if type(self).modify_before_query is ListBase.modify_before_query:
+            condition = self.get_filters(data)
+        else:
+            # 过滤条件可能用到了JOIN的表, 只能使用子查询
+            pk = self.mutation_pk
+            condition = pk.in_(self.filtered_query(data).with_entities(pk).subquery())
+        return condition
+
+    def has_filters(self, data):
+        """是否有生效的过滤条件, 没有传值也没有默认值的Filter字段不生效"""
+        return any(field_info.field_name in data or field_info.default is not Empty
+                   for field_info in self.filter_fields)
+
+    def mutation_count(self, data):
+        return self.filtered_query(data).with_entities(func.count(self.mutation_pk)).scalar()
+
+    def mutation_statement(self, data, condition):
+        table = inspect(self.model).local_table
+        if self.mutation == DELETE:
+            return table.delete().where(condition)
+        if self.mutation == UPDATE:
+            return table.update().where(condition).values(**self.get_update_values(data))
+        raise ValueError("不支持的操作%s" % self.mutation)
+
+    def mutation_ranges(self, data):
+        """:return: [(lower, upper), ...] 左闭右开的主键范围"""
+        pk = self.mutation_pk
+        lower, upper = self.filtered_query(data).with_entities(func.min(pk), func.max(pk)).one()
+        if lower is None:
+            return []
+        return [(start, start + self.mutation_chunk_size)
+                for start in range(lower, upper + 1, self.mutation_chunk_size)]
+
+    def execute_mutation(self, data, condition):
+        """执行一条UPDATE/DELETE, 返回影响的行数, 影响的行会被移出FragmentCacheMixin的缓存"""
+        session = self.db.session
+        statement = self.mutation_statement(data, condition)
+        cache = getattr(self, "fragment_cache", None) if self.mutation_evict_fragments else None
+        if cache is None:
+            return session.execute(statement).rowcount
+
+        pk = self.mutation_pk
+        dialect = self.db.engine.dialect
+        # SQLAlchemy 2.0使用update_returning/delete_returning来表示方言是否支持RETURNING
+        if dialect.name == "postgresql" or getattr(dialect, "%s_returning" % self.mutation, False):
+            pks = [row[0] for row in session.execute(statement.returning(pk))]
+            rows = len(pks)
+        else:
+            pks = [row[0] for row in session.execute(select([pk]).where(condition))]
+            rows = session.execute(statement).rowcount
+
+        for value in pks:
+            cache.evict(self.model, (value, ), session())
+        return rows
+
+    def check_mutation_rows(self, rows):
+        """实际影响的行数超过mutation_max_rows时抛出ValidationError(计数和执行之间可能有新的数据)"""
+        if self.mutation_max_rows is not None and rows > self.mutation_max_rows:
+            raise ValidationError("影响的行数%d超过了上限%d" % (rows, self.mutation_max_rows))
+
+    def execute_checked(self, data, condition, rows=0):
+        """
+        在SAVEPOINT中执行并检查影响的行数, 超过上限时只回滚到SAVEPOINT
+        :param rows: 之前的批次已经影响的行数
+        :return: 加上这一次之后影响的行数
+        """
+        with self.db.session.begin_nested():
+            rows += self.execute_mutation(data, condition)
+            self.check_mutation_rows(rows)
+        return rows
+
+    def mutate(self, data):
+        """:return: 影响的行数"""
+        session = self.db.session
+        condition = self.mutation_condition(data)
+
+        if not self.mutation_chunk_size:
+            return self.execute_checked(data, condition)
+
+        pk = self.mutation_pk
+        rows = 0
+        for lower, upper in self.mutation_ranges(data):
+            rows = self.execute_checked(data, condition & (pk >= lower) & (pk < upper), rows)
+            session.commit()
+        return rows
+
+    @post_load
+    def make_queries(self, data, **kwargs):
+        if self._load_data_only:
+            return data
+
+        dry_run = data.get("dry_run", False)
+        if not dry_run and not self.mutation_allow_all and not self.has_filters(data):
+            raise ValidationError("没有过滤条件, 会影响整张表; 需要设置mutation_allow_all = True")
+
+        if dry_run or self.mutation_max_rows is not None:
+            count = self.mutation_count(data)
+            if dry_run:
+                return MutationResult(count, True)
+            if count > self.mutation_max_rows:
+                raise ValidationError("影响的行数%d超过了上限%d" % (count, self.mutation_max_rows))
+
+        return MutationResult(self.mutate(data), False)
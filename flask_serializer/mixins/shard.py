@@ -0,0 +1,158 @@
+import heapq
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import copy_context
+from functools import total_ordering
+from itertools import islice
+
+from marshmallow import post_load
+from sqlalchemy.orm import Session
+from sqlalchemy.sql import operators
+from sqlalchemy.sql.elements import True_, UnaryExpression
+
+from flask_serializer.mixins.lists import ListBase, CountMixin
+
+
+@total_ordering
+class _SortKey(object):
+    """按每一列各自的方向比较, None排在最后(和PostgreSQL的ASC一致)"""
+
+    __slots__ = ("values", "descending")
+
+    def __init__(self, values, descending):
+        self.values = values
+        self.descending = descending
+
+    def __eq__(self, other):
+        return self.values == other.values
+
+    def __lt__(self, other):
+        for a, b, desc in zip(self.values, other.values, self.descending):
+            if a == b:
+                continue
+            if a is None or b is None:
+                return (b is None) != desc
+            return (a > b) if desc else (a < b)
+        return False
+
+
+class ShardMixin(ListBase):
+    """
+    同样结构的数据分布在多个数据库(Flask-SQLAlchemy的SQLALCHEMY_BINDS)中时, 在所有分片上执行列表或者计数查询,
+    mixin应该放在ListMixin/ListModelMixin/CountMixin之前
+
+    - 传入了分片键(shard_key)并且能确定分片时, 只查询对应的分片
+
+    - 否则在线程池中并发查询所有的分片:
+        - 列表: 每个分片查询前offset + limit行, 按order_by的列多路归并之后再limit/offset
+        - 计数: 每个分片的结果相加
+
+        class ProductListSchema(ShardMixin, ListModelMixin, BaseSchema):
+            __model__ = Product
+            shard_binds = ("tenant_a", "tenant_b")
+            shard_key = "tenant"
+            shard_map = {"a": "tenant_a", "b": "tenant_b"}
+
+    **特别说明**:
+        - order_by需要返回列或者列的asc()/desc(), 没有排序时按分片的顺序拼接
+
+        - 查询结果来自不同的session, 模型实例在返回之前已经和session分离
+    """
+
+    shard_binds = ()  # 分片的bind名称
+
+    shard_key = None  # 分片键对应的Filter字段名
+
+    shard_map = {}  # 分片键的值 -> bind名称
+
+    def shard_for(self, value):
+        """:return: 分片键的值对应的bind名称, 不能确定时返回None"""
+        return self.shard_map.get(value)
+
+    def route(self, data):
+        """:return: 需要查询的bind名称"""
+        value = data.get(self.shard_key) if self.shard_key else None
+        if value is None:
+            return list(self.shard_binds)
+
+        binds = set(self.shard_for(v) for v in (value if isinstance(value, (list, tuple, set)) else [value]))
+        if None in binds:
+            return list(self.shard_binds)
+        return [bind for bind in self.shard_binds if bind in binds]
+
+    def _order_keys(self, data):
+        """:return: [(排序的列, 是否倒序), ...]"""
+        order_by = self.order_by(data)
+        keys = []
+        for clause in order_by if isinstance(order_by, (list, tuple)) else [order_by]:
+            if isinstance(clause, True_):
+                continue
+            descending = False
+            while isinstance(clause, UnaryExpression) and clause.modifier is not None:
+                if clause.modifier is operators.desc_op:
+                    descending = True
+                clause = clause.element
+            keys.append((clause, descending))
+        return keys
+
+    def _shard_query(self, query, engine):
+        session = Session(bind=engine)
+        try:
+            rows = query.with_session(session).all()
+            session.expunge_all()
+            return rows
+        finally:
+            session.close()
+
+    def _scatter(self, binds, queries):
+        engines = [self.db.get_engine(bind=bind) for bind in binds]
+        if len(engines) == 1:
+            return [self._shard_query(queries[0], engines[0])]
+        # 每个线程使用一份context的拷贝, 保留SQL注释和语句超时的设置
+        contexts = [copy_context() for _ in engines]
+        with ThreadPoolExecutor(max_workers=len(engines)) as executor:
+            return list(executor.map(lambda context, query, engine: context.run(self._shard_query, query, engine),
+                                     contexts, queries, engines))
+
+    def shard_count(self, data, binds):
+        query = self.to_sql(data)
+        return sum(rows[0][0] for rows in self._scatter(binds, [query] * len(binds)))
+
+    def shard_list(self, data, binds):
+        if len(binds) == 1:
+            return self._scatter(binds, [self.to_sql(data)])[0]
+
+        limit, offset = data.get("limit"), data.get("offset") or 0
+        shard_data = dict(data)
+        if limit is not None:
+            # 每个分片都需要查询前offset + limit行
+            shard_data.update(limit=offset + limit, offset=0)
+
+        order_keys = self._order_keys(data)
+        query = self.to_sql(shard_data)
+        entity = isinstance(query.column_descriptions[0]["expr"], type)
+        if order_keys:
+            query = query.add_columns(*[column.label("_shard_order_%d" % i)
+                                        for i, (column, _) in enumerate(order_keys)])
+
+        results = self._scatter(binds, [query] * len(binds))
+        if not order_keys:
+            merged = (row for rows in results for row in rows)
+        else:
+            size = len(order_keys)
+            descending = [desc for _, desc in order_keys]
+            merged = heapq.merge(*results, key=lambda row: _SortKey(tuple(row[-size:]), descending))
+            if entity:
+                merged = (row[0] for row in merged)
+
+        stop = offset + limit if limit is not None else None
+        return list(islice(merged, offset, stop))
+
+    @post_load
+    def make_queries(self, data, **kwargs):
+        if self._load_data_only:
+            return data
+
+        binds = self.route(data)
+        if isinstance(self, CountMixin):
+            return self.shard_count(data, binds)
+        return self.shard_list(data, binds)
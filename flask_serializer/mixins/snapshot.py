@@ -0,0 +1,121 @@
+import hashlib
+import json
+import uuid
+from array import array
+from collections import namedtuple
+
+from marshmallow import fields, post_load
+from marshmallow.exceptions import ValidationError
+from sqlalchemy import inspect
+
+from flask_serializer.mixins.lists import ListBase
+from flask_serializer.utils.fragment_cache import LRUCache
+
+Snapshot = namedtuple("Snapshot", ("rows", "snapshot", "total", "truncated"))
+
+KEY_PREFIX = "flask_serializer:snapshot:"
+
+
+class SnapshotMixin(ListBase):
+    """
+    快照分页: 第一次请求时执行一次过滤和排序, 把有序的主键列表(int64数组)放入有过期时间的缓存中,
+    之后的请求带上snapshot参数, 只需要按主键查询这一页的行, 翻页时不会因为新插入的数据而错位.
+    mixin应该放在ListMixin/ListModelMixin之前
+
+    参数:
+        - snapshot: 上一次返回的快照, 不传则创建新的快照
+
+    load的结果为`Snapshot(rows, snapshot, total, truncated)`
+
+    **特别说明**:
+        - 之后的请求需要带上和创建快照时相同的过滤条件, 不一致时抛出ValidationError;
+          快照创建之后被删除的行不会出现在结果中
+
+        - 只支持单一整数主键的模型, 快照最多保存snapshot_max_rows行, 超过时truncated为True,
+          total只是快照中的行数, 不是满足条件的总行数
+
+        - 默认使用进程内的LRUCache, 多进程部署时需要设置为共享的缓存(例如Flask-Caching的cache)
+    """
+
+    snapshot = fields.String(load_only=True)
+
+    snapshot_cache = LRUCache(256)  # 提供get/set(key, value, timeout)/delete的缓存
+
+    snapshot_timeout = 600  # 快照的过期时间(秒)
+
+    snapshot_max_rows = 100000
+
+    @property
+    def snapshot_pk(self):
+        primary_key = inspect(self.model).primary_key
+        if len(primary_key) != 1:
+            raise ValueError("模型%s主键不唯一" % str(self.model))
+        return primary_key[0]
+
+    def filter_digest(self, data):
+        """验证之后的过滤条件的摘要, 和主键数组一起保存"""
+        filters = {field_info.field_name: data[field_info.field_name] for field_info in self.filter_fields
+                   if field_info.field_name in data}
+        value = json.dumps([type(self).__module__, type(self).__name__, filters], sort_keys=True, default=str)
+        return hashlib.md5(value.encode("utf-8")).hexdigest()
+
+    def create_snapshot(self, data):
+        """:return: (快照, 有序的主键数组, 是否超过了snapshot_max_rows)"""
+        pk = self.snapshot_pk
+        order_by = self.order_by(data)
+        order_by = list(order_by) if isinstance(order_by, (list, tuple)) else [order_by]
+
+        # 多取一行来判断是否被截断
+        query = self.filtered_query(data).with_entities(pk).order_by(*(order_by + [pk])) \
+            .limit(self.snapshot_max_rows + 1)
+        pks = array("q", (row[0] for row in query))
+        truncated = len(pks) > self.snapshot_max_rows
+        if truncated:
+            pks.pop()
+
+        snapshot = uuid.uuid4().hex
+        self.snapshot_cache.set(KEY_PREFIX + snapshot, (self.filter_digest(data), truncated, pks.tobytes()),
+                                timeout=self.snapshot_timeout)
+        return snapshot, pks, truncated
+
+    def load_snapshot(self, snapshot, data):
+        """:return: (有序的主键数组, 是否超过了snapshot_max_rows)"""
+        value = self.snapshot_cache.get(KEY_PREFIX + snapshot)
+        if value is None:
+            raise ValidationError("快照不存在或者已经过期", field_name="snapshot")
+        digest, truncated, value = value
+        if digest != self.filter_digest(data):
+            raise ValidationError("过滤条件和创建快照时不一致", field_name="snapshot")
+        pks = array("q")
+        pks.frombytes(value)
+        return pks, truncated
+
+    def snapshot_rows(self, data, pks):
+        """按主键查询一页的行, 保持快照中的顺序"""
+        if not pks:
+            return []
+
+        pk = self.snapshot_pk
+        query = self.get_query(data)
+        query = self.modify_before_query(query, data)
+        entity_query = isinstance(query.column_descriptions[0]["expr"], type)
+        query = query.add_columns(pk.label("_snapshot_pk")).filter(pk.in_(pks))
+
+        rows = {row._snapshot_pk: row[0] if entity_query else row for row in query}
+        return [rows[key] for key in pks if key in rows]
+
+    @post_load
+    def make_queries(self, data, **kwargs):
+        if self._load_data_only:
+            return data
+
+        if data.get("snapshot"):
+            snapshot = data["snapshot"]
+            pks, truncated = self.load_snapshot(snapshot, data)
+        else:
+            snapshot, pks, truncated = self.create_snapshot(data)
+
+        offset = data.get("offset") or 0
+        limit = data.get("limit")
+        page = pks[offset:offset + limit] if limit is not None else pks[offset:]
+        return Snapshot(self.snapshot_rows(data, list(page)), snapshot, len(pks), truncated)
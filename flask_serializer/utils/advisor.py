@@ -0,0 +1,169 @@
+# -*- coding: utf-8 -*-
+"""
+静态的索引检查: 检查Filter字段, order_by和ListMixin的query_fields所使用的列是否有索引
+"""
+import warnings
+from collections import namedtuple
+
+from sqlalchemy import Column, UniqueConstraint
+from sqlalchemy.sql.operators import like_op, ilike_op, ne, notin_op, notlike_op, notilike_op
+
+WARNING = "warning"
+INFO = "info"
+
+IndexAdvice = namedtuple("IndexAdvice", ("schema", "field", "level", "message"))
+
+NOT_SARGABLE_OPERATORS = (ne, notin_op, notlike_op, notilike_op)
+
+
+class IndexWarning(UserWarning):
+    pass
+
+
+def table_column(expr):
+    """InstrumentedAttribute/Column -> Column, 表达式等返回None"""
+    if hasattr(expr, "__clause_element__"):
+        expr = expr.__clause_element__()
+    if isinstance(expr, Column) and expr.table is not None:
+        # 模型上的属性得到的是Annotated的列, 换成表中原本的列
+        return expr.table.c[expr.key]
+    return None
+
+
+def index_columns(table):
+    """表中每个索引, 主键和唯一约束的列(有序)"""
+    indexes = [list(index.columns) for index in table.indexes]
+    indexes.append(list(table.primary_key.columns))
+    indexes.extend(list(constraint.columns) for constraint in table.constraints
+                   if isinstance(constraint, UniqueConstraint))
+    return [columns for columns in indexes if columns]
+
+
+def _is_leading(column, indexes):
+    return any(columns[0] is column for columns in indexes)
+
+
+def _is_indexed(column, indexes):
+    return any(c is column for columns in indexes for c in columns)
+
+
+def _column_label(column):
+    return "%s.%s" % (column.table.name, column.name)
+
+
+def _order_by_columns(schema):
+    """调用order_by({})获得排序的列, 依赖请求参数的order_by会被跳过"""
+    try:
+        clauses = schema.order_by({})
+    except Exception:
+        return []
+    if not isinstance(clauses, (list, tuple)):
+        clauses = [clauses]
+    columns = []
+    for clause in clauses:
+        # desc()/asc()包装过的列
+        column = table_column(getattr(clause, "element", clause))
+        if column is not None:
+            columns.append(column)
+    return columns
+
+
+def advise(schema_class):
+    """:return: [IndexAdvice, ...]"""
+    schema = schema_class()  # 实例化时才会初始化功能性field
+    name = schema_class.__name__
+    advices = []
+    filter_columns = []
+
+    for filter_field in schema_class.filter_fields:
+        field_name = filter_field.field_name
+        column = table_column(filter_field.column)
+        if column is None:
+            advices.append(IndexAdvice(name, field_name, INFO, "过滤条件不是一个列, 无法检查索引"))
+            continue
+
+        filter_columns.append(column)
+        indexes = index_columns(column.table)
+        label = _column_label(column)
+
+        if not _is_indexed(column, indexes):
+            advices.append(IndexAdvice(name, field_name, WARNING, "%s没有索引, 过滤时会全表扫描" % label))
+        elif not _is_leading(column, indexes):
+            advices.append(IndexAdvice(name, field_name, WARNING, "%s不是任何索引的第一列" % label))
+
+        operator = filter_field.operator
+        if operator in (like_op, ilike_op):
+            if _leading_wildcard(filter_field):
+                advices.append(IndexAdvice(name, field_name, WARNING,
+                                           "%s使用了左模糊匹配('%%v'), 不能使用B-Tree索引" % label))
+            if operator is ilike_op:
+                advices.append(IndexAdvice(name, field_name, INFO,
+                                           "%s使用了ILIKE, 需要lower()表达式索引或者trigram索引" % label))
+        elif operator in NOT_SARGABLE_OPERATORS:
+            advices.append(IndexAdvice(name, field_name, INFO, "%s使用了否定条件, 通常不能使用索引" % label))
+
+    for column in _order_by_columns(schema):
+        if not _is_leading(column, index_columns(column.table)):
+            advices.append(IndexAdvice(name, "order_by", WARNING,
+                                       "排序列%s没有索引, 分页时需要排序整个结果集" % _column_label(column)))
+
+    advices.extend(_covering_advice(schema_class, name, filter_columns))
+    return advices
+
+
+def _leading_wildcard(filter_field):
+    sample = "v"
+    try:
+        if callable(filter_field.value_process):
+            sample = filter_field.value_process(sample)
+        if filter_field.value_process:
+            sample = filter_field._value_process(sample)
+    except Exception:
+        return False
+    return isinstance(sample, str) and sample.startswith("%")
+
+
+def _covering_advice(schema_class, name, filter_columns):
+    """ListMixin只查询部分列, 如果过滤列和查询列都在一个索引中, 可以只扫描索引"""
+    query_columns = []
+    for query_field in getattr(schema_class, "query_fields", ()):
+        column = table_column(query_field.column)
+        if column is not None:
+            query_columns.append(column)
+
+    if not query_columns or not filter_columns:
+        return []
+
+    tables = set(column.table for column in query_columns + filter_columns)
+    if len(tables) != 1:
+        return []
+
+    table = tables.pop()
+    needed = set(filter_columns) | set(query_columns)
+    if any(needed <= set(columns) for columns in index_columns(table)):
+        return []
+
+    keys = ", ".join(column.name for column in filter_columns)
+    include = ", ".join(column.name for column in query_columns if column not in set(filter_columns))
+    suggestion = "CREATE INDEX ON %s (%s)" % (table.name, keys)
+    if include:
+        suggestion += " INCLUDE (%s)" % include
+    return [IndexAdvice(name, "query_fields", INFO, "可以建立覆盖索引, 只扫描索引即可: %s" % suggestion)]
+
+
+def warn(advices):
+    for advice in advices:
+        if advice.level != INFO:
+            warnings.warn("%s.%s: %s" % (advice.schema, advice.field, advice.message), IndexWarning, stacklevel=3)
+
+
+def report(schema_classes):
+    """:return: 所有schema的检查结果, 每一行一条"""
+    lines = []
+    for schema_class in schema_classes:
+        advices = advise(schema_class)
+        if not advices:
+            continue
+        lines.append(schema_class.__name__)
+        lines.extend("    [%s] %s: %s" % (advice.level, advice.field, advice.message) for advice in advices)
+    return lines
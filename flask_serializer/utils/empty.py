@@ -1,4 +1,34 @@
 # -*- coding: utf-8 -*-
 
-class Empty(object):
-    pass
+class _EmptyType(object):
+    """没有传值的占位符, 全局只有一个实例Empty, 使用`is Empty`判断"""
+
+    __slots__ = ()
+
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(_EmptyType, cls).__new__(cls)
+        return cls._instance
+
+    def __bool__(self):
+        return False
+
+    __nonzero__ = __bool__
+
+    def __repr__(self):
+        return "Empty"
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def __reduce__(self):
+        # pickle之后依然是同一个实例
+        return _EmptyType, ()
+
+
+Empty = _EmptyType()
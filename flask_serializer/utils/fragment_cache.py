@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+"""
+dump结果的片段缓存, 以(表, 主键)为单位存储, 同一行在不同schema/only/exclude下的结果放在一起:
+
+    "flask_serializer:fragment:product:1" -> {"app.schemas.ProductSchema|None|None": ("2020-01-01", {...}), ...}
+
+这样一行数据被修改时只需要删除一个key
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from sqlalchemy import event, inspect
+
+KEY_PREFIX = "flask_serializer:fragment:"
+
+
+class LRUCache(object):
+    """进程内的LRU, 和共享的缓存后端(例如Flask-Caching的cache)一样提供get/set/delete"""
+
+    def __init__(self, maxsize=1024, default_timeout=None):
+        """:param default_timeout: 过期时间(秒), None则不过期"""
+        self.maxsize = maxsize
+        self.default_timeout = default_timeout
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            expires, value = item
+            if expires is not None and expires < time.time():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, timeout=None):
+        timeout = self.default_timeout if timeout is None else timeout
+        expires = time.time() + timeout if timeout else None
+        with self._lock:
+            self._data[key] = (expires, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class FragmentCache(object):
+    """
+    :param backend: 提供get/set/delete的缓存对象, 默认使用进程内的LRUCache;
+                    使用共享的后端(Redis等)时, 缓存的值需要能被pickle
+    :param maxsize: 默认LRUCache的大小
+    """
+
+    def __init__(self, backend=None, maxsize=1024):
+        self.backend = backend if backend is not None else LRUCache(maxsize)
+        self._sessions = []  # 已经安装了监听的session
+        self._evict_key = "flask_serializer_evict:%d" % id(self)  # 多个FragmentCache监听同一个session时互不影响
+        self._install_lock = threading.Lock()
+
+    @staticmethod
+    def identity_key(model, identity):
+        table = inspect(model).base_mapper.local_table.name
+        return "%s%s:%s" % (KEY_PREFIX, table, ",".join(str(value) for value in identity))
+
+    def get(self, key, variant, version):
+        fragments = self.backend.get(key)
+        if not fragments:
+            return None
+        cached = fragments.get(variant)
+        if cached is None or cached[0] != version:
+            return None
+        return cached[1]
+
+    def set(self, key, variant, version, fragment):
+        fragments = dict(self.backend.get(key) or {})
+        fragments[variant] = (version, fragment)
+        self.backend.set(key, fragments)
+
+    def evict(self, model, identity, session=None):
+        """
+        删除一行的所有片段, 传入session时在事务提交之后再删除一次,
+        避免提交之前有其他请求又缓存了旧的数据
+        """
+        key = self.identity_key(model, identity)
+        self.backend.delete(key)
+        if session is not None:
+            session.info.setdefault(self._evict_key, set()).add(key)
+
+    def install(self, session):
+        """监听session的flush, 被修改和删除的实例会被移出缓存; 同一个session只安装一次"""
+        if any(installed is session for installed in self._sessions):
+            return
+        with self._install_lock:
+            if any(installed is session for installed in self._sessions):
+                return
+            self._install(session)
+            self._sessions.append(session)
+
+    def _install(self, session):
+        @event.listens_for(session, "after_flush")
+        def evict_flushed(session, flush_context):
+            for instance in list(session.dirty) + list(session.deleted):
+                state = inspect(instance)
+                if state.key is not None:
+                    self.evict(state.class_, state.key[1], session)
+
+        @event.listens_for(session, "after_commit")
+        def evict_committed(session):
+            for key in session.info.pop(self._evict_key, ()):
+                self.backend.delete(key)
+
+        @event.listens_for(session, "after_rollback")
+        def clear_pending(session):
+            session.info.pop(self._evict_key, None)
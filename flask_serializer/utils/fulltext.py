@@ -0,0 +1,201 @@
+# -*- coding: utf-8 -*-
+"""
+全文检索, 代替`Filter(like_op, value_process=_like_full_side)`这种不能使用索引的`'%v%'`查询
+
+    product_name = fields.String(filter=Filter(fulltext_op))
+
+    - SQLite: `product.id IN (SELECT rowid FROM product_fts WHERE product_fts MATCH '"product_name" : ("v")')`,
+      product_fts是FTS5的外部内容表(external content table)
+
+    - PostgreSQL: `to_tsvector('simple', product.product_name) @@ plainto_tsquery('simple', 'v')`,
+      配合同样表达式的GIN索引
+
+    - 其他数据库: 退化为`ILIKE '%v%'`
+
+索引使用create_fulltext_index创建
+"""
+import re
+
+from sqlalchemy import Boolean, Float, bindparam, func, literal_column, null, select, table, text
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.expression import ColumnElement
+
+from flask_serializer.utils.advisor import table_column
+
+DEFAULT_CONFIG = "simple"  # PostgreSQL的text search configuration, 需要和索引使用的一致
+
+
+def fts_table_name(table):
+    return "%s_fts" % table.name
+
+
+def _fts5_query(column, value):
+    """把普通的文本转换为FTS5的查询: 每个词作为一个短语, 词之间为AND, 并且只匹配这一列"""
+    words = re.findall(r"\w+", value, re.UNICODE)
+    if not words:
+        return None
+    return '%s : (%s)' % (_fts5_string(column.name), " ".join(_fts5_string(word) for word in words))
+
+
+def _fts5_string(value):
+    return '"%s"' % value.replace('"', '""')
+
+
+class _FullTextBase(ColumnElement):
+    inherit_cache = False
+
+    def __init__(self, column, value, config=DEFAULT_CONFIG):
+        self.column = table_column(column)
+        if self.column is None:
+            raise ValueError("全文检索只支持模型中的列")
+        self.value = value
+        self.config = config
+
+
+class FullTextMatch(_FullTextBase):
+    type = Boolean()
+    _is_implicitly_boolean = True  # 否则不支持布尔类型的数据库中会被编译为`... = 1`
+
+
+class FullTextRank(_FullTextBase):
+    """匹配程度, 越大越匹配"""
+    type = Float()
+
+
+def _fts5_match(element, compiler):
+    column = element.column
+    fts_name = fts_table_name(column.table)
+    query = _fts5_query(column, element.value)
+    if query is None:
+        return None, fts_name
+    fts_column = literal_column(compiler.preparer.quote(fts_name))
+    return fts_column.op("MATCH")(bindparam(None, query, unique=True)), fts_name
+
+
+@compiles(FullTextMatch)
+def _compile_match(element, compiler, **kw):
+    return compiler.process(element.column.ilike("%" + element.value + "%"), **kw)
+
+
+@compiles(FullTextMatch, "sqlite")
+def _compile_match_sqlite(element, compiler, **kw):
+    match, fts_name = _fts5_match(element, compiler)
+    if match is None:
+        return compiler.process(text("0 = 1"), **kw)
+    primary_key = list(element.column.table.primary_key.columns)[0]
+    rowids = select([literal_column("rowid")]).select_from(table(fts_name)).where(match)
+    return compiler.process(primary_key.in_(rowids), **kw)
+
+
+@compiles(FullTextMatch, "postgresql")
+def _compile_match_postgresql(element, compiler, **kw):
+    expression = func.to_tsvector(element.config, element.column).op("@@")(
+        func.plainto_tsquery(element.config, element.value))
+    return compiler.process(expression, **kw)
+
+
+@compiles(FullTextRank)
+def _compile_rank(element, compiler, **kw):
+    # ORDER BY中的数字常量会被当作列的序号
+    return compiler.process(null(), **kw)
+
+
+@compiles(FullTextRank, "sqlite")
+def _compile_rank_sqlite(element, compiler, **kw):
+    match, fts_name = _fts5_match(element, compiler)
+    if match is None:
+        return compiler.process(null(), **kw)
+    primary_key = list(element.column.table.primary_key.columns)[0]
+    # bm25越小越匹配, 取负数和PostgreSQL的ts_rank保持一致
+    rank = select([-func.bm25(literal_column(compiler.preparer.quote(fts_name)))]).select_from(table(fts_name)) \
+        .where(match).where(literal_column("rowid") == primary_key).as_scalar()
+    return compiler.process(rank, **kw)
+
+
+@compiles(FullTextRank, "postgresql")
+def _compile_rank_postgresql(element, compiler, **kw):
+    rank = func.ts_rank(func.to_tsvector(element.config, element.column),
+                        func.plainto_tsquery(element.config, element.value))
+    return compiler.process(rank, **kw)
+
+
+def fulltext_op(column, value):
+    """Filter的operator: Filter(fulltext_op)"""
+    return FullTextMatch(column, value)
+
+
+def fulltext_rank(column, value, config=DEFAULT_CONFIG):
+    """排序使用的匹配程度, 例如在order_by中: `fulltext_rank(Product.product_name, data["q"]).desc()`"""
+    return FullTextRank(column, value, config)
+
+
+def create_fulltext_index(engine, *columns, **kwargs):
+    """
+    创建全文检索的索引, 并同步已有的数据
+
+    - SQLite: 每个表一个FTS5外部内容表, columns需要一次传入这个表所有需要检索的列, 通过触发器和原表保持同步
+    - PostgreSQL: 每一列一个`to_tsvector(config, column)`的GIN索引
+
+    :param columns: 同一个表中的列
+    :param config: PostgreSQL的text search configuration
+    :param tokenize: SQLite的tokenizer, 中文可以使用"trigram"(SQLite 3.34+)
+    """
+    config = kwargs.pop("config", DEFAULT_CONFIG)
+    tokenize = kwargs.pop("tokenize", "unicode61")
+
+    columns = [table_column(column) for column in columns]
+    tables = set(column.table for column in columns)
+    if len(tables) != 1:
+        raise ValueError("只能传入同一个表中的列")
+    model_table = tables.pop()
+
+    if engine.dialect.name == "sqlite":
+        statements = _sqlite_fts_statements(model_table, columns, tokenize, engine.dialect.identifier_preparer)
+    elif engine.dialect.name == "postgresql":
+        statements = _postgresql_index_statements(model_table, columns, config, engine.dialect.identifier_preparer)
+    else:
+        raise NotImplementedError("%s不支持全文检索索引" % engine.dialect.name)
+
+    with engine.begin() as connection:
+        for statement in statements:
+            connection.execute(statement)
+
+
+def _sql_string(value):
+    return "'%s'" % value.replace("'", "''")
+
+
+def _postgresql_index_statements(model_table, columns, config, preparer):
+    """标识符全部加引号, config为字符串常量(DDL不能使用绑定参数)"""
+    return [text("CREATE INDEX IF NOT EXISTS %s ON %s USING gin (to_tsvector(%s, %s))"
+                 % (preparer.quote("ix_%s_%s_fts" % (model_table.name, column.name)),
+                    preparer.format_table(model_table), _sql_string(config), preparer.quote(column.name)))
+            for column in columns]
+
+
+def _sqlite_fts_statements(model_table, columns, tokenize, preparer):
+    """标识符全部加引号, FTS5的选项为字符串常量"""
+    quote = preparer.quote
+    fts_name = fts_table_name(model_table)
+    pk = list(model_table.primary_key.columns)[0].name
+    context = dict(
+        fts=quote(fts_name), table=preparer.format_table(model_table), pk=quote(pk),
+        names=", ".join(quote(column.name) for column in columns),
+        new=", ".join("new.%s" % quote(column.name) for column in columns),
+        old=", ".join("old.%s" % quote(column.name) for column in columns),
+        ai=quote(fts_name + "_ai"), ad=quote(fts_name + "_ad"), au=quote(fts_name + "_au"),
+        content=_sql_string(model_table.name), content_rowid=_sql_string(pk), tokenize=_sql_string(tokenize),
+    )
+
+    return [text(statement % context) for statement in (
+        "CREATE VIRTUAL TABLE IF NOT EXISTS %(fts)s USING fts5(%(names)s, content=%(content)s, "
+        "content_rowid=%(content_rowid)s, tokenize=%(tokenize)s)",
+        "CREATE TRIGGER IF NOT EXISTS %(ai)s AFTER INSERT ON %(table)s BEGIN "
+        "INSERT INTO %(fts)s(rowid, %(names)s) VALUES (new.%(pk)s, %(new)s); END",
+        "CREATE TRIGGER IF NOT EXISTS %(ad)s AFTER DELETE ON %(table)s BEGIN "
+        "INSERT INTO %(fts)s(%(fts)s, rowid, %(names)s) VALUES ('delete', old.%(pk)s, %(old)s); END",
+        "CREATE TRIGGER IF NOT EXISTS %(au)s AFTER UPDATE ON %(table)s BEGIN "
+        "INSERT INTO %(fts)s(%(fts)s, rowid, %(names)s) VALUES ('delete', old.%(pk)s, %(old)s); "
+        "INSERT INTO %(fts)s(rowid, %(names)s) VALUES (new.%(pk)s, %(new)s); END",
+        "INSERT INTO %(fts)s(%(fts)s) VALUES ('rebuild')",
+    )]
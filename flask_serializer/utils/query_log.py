@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+"""
+给schema执行的SQL加上sqlcommenter格式的注释(schema类, mixin, Flask endpoint), 并记录慢查询
+
+    /*endpoint='product_list',mixin='ListMixin',schema='ProductListSchema'*/
+"""
+import logging
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from flask import has_request_context, request
+from six.moves.urllib.parse import quote
+from sqlalchemy import event
+
+logger = logging.getLogger("flask_serializer.sql")
+
+_sql_tags = ContextVar("flask_serializer_sql_tags", default=None)
+
+EXPLAIN_PREFIX = {
+    "sqlite": "EXPLAIN QUERY PLAN ",
+}
+
+
+def _mixin_name(schema):
+    """schema所使用的flask_serializer中的mixin"""
+    from flask_serializer.mixins import _MixinBase
+
+    for cls in type(schema).__mro__:
+        if cls.__module__.startswith("flask_serializer.mixins") and issubclass(cls, _MixinBase) \
+                and cls is not _MixinBase:
+            return cls.__name__
+    return None
+
+
+@contextmanager
+def sql_context(schema):
+    """在这个上下文中执行的SQL都会带上schema的信息, 嵌套时使用最外层的schema"""
+    if _sql_tags.get() is not None:
+        yield
+        return
+
+    tags = {"schema": type(schema).__name__}
+    mixin = _mixin_name(schema)
+    if mixin:
+        tags["mixin"] = mixin
+    if has_request_context() and request.endpoint:
+        tags["endpoint"] = request.endpoint
+
+    token = _sql_tags.set(tags)
+    try:
+        yield
+    finally:
+        _sql_tags.reset(token)
+
+
+def current_tags():
+    return _sql_tags.get()
+
+
+def make_comment(tags):
+    """sqlcommenter格式: key按字母排序, value使用url编码并用单引号包围"""
+    return "/*%s*/" % ",".join("%s='%s'" % (quote(key), quote(str(tags[key]), safe=""))
+                               for key in sorted(tags))
+
+
+def _explain(conn, statement, parameters, context):
+    prefix = EXPLAIN_PREFIX.get(conn.dialect.name, "EXPLAIN ")
+    cursor = conn.connection.cursor()  # 使用新的游标, 不能影响当前语句的结果
+    try:
+        cursor.execute(prefix + statement, parameters)
+        return "\n".join(" ".join(str(column) for column in row) for row in cursor.fetchall())
+    except Exception as e:  # EXPLAIN失败不能影响业务
+        return "EXPLAIN失败: %r" % e
+    finally:
+        cursor.close()
+
+
+def install(engine, comment=True, slow_threshold=None, explain=False):
+    """
+    :param engine: SQLAlchemy engine
+    :param comment: 是否给SQL加上注释
+    :param slow_threshold: 慢查询的阈值(秒), None则不记录
+    :param explain: 是否记录慢查询的EXPLAIN
+    """
+    if comment:
+        @event.listens_for(engine, "before_cursor_execute", retval=True)
+        def add_comment(conn, cursor, statement, parameters, context, executemany):
+            tags = _sql_tags.get()
+            if tags:
+                statement = "%s %s" % (statement, make_comment(tags))
+            return statement, parameters
+
+    if slow_threshold is not None:
+        # 开始时间保存在这一次执行的context上, 后面的before_cursor_execute抛出异常时
+        # after_cursor_execute和handle_error都不会执行, 保存在连接上会一直残留
+        @event.listens_for(engine, "before_cursor_execute")
+        def start_timer(conn, cursor, statement, parameters, context, executemany):
+            if context is not None:
+                context._fs_query_start = time.time()
+
+        @event.listens_for(engine, "after_cursor_execute")
+        def log_slow_query(conn, cursor, statement, parameters, context, executemany):
+            start = getattr(context, "_fs_query_start", None)
+            if start is None:
+                return
+            duration = time.time() - start
+            if duration < slow_threshold:
+                return
+
+            plan = None
+            if explain and not executemany and statement.lstrip().upper().startswith("SELECT"):
+                plan = _explain(conn, statement, parameters, context)
+
+            logger.warning("慢查询 %.3fs tags=%s\n%s\nparameters=%r%s", duration, _sql_tags.get(), statement,
+                           parameters, "\n" + plan if plan else "")
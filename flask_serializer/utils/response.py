@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+"""
+dump之后直接编码为Response, 代替`jsonify(schema.dump(data))`:
+
+    - JSON使用orjson(没有安装时使用标准库json), msgpack需要安装msgpack
+    - 根据请求头Accept选择格式, 默认为JSON
+    - Decimal编码为字符串(保留精度), date/datetime编码为ISO 8601
+    - stream=True时分批dump并且分批输出, 不需要把整页数据都放在内存中
+"""
+import datetime
+import decimal
+import json
+from collections import OrderedDict
+from itertools import islice
+
+from flask import Response, has_request_context, request, stream_with_context
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+JSON = "application/json"
+MSGPACK = "application/msgpack"
+
+
+def _default(obj):
+    if isinstance(obj, decimal.Decimal):
+        return str(obj)
+    if isinstance(obj, (datetime.date, datetime.time)):
+        return obj.isoformat()
+    raise TypeError("%r is not serializable" % obj)
+
+
+def _json_dumps(obj):
+    if orjson is not None:
+        return orjson.dumps(obj, default=_default, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(obj, default=_default, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def _msgpack_dumps(obj):
+    return msgpack.packb(obj, default=_default, use_bin_type=True, datetime=False)
+
+
+def _stream_json(dumps, chunks):
+    yield b"["
+    first = True
+    for chunk in chunks:
+        if not chunk:
+            continue
+        # 一批数据编码为一个数组, 去掉两边的[]再拼接
+        body = dumps(chunk)[1:-1]
+        yield body if first else b"," + body
+        first = False
+    yield b"]"
+
+
+def _stream_msgpack(dumps, chunks, size):
+    packer = msgpack.Packer(default=_default, use_bin_type=True, datetime=False)
+    yield packer.pack_array_header(size)
+    for chunk in chunks:
+        for item in chunk:
+            yield packer.pack(item)
+
+
+# mimetype -> dumps(obj) -> bytes, 按照优先级排列, 可以使用register_encoder增加其他格式
+ENCODERS = OrderedDict([(JSON, _json_dumps)])
+if msgpack is not None:
+    ENCODERS[MSGPACK] = _msgpack_dumps
+
+
+def register_encoder(mimetype, dumps):
+    """:param dumps: callable(obj) -> bytes"""
+    ENCODERS[mimetype] = dumps
+
+
+def negotiate():
+    """根据Accept选择返回的格式"""
+    if has_request_context():
+        mimetype = request.accept_mimetypes.best_match(list(ENCODERS))
+        if mimetype:
+            return mimetype
+    return JSON
+
+
+def _dump_chunks(schema, data, chunk_size):
+    iterator = iter(data)
+    while True:
+        chunk = list(islice(iterator, chunk_size))
+        if not chunk:
+            return
+        yield schema.dump(chunk, many=True)
+
+
+def dump_response(schema, data, many=None, status=200, stream=False, chunk_size=1000, mimetype=None, headers=None):
+    """
+    :param schema: schema实例
+    :param data: 需要dump的对象, 列表或者可以迭代的Query
+    :param stream: 为True时每chunk_size行dump一次并输出, 只支持many
+    :param mimetype: 返回的格式, 默认根据Accept选择
+    :return: Response
+    """
+    many = schema.many if many is None else many
+    mimetype = mimetype or negotiate()
+    dumps = ENCODERS[mimetype]
+
+    if stream and many and mimetype == JSON:
+        body = stream_with_context(_stream_json(dumps, _dump_chunks(schema, data, chunk_size)))
+    elif stream and many and mimetype == MSGPACK and hasattr(data, "__len__"):
+        # msgpack的数组需要先写入长度
+        body = stream_with_context(_stream_msgpack(dumps, _dump_chunks(schema, data, chunk_size), len(data)))
+    else:
+        body = dumps(schema.dump(data, many=many))
+
+    return Response(body, status=status, mimetype=mimetype, headers=headers)
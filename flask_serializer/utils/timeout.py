@@ -0,0 +1,183 @@
+# -*- coding: utf-8 -*-
+"""
+schema的语句超时: schema.load过程中执行的每一条SQL都只能使用剩余的时间, 由数据库中断超时的语句
+
+    - PostgreSQL: `set_config('statement_timeout', ms, true)`, 即`SET LOCAL statement_timeout`
+    - MySQL: SELECT语句加上`/*+ MAX_EXECUTION_TIME(ms) */`
+    - SQLite: progress handler中断
+
+超时时抛出StatementTimeout(504), 并记录到timeout_metrics中.
+第一次执行有超时的load时, 才会给db的所有engine安装监听
+"""
+import logging
+import sqlite3
+import threading
+import time
+import weakref
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from sqlalchemy import event
+from werkzeug.exceptions import GatewayTimeout
+
+logger = logging.getLogger("flask_serializer.timeout")
+
+_deadline = ContextVar("flask_serializer_deadline", default=None)
+
+# (schema类名, 请求参数的key) -> 超时次数
+timeout_metrics = Counter()
+_metrics_lock = threading.Lock()
+
+# 已经安装了监听的engine
+_installed = weakref.WeakSet()
+_install_lock = threading.Lock()
+
+SQLITE_PROGRESS_STEPS = 1000  # SQLite每执行多少条虚拟机指令检查一次是否超时
+
+MYSQL_TIMEOUT_ERRORS = (3024, 1317)
+POSTGRESQL_QUERY_CANCELED = "57014"
+
+
+class StatementTimeout(GatewayTimeout):
+    description = "查询超时"
+
+    def __init__(self, schema_name, timeout, statement):
+        super(StatementTimeout, self).__init__("%s的查询超过了%.3f秒" % (schema_name, timeout))
+        self.schema_name = schema_name
+        self.timeout = timeout
+        self.statement = statement
+
+
+class _Deadline(object):
+    __slots__ = ("expires", "timeout", "schema_name", "keys")
+
+    def __init__(self, timeout, schema_name, keys):
+        self.expires = time.time() + timeout
+        self.timeout = timeout
+        self.schema_name = schema_name
+        self.keys = keys
+
+    def remaining(self):
+        return self.expires - time.time()
+
+
+@contextmanager
+def statement_timeout(schema, timeout, data=None):
+    """在这个上下文中执行的SQL总共只能使用timeout秒, 嵌套时使用最外层的设置"""
+    if not timeout or _deadline.get() is not None:
+        yield
+        return
+
+    db = getattr(schema, "db", None)
+    if db is not None:
+        install_all(db)
+
+    keys = tuple(sorted(data)) if isinstance(data, dict) else ()
+    token = _deadline.set(_Deadline(timeout, type(schema).__name__, keys))
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def timeout_stats():
+    """:return: [((schema类名, 请求参数的key), 次数), ...], 次数多的在前"""
+    with _metrics_lock:
+        return timeout_metrics.most_common()
+
+
+def _record(deadline, statement):
+    with _metrics_lock:
+        timeout_metrics[(deadline.schema_name, deadline.keys)] += 1
+    logger.warning("查询超时 schema=%s timeout=%.3fs keys=%s\n%s", deadline.schema_name, deadline.timeout,
+                   deadline.keys, statement)
+
+
+def _is_timeout(dialect_name, error):
+    if dialect_name == "postgresql":
+        return getattr(error, "pgcode", None) == POSTGRESQL_QUERY_CANCELED
+    if dialect_name == "mysql":
+        return bool(error.args) and error.args[0] in MYSQL_TIMEOUT_ERRORS
+    if dialect_name == "sqlite":
+        return isinstance(error, sqlite3.OperationalError) and "interrupted" in str(error)
+    return False
+
+
+def install_all(db, app=None):
+    """给db的所有engine(包括SQLALCHEMY_BINDS)安装监听, 已经安装过的engine会被跳过"""
+    app = db.get_app(app)
+    for bind in [None] + list(app.config.get("SQLALCHEMY_BINDS") or ()):
+        install(db.get_engine(app, bind=bind))
+
+
+def install(engine):
+    with _install_lock:
+        if engine in _installed:
+            return
+        _installed.add(engine)
+
+    dialect_name = engine.dialect.name
+
+    @event.listens_for(engine, "before_cursor_execute", retval=True)
+    def set_timeout(conn, cursor, statement, parameters, context, executemany):
+        deadline = _deadline.get()
+        if deadline is None:
+            return statement, parameters
+
+        remaining = deadline.remaining()
+        if remaining <= 0:
+            _record(deadline, statement)
+            raise StatementTimeout(deadline.schema_name, deadline.timeout, statement)
+        milliseconds = max(int(remaining * 1000), 1)
+
+        if dialect_name == "postgresql":
+            # 使用新的游标执行, 不能影响当前语句的游标(例如yield_per使用的服务端游标);
+            # 只在当前事务中生效, 同时取出之前的值, 语句执行之后恢复
+            previous = _pg_set_timeout(conn, str(milliseconds))
+            conn.info.setdefault("flask_serializer_timeout", previous)
+        elif dialect_name == "mysql":
+            stripped = statement.lstrip()
+            if stripped[:6].upper() == "SELECT":
+                statement = "SELECT /*+ MAX_EXECUTION_TIME(%d) */%s" % (milliseconds, stripped[6:])
+        elif dialect_name == "sqlite":
+            expires = deadline.expires
+            conn.connection.set_progress_handler(lambda: 1 if time.time() > expires else 0, SQLITE_PROGRESS_STEPS)
+            conn.info["flask_serializer_timeout"] = True
+        return statement, parameters
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def clear_timeout(conn, cursor, statement, parameters, context, executemany):
+        if "flask_serializer_timeout" not in conn.info:
+            return
+        previous = conn.info.pop("flask_serializer_timeout")
+        if dialect_name == "postgresql":
+            _pg_set_timeout(conn, previous)
+        elif dialect_name == "sqlite":
+            conn.connection.set_progress_handler(None, SQLITE_PROGRESS_STEPS)
+
+    @event.listens_for(engine, "handle_error")
+    def raise_timeout(exception_context):
+        conn = exception_context.connection
+        if conn is not None and conn.info.pop("flask_serializer_timeout", None) is not None:
+            # PostgreSQL的事务已经中止, 不能再执行SET, 回滚时会恢复之前的设置
+            if dialect_name == "sqlite":
+                conn.connection.set_progress_handler(None, SQLITE_PROGRESS_STEPS)
+
+        deadline = _deadline.get()
+        error = exception_context.original_exception
+        if deadline is None or not _is_timeout(dialect_name, error):
+            return
+        _record(deadline, exception_context.statement)
+        raise StatementTimeout(deadline.schema_name, deadline.timeout, exception_context.statement)
+
+
+def _pg_set_timeout(conn, value):
+    """在新的DBAPI游标中执行`SET LOCAL statement_timeout`, :return: 之前的值"""
+    cursor = conn.connection.cursor()
+    try:
+        cursor.execute("SELECT current_setting('statement_timeout'), set_config('statement_timeout', %s, true)",
+                       (value, ))
+        return cursor.fetchone()[0]
+    finally:
+        cursor.close()
@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+"""
+测试索引检查: 没有索引的过滤列, 左模糊匹配, 覆盖索引的建议, 以及`flask serializer indexes`命令
+
+"""
+from marshmallow import fields
+from sqlalchemy.sql.operators import eq, like_op
+
+from flask_serializer.func_field.filter import Filter, _like_full_side
+from flask_serializer.func_field.query import Query
+from flask_serializer.mixins.lists import ListMixin
+from flask_serializer.utils.advisor import INFO, WARNING, advise
+from test.test_app import app, fs
+from test.test_models import Product
+
+
+class UnindexedFilterSchema(ListMixin, fs.Schema):
+    __model__ = Product
+
+    standard_price = fields.Float(filter=Filter(eq))
+
+
+class LeadingWildcardSchema(ListMixin, fs.Schema):
+    __model__ = Product
+
+    product_name = fields.String(filter=Filter(like_op, value_process=_like_full_side))
+
+
+class CoveringSchema(ListMixin, fs.Schema):
+    __model__ = Product
+
+    id = fields.Integer(query=Query())
+    product_name = fields.String(query=Query())
+    sku_name = fields.String(filter=Filter(eq))
+
+
+class CoveredSchema(ListMixin, fs.Schema):
+    __model__ = Product
+
+    sku_name = fields.String(filter=Filter(eq), query=Query())
+
+
+def test_unindexed_filter():
+    advices = advise(UnindexedFilterSchema)
+    assert [(advice.field, advice.level) for advice in advices] == [("standard_price", WARNING)]
+    assert "product.standard_price" in advices[0].message
+
+
+def test_leading_wildcard():
+    advices = advise(LeadingWildcardSchema)
+    # product_name有索引, 但是'%v%'不能使用
+    assert [(advice.field, advice.level) for advice in advices] == [("product_name", WARNING)]
+    assert "'%v'" in advices[0].message
+
+
+def test_covering_index():
+    advices = advise(CoveringSchema)
+    assert [(advice.field, advice.level) for advice in advices] == [("query_fields", INFO)]
+    assert advices[0].message.endswith("CREATE INDEX ON product (sku_name) INCLUDE (id, product_name)")
+
+    assert advise(CoveredSchema) == []
+
+
+def test_indexes_command():
+    result = app.test_cli_runner().invoke(args=["serializer", "indexes"])
+    assert result.exit_code == 0
+    assert "UnindexedFilterSchema" in result.output
+    assert "[warning] standard_price: product.standard_price没有索引" in result.output
+    assert "CoveredSchema" not in result.output
@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+"""
+使用tracemalloc测试每种load的内存分配, 超过预算时测试失败, 防止热路径上重新出现多余的复制
+
+预算是相对于同一次运行中普通marshmallow Schema load相同数据的峰值内存的倍数,
+不依赖解释器版本和平台, 为当前实现的1.25倍左右(list 1.33, fast_list 0.96, filters 1.17,
+split_into_list 0.034, detail 5.3)
+"""
+import gc
+import pickle
+
+import pytest
+from marshmallow import Schema, fields
+from sqlalchemy.sql.operators import eq, in_op
+
+from flask_serializer.func_field.filter import Filter
+from flask_serializer.func_field.query import Query
+from flask_serializer.mixins.details import DetailMixIn
+from flask_serializer.mixins.fast_load import FastLoadMixin
+from flask_serializer.mixins.lists import ListMixin, PreLoadListMixin
+from flask_serializer.utils.empty import Empty
+from test.test_app import fs, session
+from test.test_models import Product
+
+
+class ProductListSchema(PreLoadListMixin, ListMixin, fs.Schema):
+    __model__ = Product
+
+    id = fields.List(fields.Integer(), filter=Filter(in_op), query=Query())
+    product_name = fields.String(filter=Filter(eq), query=Query())
+    sku_name = fields.String(filter=Filter(eq), query=Query())
+    is_active = fields.Boolean(filter=Filter(eq, default=True))
+    standard_price = fields.Float(filter=Filter(eq))
+
+
+class FastProductListSchema(FastLoadMixin, ProductListSchema):
+    pass
+
+
+class PlainSchema(Schema):
+    """作为基准, 没有任何mixin"""
+
+    limit = fields.Integer()
+    offset = fields.Integer()
+    id = fields.String()
+    product_name = fields.String()
+    sku_name = fields.String()
+
+
+class ProductSchema(DetailMixIn, fs.Schema):
+    __model__ = Product
+
+    id = fields.Integer()
+    product_name = fields.String()
+    sku_name = fields.String()
+    standard_price = fields.Float()
+
+
+LIST_DATA = dict(limit="10", offset="0", id="1,2,3", product_name="A-GREAT-PRODUCT", sku_name="GP19930916")
+
+QUERY_DATA = dict(limit="10", offset="0", product_name="A-GREAT-PRODUCT", sku_name="GP19930916")
+
+LOADED_DATA = dict(limit=10, offset=0, id=[1, 2, 3], product_name="A-GREAT-PRODUCT", sku_name="GP19930916")
+
+
+def peak_allocation(func, repeat=5):
+    """func单次调用分配的峰值内存, 取repeat次中最小的一次"""
+    tracemalloc = pytest.importorskip("tracemalloc")
+    # 足够多的预热, 让各种memoized属性和缓存都已经填充
+    for _ in range(20):
+        func()
+
+    gc.collect()
+    peaks = []
+    for _ in range(repeat):
+        # 每次重新开始, 不需要Python 3.9的reset_peak
+        tracemalloc.start()
+        try:
+            func()
+            peaks.append(tracemalloc.get_traced_memory()[1])
+        finally:
+            tracemalloc.stop()
+    return min(peaks)
+
+
+plain_schema = PlainSchema()
+list_schema = ProductListSchema()
+fast_list_schema = FastProductListSchema()
+detail_schema = ProductSchema()
+
+
+def create_product():
+    detail_schema.load(dict(product_name="A-GREAT-PRODUCT", sku_name="GP19930916", standard_price=100))
+    session.rollback()
+
+
+@pytest.fixture(scope="module")
+def baseline():
+    return peak_allocation(lambda: plain_schema.load(LIST_DATA))
+
+
+@pytest.mark.parametrize("name, func, ratio", [
+    ("list", lambda: list_schema.load_data(LIST_DATA), 1.65),
+    ("fast_list", lambda: fast_list_schema.load_data(LIST_DATA), 1.2),
+    ("filters", lambda: list_schema.get_filters(LOADED_DATA), 1.45),
+    ("split_into_list", lambda: list_schema.split_into_list(QUERY_DATA), 0.045),
+    ("detail", create_product, 6.6),
+])
+def test_allocation_budget(baseline, name, func, ratio):
+    allocated = peak_allocation(func)
+    budget = baseline * ratio
+    assert allocated <= budget, "%s分配了%d字节, 超过了预算%d字节" % (name, allocated, budget)
+
+
+def test_fast_list_allocates_less():
+    assert peak_allocation(lambda: fast_list_schema.load_data(LIST_DATA)) <= \
+        peak_allocation(lambda: list_schema.load_data(LIST_DATA))
+
+
+def test_func_fields_without_dict():
+    for func_field in ProductListSchema.filter_fields + ProductListSchema.query_fields:
+        assert not hasattr(func_field, "__dict__")
+
+
+def test_empty_is_shared():
+    assert not Empty
+    assert pickle.loads(pickle.dumps(Empty)) is Empty
+    assert not hasattr(Empty, "__dict__")
+    assert Filter(eq).default is Empty
@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+"""
+测试ColumnarMixin输出的Arrow, NumPy和CSV和数据库中的数据一致, 包括整数列中的NULL和Decimal的类型
+
+"""
+import csv
+import decimal
+import io
+
+import pytest
+from marshmallow import fields
+from sqlalchemy import case
+from sqlalchemy.sql.operators import like_op
+
+from flask_serializer.func_field.filter import Filter
+from flask_serializer.func_field.query import Query
+from flask_serializer.mixins.columnar import ColumnarMixin
+from test.test_app import fs, session
+from test.test_models import Product
+
+SKU_PREFIX = "COLUMNAR-"
+
+PRICES = [decimal.Decimal("1.50"), decimal.Decimal("2.25"), decimal.Decimal("10.00"), decimal.Decimal("0.99")]
+
+
+class ProductColumnsSchema(ColumnarMixin, fs.Schema):
+    __model__ = Product
+
+    id = fields.Integer(query=Query())
+    # 偶数主键为NULL的整数列
+    odd_id = fields.Integer(query=Query(lambda m: case([(m.id % 2 == 0, None)], else_=m.id)))
+    standard_price = fields.Decimal(query=Query())
+    sku_name = fields.String(query=Query(), filter=Filter(like_op))
+
+    def order_by(self, data):
+        return Product.id
+
+
+pcs = ProductColumnsSchema()
+
+QUERY = dict(limit=10, offset=0, sku_name=SKU_PREFIX)
+
+
+@pytest.fixture(scope="module", autouse=True)
+def products():
+    session.add_all([Product(product_name="columnar", sku_name="%s%02d" % (SKU_PREFIX, i), standard_price=price)
+                     for i, price in enumerate(PRICES)])
+    session.commit()
+    yield
+    session.query(Product).filter(Product.sku_name.like(SKU_PREFIX + "%")).delete(synchronize_session=False)
+    session.commit()
+
+
+def expected_rows():
+    products = session.query(Product).filter(Product.sku_name.like(SKU_PREFIX + "%")).order_by(Product.id).all()
+    return [(p.id, p.id if p.id % 2 else None, p.standard_price, p.sku_name) for p in products]
+
+
+def test_load_columns_arrow():
+    pa = pytest.importorskip("pyarrow")
+    table = pcs.load_columns(QUERY, backend="arrow")
+
+    assert table.schema.field("id").type == pa.int64()
+    assert table.schema.field("odd_id").type == pa.int64()
+    assert table.schema.field("standard_price").type == pa.decimal128(38, 2)
+    assert list(zip(*(table.column(name).to_pylist() for name in table.column_names))) == expected_rows()
+
+
+def test_dump_columns_arrow_stream():
+    pa = pytest.importorskip("pyarrow")
+    body, mimetype = pcs.dump_columns(QUERY, fmt="arrow")
+    assert mimetype == "application/vnd.apache.arrow.stream"
+    assert pa.ipc.open_stream(body).read_all().equals(pcs.load_columns(QUERY, backend="arrow"))
+
+
+def test_load_columns_numpy():
+    pytest.importorskip("numpy")
+    columns = pcs.load_columns(QUERY, backend="numpy")
+
+    assert columns["id"].dtype == "int64"
+    # 有NULL的整数列退化为object
+    assert columns["odd_id"].dtype == object
+    assert columns["standard_price"].dtype == "float64"
+    expected = expected_rows()
+    assert columns["id"].tolist() == [row[0] for row in expected]
+    assert columns["odd_id"].tolist() == [row[1] for row in expected]
+    assert columns["standard_price"].tolist() == [float(row[2]) for row in expected]
+
+
+def test_dump_columns_csv():
+    body, mimetype = pcs.dump_columns(QUERY, fmt="csv")
+    assert mimetype == "text/csv"
+
+    rows = list(csv.reader(io.StringIO(body.decode("utf-8"))))
+    assert rows[0] == ["id", "odd_id", "standard_price", "sku_name"]
+    expected = [[str(row[0]), "" if row[1] is None else str(row[1]), str(row[2]), row[3]] for row in expected_rows()]
+    assert rows[1:] == expected
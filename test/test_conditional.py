@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+"""
+测试ConditionalMixin在数据没有变化时返回304, 修改之后返回新的ETag, 以及拒绝DATE类型的fingerprint_column
+
+"""
+import datetime
+
+import pytest
+from marshmallow import fields
+from sqlalchemy import Column, DateTime, INTEGER, VARCHAR
+from sqlalchemy.sql.operators import eq
+
+from flask_serializer.func_field.filter import Filter
+from flask_serializer.func_field.query import Query
+from flask_serializer.mixins.conditional import ConditionalMixin
+from flask_serializer.mixins.lists import ListMixin
+from test.test_app import app, db, fs, session
+from test.test_models import Product
+
+NOW = datetime.datetime(2020, 9, 16, 12, 0, 0)
+
+
+class ConditionalItem(db.Model):
+    __tablename__ = "conditional_item"
+
+    id = Column(INTEGER, primary_key=True, autoincrement=True)
+    name = Column(VARCHAR(64), nullable=False)
+    updated_at = Column(DateTime, nullable=False)
+
+
+class ConditionalItemSchema(ConditionalMixin, ListMixin, fs.Schema):
+    __model__ = ConditionalItem
+    fingerprint_column = "updated_at"
+
+    id = fields.Integer(query=Query())
+    name = fields.String(query=Query(), filter=Filter(eq))
+
+
+class ProductConditionalSchema(ConditionalMixin, ListMixin, fs.Schema):
+    __model__ = Product
+
+    id = fields.Integer(query=Query())
+
+
+QUERY = dict(limit=10, offset=0)
+
+
+@pytest.fixture(scope="module", autouse=True)
+def table():
+    ConditionalItem.__table__.create(db.engine, checkfirst=True)
+    session.add_all([ConditionalItem(name="item-%d" % i, updated_at=NOW) for i in range(3)])
+    session.commit()
+    yield
+    session.remove()
+    ConditionalItem.__table__.drop(db.engine)
+
+
+def respond(headers=None, data=QUERY):
+    with app.test_request_context(headers=headers or {}):
+        return ConditionalItemSchema().conditional_response(data)
+
+
+def test_not_modified():
+    response = respond()
+    assert response.status_code == 200
+    assert len(response.get_json()) == 3
+    etag = response.get_etag()[0]
+
+    response = respond({"If-None-Match": '"%s"' % etag})
+    assert response.status_code == 304
+    assert response.get_etag()[0] == etag
+    assert response.get_data() == b""
+
+    # 不同的过滤条件有不同的ETag
+    assert respond({"If-None-Match": '"%s"' % etag}, dict(QUERY, name="item-0")).status_code == 200
+
+
+def test_if_modified_since():
+    response = respond()
+    last_modified = response.headers["Last-Modified"]
+    assert respond({"If-Modified-Since": last_modified}).status_code == 304
+
+
+def test_modified_in_the_same_day():
+    etag = respond().get_etag()[0]
+
+    item = session.query(ConditionalItem).filter(ConditionalItem.name == "item-0").one()
+    item.name, item.updated_at = "item-0-changed", NOW + datetime.timedelta(seconds=1)
+    session.commit()
+
+    response = respond({"If-None-Match": '"%s"' % etag})
+    assert response.status_code == 200
+    assert response.get_etag()[0] != etag
+    assert "item-0-changed" in [row["name"] for row in response.get_json()]
+
+
+def test_rejects_date_column():
+    # Product.update_date是DATE类型
+    with app.test_request_context():
+        with pytest.raises(ValueError):
+            ProductConditionalSchema().conditional_response(QUERY)
@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+"""
+测试CoreReadMixin查询出来的行和ORM查询的结果相同, 以及不经过session执行
+
+"""
+import pytest
+from marshmallow import fields
+from sqlalchemy import desc
+from sqlalchemy.sql.operators import eq, like_op
+
+from flask_serializer.func_field.filter import Filter
+from flask_serializer.func_field.query import Query
+from flask_serializer.mixins.core import CoreReadMixin
+from flask_serializer.mixins.lists import ListMixin, ListModelMixin
+from test.test_app import fs, session
+from test.test_models import Order, OrderLine, Product
+
+SKU_PREFIX = "CORE-"
+
+
+def make_schema(base, core):
+    bases = ((CoreReadMixin, ) if core else ()) + (base, fs.Schema)
+    attrs = dict(__model__=Product,
+                 id=fields.Integer(query=Query()),
+                 product_name=fields.String(query=Query()),
+                 sku_name=fields.String(query=Query(), filter=Filter(eq)),
+                 order_by=lambda self, data: desc(Product.product_name))
+    return type("%s%sSchema" % ("Core" if core else "Orm", base.__name__), bases, attrs)
+
+
+class OrderLineCoreSchema(CoreReadMixin, ListMixin, fs.Schema):
+    __model__ = OrderLine
+
+    id = fields.Integer(query=Query())
+    order_no = fields.String(query=Query(Order.order_no), filter=Filter(like_op, Order.order_no))
+
+    def modify_before_query(self, query, data):
+        return query.join(Order, Order.id == OrderLine.order_id)
+
+    def order_by(self, data):
+        return OrderLine.id
+
+
+class OrderLineSelectSchema(OrderLineCoreSchema):
+    core_as_dict = True
+
+    def modify_before_select(self, statement, data):
+        return statement.select_from(OrderLine.__table__.join(Order.__table__))
+
+
+@pytest.fixture(scope="module", autouse=True)
+def products():
+    session.add_all([Product(product_name="core-%02d" % i, sku_name="%s%d" % (SKU_PREFIX, i % 2)) for i in range(20)])
+    session.commit()
+    yield
+    session.query(Product).filter(Product.sku_name.like(SKU_PREFIX + "%")).delete(synchronize_session=False)
+    session.commit()
+
+
+@pytest.mark.parametrize("base", [ListModelMixin, ListMixin])
+@pytest.mark.parametrize("offset", [0, 3, 9])
+def test_core_rows_equal_orm_rows(base, offset):
+    data = {"limit": 4, "offset": offset, "sku_name": SKU_PREFIX + "1"}
+    orm, core = make_schema(base, False)(), make_schema(base, True)()
+
+    rows = core.load(data)
+    assert not isinstance(rows[0], Product)
+    assert core.dump(rows, many=True) == orm.dump(orm.load(data), many=True)
+
+
+def test_core_as_dict():
+    schema = make_schema(ListMixin, True)()
+    schema.core_as_dict = True
+    rows = schema.load({"limit": 2, "offset": 0, "sku_name": SKU_PREFIX + "0"})
+    assert [sorted(row) for row in rows] == [["id", "product_name", "sku_name"]] * 2
+    assert [row["product_name"] for row in rows] == ["core-18", "core-16"]
+
+
+def test_core_outside_session():
+    schema = make_schema(ListMixin, True)()
+    session.add(Product(product_name="core-pending", sku_name=SKU_PREFIX + "2"))
+    session.flush()
+    # 没有提交的修改看不到
+    assert schema.load({"limit": 10, "offset": 0, "sku_name": SKU_PREFIX + "2"}) == []
+    session.rollback()
+
+
+@pytest.mark.parametrize("schema_class", [OrderLineCoreSchema, OrderLineSelectSchema])
+def test_core_join(schema_class):
+    product = session.query(Product).filter(Product.sku_name == SKU_PREFIX + "0").first()
+    order = Order(order_no="CORE-ORDER")
+    order.order_lines = [OrderLine(product_id=product.id, price=1, quantities=1) for _ in range(3)]
+    session.add(order)
+    session.commit()
+    line_ids = sorted(line.id for line in order.order_lines)
+
+    schema = schema_class()
+    rows = schema.load({"limit": 10, "offset": 0, "order_no": "CORE-ORDER"})
+    assert schema.dump(rows, many=True) == [dict(id=line_id, order_no="CORE-ORDER") for line_id in line_ids]
+
+    for line in order.order_lines:
+        session.delete(line)
+    session.delete(order)
+    session.commit()
@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+"""
+测试DeferredJoinMixin延迟JOIN查询出来的每一页, 和ListMixin/ListModelMixin直接分页的结果相同
+
+"""
+import pytest
+from marshmallow import fields
+from sqlalchemy import desc
+from sqlalchemy.sql.operators import eq, like_op
+
+from flask_serializer.func_field.filter import Filter
+from flask_serializer.func_field.query import Query
+from flask_serializer.mixins.deferred import DeferredJoinMixin
+from flask_serializer.mixins.lists import ListMixin, ListModelMixin
+from test.test_app import fs, session
+from test.test_models import Order, OrderLine, Product
+
+SKU = "DEFERRED-0001"
+
+
+class ProductPageMixin(object):
+    __model__ = Product
+
+    id = fields.Integer(query=Query())
+    product_name = fields.String(query=Query())
+    sku_name = fields.String(query=Query(), filter=Filter(eq))
+
+    def order_by(self, data):
+        return desc(Product.product_name)
+
+
+class ProductListSchema(ProductPageMixin, ListMixin, fs.Schema):
+    pass
+
+
+class ProductDeferredListSchema(ProductPageMixin, DeferredJoinMixin, ListMixin, fs.Schema):
+    pass
+
+
+class ProductModelSchema(ProductPageMixin, ListModelMixin, fs.Schema):
+    pass
+
+
+class ProductDeferredModelSchema(ProductPageMixin, DeferredJoinMixin, ListModelMixin, fs.Schema):
+    pass
+
+
+class OrderLineDeferredSchema(DeferredJoinMixin, ListMixin, fs.Schema):
+    __model__ = OrderLine
+
+    id = fields.Integer(query=Query())
+    order_no = fields.String(query=Query(Order.order_no), filter=Filter(like_op, Order.order_no))
+
+    def modify_before_query(self, query, data):
+        return query.join(Order, Order.id == OrderLine.order_id)
+
+
+@pytest.fixture(scope="module", autouse=True)
+def products():
+    session.add_all([Product(product_name="deferred-%02d" % i, sku_name=SKU) for i in range(23)])
+    session.commit()
+    yield
+    session.query(Product).filter(Product.sku_name == SKU).delete(synchronize_session=False)
+    session.commit()
+
+
+@pytest.mark.parametrize("plain, deferred", [(ProductListSchema, ProductDeferredListSchema),
+                                             (ProductModelSchema, ProductDeferredModelSchema)])
+@pytest.mark.parametrize("offset", [0, 5, 20, 30])
+def test_deferred_page_equals_plain_page(plain, deferred, offset):
+    data = {"limit": 5, "offset": offset, "sku_name": SKU}
+    plain, deferred = plain(), deferred()
+
+    expected = plain.dump(plain.load(data), many=True)
+    assert deferred.dump(deferred.load(data), many=True) == expected
+    assert len(expected) == max(min(23 - offset, 5), 0)
+
+    assert "deferred_page" in str(deferred.to_sql(deferred.load_data(data)))
+
+
+def test_deferred_join_with_modify_before_query():
+    product = session.query(Product).filter(Product.sku_name == SKU).first()
+    order = Order(order_no="DEFERRED-ORDER")
+    order.order_lines = [OrderLine(product_id=product.id, price=1, quantities=1) for _ in range(6)]
+    session.add(order)
+    session.commit()
+
+    schema = OrderLineDeferredSchema()
+    rows = schema.load({"limit": 2, "offset": 3, "order_no": "DEFERRED-ORDER"})
+    assert [row.id for row in rows] == sorted(line.id for line in order.order_lines)[3:5]
+    assert all(row.order_no == "DEFERRED-ORDER" for row in rows)
+
+    for line in order.order_lines:
+        session.delete(line)
+    session.delete(order)
+    session.commit()
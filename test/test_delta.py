@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+"""
+测试DeltaMixin的水位线可以完整地遍历变化的行, 软删除的行作为tombstone返回, 以及拒绝DATE类型的delta_column
+
+"""
+import datetime
+
+import pytest
+from marshmallow import fields
+from marshmallow.exceptions import ValidationError
+from sqlalchemy import BOOLEAN, Column, DateTime, INTEGER, VARCHAR
+
+from flask_serializer.mixins.delta import DeltaMixin
+from test.test_app import db, fs, session
+from test.test_models import Product
+
+NOW = datetime.datetime(2020, 9, 16, 12, 0, 0)
+
+
+class DeltaItem(db.Model):
+    __tablename__ = "delta_item"
+
+    id = Column(INTEGER, primary_key=True, autoincrement=True)
+    name = Column(VARCHAR(64), nullable=False)
+    is_active = Column(BOOLEAN, nullable=False, default=True)
+    updated_at = Column(DateTime, nullable=False)
+
+
+class DeltaItemSchema(DeltaMixin, fs.Schema):
+    __model__ = DeltaItem
+    delta_column = "updated_at"
+
+    id = fields.Integer()
+    name = fields.String()
+
+
+class ProductDeltaSchema(DeltaMixin, fs.Schema):
+    __model__ = Product
+
+    id = fields.Integer()
+
+
+dis = DeltaItemSchema()
+
+
+@pytest.fixture(scope="module", autouse=True)
+def table():
+    DeltaItem.__table__.create(db.engine, checkfirst=True)
+    # 前三行的修改时间相同, 水位线需要使用主键区分
+    session.add_all([DeltaItem(name="item-%d" % i, updated_at=NOW + datetime.timedelta(seconds=max(i - 2, 0)))
+                     for i in range(6)])
+    session.commit()
+    yield
+    session.remove()
+    DeltaItem.__table__.drop(db.engine)
+
+
+def poll(since=None, limit=2):
+    """从since开始一直拉取到没有变化为止"""
+    rows, tombstones = [], []
+    while True:
+        data = {"limit": limit}
+        if since:
+            data["since"] = since
+        delta = dis.load(data)
+        if not delta.rows and not delta.tombstones:
+            return rows, tombstones, since
+        rows.extend(row.name for row in delta.rows)
+        tombstones.extend(delta.tombstones)
+        since = delta.since
+
+
+def test_delta_round_trip():
+    rows, tombstones, since = poll()
+    assert rows == ["item-%d" % i for i in range(6)]
+    assert tombstones == []
+
+    # 同一时间修改了主键较小的行, 以及软删除一行
+    first = session.query(DeltaItem).filter(DeltaItem.name == "item-0").one()
+    first.name, first.updated_at = "item-0-changed", NOW + datetime.timedelta(minutes=1)
+    deleted = session.query(DeltaItem).filter(DeltaItem.name == "item-1").one()
+    deleted.is_active, deleted.updated_at = False, NOW + datetime.timedelta(minutes=1)
+    session.commit()
+
+    rows, tombstones, next_since = poll(since)
+    assert rows == ["item-0-changed"]
+    assert tombstones == [deleted.id]
+    assert next_since != since
+
+    assert poll(next_since)[:2] == ([], [])
+
+
+def test_delta_invalid_since():
+    with pytest.raises(ValidationError):
+        dis.load({"since": "not-a-watermark"})
+
+
+def test_delta_rejects_date_column():
+    # Product.update_date是DATE类型
+    with pytest.raises(ValueError):
+        ProductDeltaSchema().load({})
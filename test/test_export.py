@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+"""
+测试ExportMixin按主键分区导出, 以及在当前进程中导出时不影响调用者的session
+
+"""
+import csv
+import io
+import json
+import os
+
+import pytest
+from marshmallow import fields
+from sqlalchemy.sql.operators import like_op
+
+from flask_serializer.func_field.filter import Filter
+from flask_serializer.mixins.export import ExportMixin
+from flask_serializer.mixins.lists import ListModelMixin
+from test.test_app import app, fs, session
+from test.test_models import Product
+
+SKU_PREFIX = "EXPORT-"
+
+
+class ProductExportSchema(ExportMixin, ListModelMixin, fs.Schema):
+    __model__ = Product
+
+    id = fields.Integer()
+    product_name = fields.String()
+    sku_name = fields.String(filter=Filter(like_op))
+
+
+pes = ProductExportSchema()
+
+
+@pytest.fixture(scope="module", autouse=True)
+def products():
+    session.add_all([Product(product_name="export-%02d" % i, sku_name="%s%02d" % (SKU_PREFIX, i))
+                     for i in range(20)])
+    session.commit()
+    yield
+    session.query(Product).filter(Product.sku_name.like(SKU_PREFIX + "%")).delete(synchronize_session=False)
+    session.commit()
+
+
+def expected_names():
+    return ["export-%02d" % i for i in range(20)]
+
+
+def test_export_merge_ndjson():
+    output = io.StringIO()
+    with app.app_context():
+        rows = pes.export({"sku_name": SKU_PREFIX}, output, processes=1, partitions=3)
+    assert rows == 20
+    assert [json.loads(line)["product_name"] for line in output.getvalue().splitlines()] == expected_names()
+
+
+def test_export_csv_with_processes():
+    output = io.StringIO()
+    with app.app_context():
+        rows = pes.export({"sku_name": SKU_PREFIX}, output, fmt="csv", processes=2, partitions=4)
+    assert rows == 20
+    output.seek(0)
+    assert [row["product_name"] for row in csv.DictReader(output)] == expected_names()
+
+
+def test_export_partition_files(tmpdir):
+    with app.app_context():
+        rows = pes.export({"sku_name": SKU_PREFIX}, str(tmpdir), processes=2, partitions=4)
+    names = []
+    for name in sorted(os.listdir(str(tmpdir))):
+        with io.open(os.path.join(str(tmpdir), name), encoding="utf-8") as f:
+            names.extend(json.loads(line)["product_name"] for line in f)
+    assert rows == 20
+    assert names == expected_names()
+
+
+def test_export_in_process_keeps_pending_objects():
+    with app.app_context():
+        pending = Product(product_name="export-pending", sku_name="PENDING-0001")
+        session.add(pending)
+        pes.export({"sku_name": SKU_PREFIX}, io.StringIO(), processes=1)
+        assert pending in session
+        session.rollback()
@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+"""
+测试FacetMixin的每个分面都使用除了自己以外的所有过滤条件, 包括条件聚合, UNION ALL和GROUPING SETS三种方式
+
+"""
+from collections import Counter
+
+import pytest
+from marshmallow import fields
+from sqlalchemy.sql.operators import eq, like_op
+
+from flask_serializer.func_field.filter import Filter
+from flask_serializer.mixins.facets import FacetMixin, GROUPING_SETS_DIALECTS
+from test.test_app import db, fs, session
+from test.test_models import Product
+
+SKU_PREFIX = "FACET-"
+
+ROWS = [("a", True), ("a", True), ("a", False), ("b", True), ("b", False), ("c", False)]
+
+
+class ProductFacetSchema(FacetMixin, fs.Schema):
+    __model__ = Product
+    facets = ("is_active", "product_name")
+
+    product_name = fields.String(filter=Filter(eq))
+    is_active = fields.Boolean(filter=Filter(eq))
+    sku_name = fields.String(filter=Filter(like_op))
+
+
+class ConditionalFacetSchema(ProductFacetSchema):
+    # 所有分面都给出了取值, 只使用条件聚合
+    facet_grouping_sets = False
+    facet_values = {"is_active": (True, False), "product_name": ("a", "b", "c")}
+
+
+class UnionFacetSchema(ProductFacetSchema):
+    # 没有给出取值, 只使用UNION ALL, 布尔类型的分面在第一个
+    facet_grouping_sets = False
+
+
+class MixedFacetSchema(ProductFacetSchema):
+    facet_grouping_sets = False
+    facet_values = {"is_active": (True, False)}
+
+
+class GroupingSetsFacetSchema(ProductFacetSchema):
+    facet_grouping_sets = True
+
+
+@pytest.fixture(scope="module", autouse=True)
+def products():
+    session.add_all([Product(product_name=name, is_active=active, sku_name="%s%02d" % (SKU_PREFIX, i))
+                     for i, (name, active) in enumerate(ROWS)])
+    session.commit()
+    yield
+    session.query(Product).filter(Product.sku_name.like(SKU_PREFIX + "%")).delete(synchronize_session=False)
+    session.commit()
+
+
+def expected(product_name=None, is_active=None):
+    return {
+        "is_active": Counter(active for name, active in ROWS if product_name in (None, name)),
+        "product_name": Counter(name for name, active in ROWS if is_active in (None, active)),
+    }
+
+
+@pytest.mark.parametrize("schema_class", [
+    ConditionalFacetSchema,
+    UnionFacetSchema,
+    MixedFacetSchema,
+    pytest.param(GroupingSetsFacetSchema, marks=pytest.mark.skipif(
+        db.engine.dialect.name not in GROUPING_SETS_DIALECTS, reason="不支持GROUPING SETS")),
+])
+@pytest.mark.parametrize("filters", [
+    dict(),
+    dict(product_name="a"),
+    dict(is_active=True),
+    dict(product_name="a", is_active=True),
+])
+def test_facet_excludes_own_filter(schema_class, filters):
+    counts = schema_class().load(dict(filters, sku_name=SKU_PREFIX))
+    assert {name: dict(values) for name, values in counts.items()} == \
+        {name: dict(values) for name, values in expected(**filters).items()}
+
+
+def test_union_facet_value_types():
+    counts = UnionFacetSchema().load(dict(sku_name=SKU_PREFIX))
+    assert all(type(value) is bool for value in counts["is_active"])
+    assert all(type(value) is str for value in counts["product_name"])
@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+"""
+测试FastLoadMixin和marshmallow原本的load得到的data和错误是否一致, 以及marshmallow内部接口不兼容时退回原本的load
+
+"""
+import pytest
+from marshmallow import fields
+from marshmallow.exceptions import ValidationError
+from sqlalchemy.sql.operators import eq, in_op
+
+from flask_serializer.func_field.filter import Filter
+from flask_serializer.mixins import fast_load
+from flask_serializer.mixins.fast_load import FastLoadMixin
+from flask_serializer.mixins.lists import ListModelMixin, PreLoadListMixin
+from test.test_app import fs
+from test.test_models import Product
+
+
+class ProductListSchema(PreLoadListMixin, ListModelMixin, fs.Schema):
+    __model__ = Product
+
+    id = fields.List(fields.Integer(), filter=Filter(in_op))
+    product_name = fields.String(filter=Filter(eq))
+    sku = fields.String(data_key="sku_name", filter=Filter(eq, "sku_name"))
+    is_active = fields.Boolean(filter=Filter(eq, default=True))
+    standard_price = fields.Float(filter=Filter(eq))
+
+
+class FastProductListSchema(FastLoadMixin, ProductListSchema):
+    pass
+
+
+def load(schema, data):
+    try:
+        return schema.load_data(data), None
+    except ValidationError as e:
+        return e.valid_data, e.messages
+
+
+@pytest.mark.parametrize("data", [
+    dict(page="1", size="10"),
+    dict(limit="10", offset="0", product_name="A-GREAT-PRODUCT", sku_name="GP19930916"),
+    dict(page="2", size="5", id="1,2,3", is_active="false", standard_price="10.5"),
+    dict(page="1", size="10", id="1,a,3"),
+    dict(page="a", size="10", standard_price="nan"),
+    dict(page="0", size="10"),
+    dict(product_name="A-GREAT-PRODUCT"),
+    dict(page="1", size="10", unknown_field="1"),
+    dict(page="1", size="10", is_active="maybe", sku="GP19930916"),
+])
+def test_fast_load_agree_with_marshmallow(data):
+    assert load(FastProductListSchema(), data) == load(ProductListSchema(), data)
+
+
+def test_fast_load_query():
+    data = dict(page="1", size="10", id="1")
+    assert FastProductListSchema().load(data) == ProductListSchema().load(data)
+
+
+
+def test_incompatible_marshmallow(monkeypatch):
+    class IncompatibleSchema(FastLoadMixin, ProductListSchema):
+        pass
+
+    # 模拟marshmallow内部的ErrorStore改变了结构
+    monkeypatch.setattr(fast_load, "ErrorStore", object)
+    data = dict(page="2", size="5", id="1,2,3")
+    assert load(IncompatibleSchema(), data) == load(ProductListSchema(), data)
+    assert IncompatibleSchema._fast_unsupported
+    assert IncompatibleSchema()._fast_plan() is None
+    assert IncompatibleSchema().load(data) == ProductListSchema().load(data)
+    assert not FastProductListSchema._fast_unsupported
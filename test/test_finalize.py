@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+"""
+测试多个线程同时第一次实例化schema时, 功能性field只初始化一次
+
+"""
+import threading
+import time
+
+from marshmallow import fields
+from sqlalchemy.sql.operators import eq
+
+from flask_serializer import NewSchemaMeta
+from flask_serializer.func_field.filter import Filter
+from flask_serializer.func_field.query import Query
+from flask_serializer.mixins.lists import ListMixin
+from test.test_app import fs
+from test.test_models import Product
+
+
+def test_concurrent_finalize(monkeypatch):
+    init_filed_function_instance = NewSchemaMeta.init_filed_function_instance
+
+    def slow_init(func_name, field_name, field_obj, db, model):
+        # 放大竞争的时间窗口
+        time.sleep(0.005)
+        return init_filed_function_instance(func_name, field_name, field_obj, db, model)
+
+    monkeypatch.setattr(NewSchemaMeta, "init_filed_function_instance", staticmethod(slow_init))
+
+    class ParentSchema(ListMixin, fs.Schema):
+        __model__ = Product
+
+        product_name = fields.String(filter=Filter(eq), query=Query())
+
+    class ChildSchema(ParentSchema):
+        sku_name = fields.String(filter=Filter(eq), query=Query())
+
+    barrier = threading.Barrier(8)
+
+    def instantiate():
+        barrier.wait()
+        ChildSchema()
+
+    threads = [threading.Thread(target=instantiate) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert [f.field_name for f in ParentSchema.filter_fields] == ["product_name"]
+    assert [f.field_name for f in ChildSchema.filter_fields] == ["product_name", "sku_name"]
+    assert [f.field_name for f in ChildSchema.query_fields] == ["product_name", "sku_name"]
@@ -0,0 +1,187 @@
+# -*- coding: utf-8 -*-
+"""
+测试FragmentCacheMixin命中时跳过dump, flush, commit, UpsertMixIn和PartialUpdateMixIn修改的行会被移出缓存,
+以及session的监听只在需要时安装一次
+
+"""
+import pytest
+from flask import Flask
+from marshmallow import fields
+
+from flask_serializer import FlaskSerializer
+from flask_serializer.func_field.query import Query
+from flask_serializer.mixins.details import PartialUpdateMixIn, UpsertMixIn, sqlite_insert
+from flask_serializer.mixins.fragment import FragmentCacheMixin
+from flask_serializer.mixins.lists import ListMixin
+from flask_serializer.utils.fragment_cache import FragmentCache, LRUCache
+from test.test_app import db, fs, session
+from test.test_models import Product
+
+dumped = []
+
+
+class ProductFragmentSchema(FragmentCacheMixin, fs.Schema):
+    __model__ = Product
+
+    id = fields.Integer()
+    product_name = fields.Method("get_product_name")
+
+    def get_product_name(self, obj):
+        dumped.append(obj.id)
+        return obj.product_name
+
+
+class ProductFragmentListSchema(FragmentCacheMixin, ListMixin, fs.Schema):
+    __model__ = Product
+
+    id = fields.Integer(query=Query())
+    product_name = fields.String(query=Query())
+
+
+class ProductPartialSchema(PartialUpdateMixIn, fs.Schema):
+    __model__ = Product
+
+    id = fields.Integer()
+    product_name = fields.String()
+
+
+class ProductUpsertSchema(UpsertMixIn, fs.Schema):
+    __model__ = Product
+
+    id = fields.Integer()
+    product_name = fields.String()
+    sku_name = fields.String()
+
+
+pfs = ProductFragmentSchema()
+
+
+def cached(product):
+    return fs.fragment_cache.backend.get(fs.fragment_cache.identity_key(Product, (product.id, ))) is not None
+
+
+@pytest.fixture
+def products():
+    instances = [Product(product_name="FRAGMENT-%d" % i, sku_name="FR%04d" % i) for i in range(3)]
+    session.add_all(instances)
+    session.commit()
+    del dumped[:]
+    yield instances
+    session.rollback()
+
+
+def test_hit_skips_dump(products):
+    first = pfs.dump(products, many=True)
+    assert dumped == [p.id for p in products]
+
+    assert pfs.dump(products, many=True) == first
+    assert pfs.dump(products[0]) == first[0]
+    assert dumped == [p.id for p in products]
+
+    # only不同的结果分开缓存
+    assert ProductFragmentSchema(only=("id", )).dump(products[0]) == {"id": products[0].id}
+    assert pfs.dump(products[0]) == first[0]
+
+
+def test_list_rows(products):
+    rows = [row for row in ProductFragmentListSchema().load({"limit": 100, "offset": 0})
+            if row.id in {p.id for p in products}]
+    first = ProductFragmentListSchema().dump(rows, many=True)
+    assert all(cached(p) for p in products)
+    assert ProductFragmentListSchema().dump(rows, many=True) == first
+
+
+def test_evict_on_flush_and_commit(products):
+    pfs.dump(products, many=True)
+
+    # update_date是DATE类型, 同一天内的修改只能依靠主动删除
+    products[0].product_name = "FRAGMENT-CHANGED"
+    session.flush()
+    assert not cached(products[0])
+    assert cached(products[1])
+
+    # 提交之前缓存的数据在提交之后会再被删除一次
+    pfs.dump(products[0])
+    assert cached(products[0])
+    session.commit()
+    assert not cached(products[0])
+
+    assert pfs.dump(products[0])["product_name"] == "FRAGMENT-CHANGED"
+
+    session.delete(products[2])
+    session.commit()
+    assert not cached(products[2])
+
+
+def test_rollback_keeps_cache(products):
+    pfs.dump(products, many=True)
+    products[0].product_name = "FRAGMENT-ROLLBACK"
+    session.flush()
+    session.rollback()
+
+    pfs.dump(products[0])
+    session.commit()
+    assert cached(products[0])
+
+
+def test_evict_on_partial_update(products):
+    pfs.dump(products, many=True)
+    ProductPartialSchema().load(dict(id=products[0].id, product_name="FRAGMENT-PARTIAL"), partial=True)
+    assert not cached(products[0])
+    assert cached(products[1])
+    session.commit()
+
+    session.expire_all()
+    assert pfs.dump(products[0])["product_name"] == "FRAGMENT-PARTIAL"
+
+
+@pytest.mark.skipif(db.engine.dialect.name == "sqlite" and sqlite_insert is None, reason="SQLite的upsert需要SQLAlchemy>=1.4")
+def test_evict_on_upsert(products):
+    pfs.dump(products, many=True)
+    ProductUpsertSchema().load([dict(id=p.id, product_name="FRAGMENT-UPSERT", sku_name=p.sku_name)
+                                for p in products[:2]], many=True)
+    assert not cached(products[0])
+    assert not cached(products[1])
+    assert cached(products[2])
+    session.commit()
+
+    session.expire_all()
+    assert pfs.dump(products[1])["product_name"] == "FRAGMENT-UPSERT"
+
+
+class CountingCache(LRUCache):
+    def __init__(self):
+        super(CountingCache, self).__init__()
+        self.deleted = []
+
+    def delete(self, key):
+        self.deleted.append(key)
+        super(CountingCache, self).delete(key)
+
+
+def test_install_once(products):
+    cache = FragmentCache(CountingCache())
+    cache.install(session)
+    cache.install(session)
+    assert cache._sessions == [session]
+
+    products[0].product_name = "FRAGMENT-ONCE"
+    session.flush()
+    # flush时删除一次, 提交之后再删除一次
+    assert cache.backend.deleted == [cache.identity_key(Product, (products[0].id, ))]
+    session.commit()
+    assert len(cache.backend.deleted) == 2
+
+
+@pytest.mark.parametrize("backend, installed", [(None, False), (LRUCache(), True)])
+def test_init_app_install(backend, installed):
+    app = Flask("fragment")
+    app.config["SERIALIZER_FRAGMENT_CACHE_BACKEND"] = backend
+    serializer = FlaskSerializer(app, db=db)
+    cache = serializer.fragment_cache
+    # 只有共享的缓存后端在init_app中安装
+    assert cache._sessions == ([db.session] if installed else [])
+
+    serializer.init_app(app)
+    assert serializer.fragment_cache is cache
+    assert len(cache._sessions) == int(installed)
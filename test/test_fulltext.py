@@ -0,0 +1,157 @@
+# -*- coding: utf-8 -*-
+"""
+测试SQLite FTS5的全文检索: 创建索引并同步数据, MATCH过滤, 按匹配程度排序, 以及特殊字符不会破坏FTS5的查询语法
+
+"""
+import sqlite3
+
+import pytest
+from marshmallow import fields
+from sqlalchemy import text
+from sqlalchemy.dialects import postgresql
+
+from flask_serializer.func_field.filter import Filter
+from flask_serializer.mixins.lists import ListModelMixin
+from flask_serializer.utils.fulltext import (_postgresql_index_statements, create_fulltext_index, fts_table_name,
+                                             fulltext_op, fulltext_rank)
+from test.test_app import db, fs, session
+from test.test_models import Order, Product
+
+
+def fts5_available():
+    connection = sqlite3.connect(":memory:")
+    try:
+        connection.execute("CREATE VIRTUAL TABLE t USING fts5(a)")
+        return True
+    except sqlite3.OperationalError:
+        return False
+    finally:
+        connection.close()
+
+
+pytestmark = pytest.mark.skipif(db.engine.dialect.name != "sqlite" or not fts5_available(),
+                                reason="需要支持FTS5的SQLite")
+
+SKU = "FULLTEXT-0001"
+
+
+class ProductSearchSchema(ListModelMixin, fs.Schema):
+    __model__ = Product
+
+    id = fields.Integer()
+    product_name = fields.String(filter=Filter(fulltext_op))
+    sku_name = fields.String()
+
+    def order_by(self, data):
+        return fulltext_rank(Product.product_name, data.get("product_name", "")).desc()
+
+
+class OrderSearchSchema(ListModelMixin, fs.Schema):
+    __model__ = Order
+
+    id = fields.Integer()
+    order_no = fields.String(filter=Filter(fulltext_op))
+
+    def order_by(self, data):
+        return Order.id
+
+
+def drop_index(model_table):
+    quote = db.engine.dialect.identifier_preparer.quote
+    fts_name = fts_table_name(model_table)
+    with db.engine.begin() as connection:
+        for suffix in ("ai", "ad", "au"):
+            connection.execute(text("DROP TRIGGER IF EXISTS %s" % quote("%s_%s" % (fts_name, suffix))))
+        connection.execute(text("DROP TABLE IF EXISTS %s" % quote(fts_name)))
+
+
+@pytest.fixture(scope="module", autouse=True)
+def index():
+    names = ("red quokka pie tart", "green quokka", 'banana "split"', "quokka quokka")
+    session.add_all([Product(product_name=name, sku_name=SKU) for name in names])
+    session.commit()
+
+    create_fulltext_index(db.engine, Product.product_name, Product.sku_name)
+    # 重复创建不会出错
+    create_fulltext_index(db.engine, Product.product_name, Product.sku_name)
+    yield
+
+    session.query(Product).filter(Product.sku_name == SKU).delete(synchronize_session=False)
+    session.commit()
+    drop_index(Product.__table__)
+
+
+def search(value):
+    return [product.product_name for product in
+            ProductSearchSchema().load({"limit": 10, "offset": 0, "product_name": value})]
+
+
+def test_match_and_rank():
+    # 出现次数多并且更短的排在前面
+    assert search("quokka") == ["quokka quokka", "green quokka", "red quokka pie tart"]
+    # 词之间为AND
+    assert search("red quokka") == ["red quokka pie tart"]
+    assert search("QUOKKA tart") == ["red quokka pie tart"]
+    assert search("pear") == []
+
+
+def test_index_follows_changes():
+    product = Product(product_name="late wombat", sku_name=SKU)
+    session.add(product)
+    session.commit()
+    assert search("wombat") == ["late wombat"]
+
+    product.product_name = "late koala"
+    session.commit()
+    assert search("wombat") == []
+    assert search("koala") == ["late koala"]
+
+    session.delete(product)
+    session.commit()
+    assert search("koala") == []
+
+
+@pytest.mark.parametrize("value, expected", [
+    ('split"', ['banana "split"']),
+    ('"split', ['banana "split"']),
+    ("quokka\" OR \"banana", []),
+    ("NEAR(quokka pie)", []),
+    ("quokka* ^green", ["green quokka"]),
+    ("sku_name : quokka", []),
+    ("o'quokka", []),
+    ("   ", []),
+    ("()\"*:", []),
+])
+def test_hostile_input(value, expected):
+    assert search(value) == expected
+
+
+def test_postgresql_sql():
+    schema = ProductSearchSchema()
+    query = schema.to_sql(schema.load_data({"limit": 10, "offset": 0, "product_name": "quokka"}))
+    sql = str(query.statement.compile(dialect=postgresql.dialect()))
+    assert "to_tsvector(%(to_tsvector_1)s, product.product_name) @@ plainto_tsquery(" in sql
+    assert "ORDER BY ts_rank(" in sql
+
+
+def test_reserved_table_name():
+    # order是保留字, 表名和列名都需要加引号
+    order = Order(order_no="FULLTEXT ORDER")
+    session.add(order)
+    session.commit()
+    order_id = order.id
+    try:
+        create_fulltext_index(db.engine, Order.order_no)
+        rows = OrderSearchSchema().load({"limit": 10, "offset": 0, "order_no": "fulltext order"})
+        assert [row.id for row in rows] == [order_id]
+    finally:
+        session.query(Order).filter(Order.id == order_id).delete(synchronize_session=False)
+        session.commit()
+        drop_index(Order.__table__)
+
+
+def test_postgresql_index_quoted():
+    statement, = _postgresql_index_statements(Order.__table__, [Order.order_no], "it's",
+                                              postgresql.dialect().identifier_preparer)
+    assert str(statement) == ('CREATE INDEX IF NOT EXISTS ix_order_order_no_fts ON "order" '
+                              "USING gin (to_tsvector('it''s', order_no))")
@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+"""
+测试IngestMixin分块导入NDJSON/CSV, 错误文件, 违反约束或者更新不存在的主键的块整块拒绝, 以及在当前进程中导入时不影响调用者的session
+
+"""
+import io
+import json
+
+import pytest
+from marshmallow import fields
+
+from flask_serializer.mixins.ingest import IngestMixin, IngestResult
+from test.test_app import app, fs, session
+from test.test_models import Product
+
+SKU_PREFIX = "INGEST-"
+
+
+class ProductIngestSchema(IngestMixin, fs.Schema):
+    __model__ = Product
+
+    id = fields.Integer()
+    # product_name不是必填的, 缺少时在写入时违反NOT NULL约束
+    product_name = fields.String()
+    sku_name = fields.String(required=True)
+    standard_price = fields.Decimal()
+
+
+pis = ProductIngestSchema()
+
+
+@pytest.fixture(autouse=True)
+def cleanup():
+    yield
+    session.rollback()
+    session.query(Product).filter(Product.sku_name.like(SKU_PREFIX + "%")).delete(synchronize_session=False)
+    session.commit()
+
+
+def ndjson(records):
+    return io.StringIO("".join(record if isinstance(record, str) else json.dumps(record) + "\n"
+                               for record in records))
+
+
+def ingested():
+    return [name for name, in session.query(Product.product_name)
+            .filter(Product.sku_name.like(SKU_PREFIX + "%")).order_by(Product.sku_name)]
+
+
+def good(i):
+    return {"product_name": "ingest-%02d" % i, "sku_name": "%s%02d" % (SKU_PREFIX, i), "standard_price": "1.50"}
+
+
+@pytest.mark.parametrize("processes", [1, 2])
+def test_ingest_ndjson(processes):
+    records = [good(i) for i in range(10)]
+    records[3] = "{bad json\n"
+    records[6] = {"product_name": "no-sku"}
+
+    errors = io.StringIO()
+    with app.app_context():
+        result = pis.ingest(ndjson(records), errors=errors, processes=processes, chunk_size=3)
+
+    assert result == IngestResult(10, 8, 2)
+    assert ingested() == ["ingest-%02d" % i for i in range(10) if i not in (3, 6)]
+
+    rejected = [json.loads(line) for line in errors.getvalue().splitlines()]
+    assert [reject["row"] for reject in rejected] == [4, 7]
+    assert "sku_name" in rejected[1]["errors"]
+
+
+def test_ingest_csv_updates():
+    with app.app_context():
+        pis.ingest(ndjson([good(0)]), processes=1)
+    product_id = session.query(Product.id).filter(Product.sku_name == SKU_PREFIX + "00").scalar()
+
+    source = io.StringIO("id,product_name,sku_name,standard_price\n"
+                         "%d,ingest-updated,%s00,2\n"
+                         ",ingest-01,%s01,\n" % (product_id, SKU_PREFIX, SKU_PREFIX))
+    with app.app_context():
+        result = pis.ingest(source, fmt="csv", processes=2)
+
+    assert result == IngestResult(2, 2, 0)
+    assert ingested() == ["ingest-updated", "ingest-01"]
+
+
+def test_integrity_error_rejects_chunk():
+    records = [good(i) for i in range(6)]
+    del records[4]["product_name"]
+
+    errors = io.StringIO()
+    with app.app_context():
+        result = pis.ingest(ndjson(records), errors=errors, processes=1, chunk_size=3)
+
+    # 第二块整块回滚, 其他块继续写入
+    assert result == IngestResult(6, 3, 3)
+    assert ingested() == ["ingest-00", "ingest-01", "ingest-02"]
+    assert [json.loads(line)["row"] for line in errors.getvalue().splitlines()] == [4, 5, 6]
+
+
+def test_unknown_pk_rejects_chunk():
+    records = [good(0), dict(good(1), id=999999), good(2)]
+
+    errors = io.StringIO()
+    with app.app_context():
+        result = pis.ingest(ndjson(records), errors=errors, processes=1, chunk_size=2)
+
+    # 更新不存在的主键时bulk_update_mappings抛出StaleDataError, 第一块整块回滚
+    assert result == IngestResult(3, 1, 2)
+    assert ingested() == ["ingest-02"]
+    assert [json.loads(line)["row"] for line in errors.getvalue().splitlines()] == [1, 2]
+
+
+def test_ingest_in_process_keeps_session():
+    with app.app_context():
+        pis.ingest(ndjson([good(0)]), processes=1)
+        product = session.query(Product).filter(Product.sku_name == SKU_PREFIX + "00").one()
+
+        pis.ingest(ndjson([good(1)]), processes=1)
+        assert product in session
@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+"""
+测试LoaderMixin一页数据的查询次数是固定的, Loader(many=True)返回列表, 以及找不到关联数据时使用default
+
+"""
+from types import SimpleNamespace
+
+import pytest
+from marshmallow import fields
+from sqlalchemy import event
+from sqlalchemy.sql.operators import eq
+
+from flask_serializer.func_field.filter import Filter
+from flask_serializer.func_field.loader import Loader
+from flask_serializer.func_field.query import Query
+from flask_serializer.mixins.lists import ListMixin
+from flask_serializer.mixins.loader import LoaderMixin
+from test.test_app import app, db, fs, session
+from test.test_models import Order, OrderLine, Product
+
+
+class OrderLineLoaderSchema(LoaderMixin, ListMixin, fs.Schema):
+    __model__ = OrderLine
+
+    id = fields.Integer(query=Query())
+    product_id = fields.Integer(query=Query())
+    order_id = fields.Integer(query=Query(), filter=Filter(eq), load_only=True)
+    product_name = fields.String(dump_only=True, loader=Loader("Product.product_name", key="product_id",
+                                                               default="unknown"))
+    order_no = fields.String(dump_only=True, attribute="order_number", loader=Loader(Order.order_no, key="order_id"))
+    siblings = fields.List(fields.Integer(), dump_only=True,
+                           loader=Loader(OrderLine.id, key="order_id", target_key=OrderLine.order_id, many=True))
+
+    def order_by(self, data):
+        return OrderLine.id
+
+
+@pytest.fixture(scope="module")
+def order():
+    products = [Product(product_name="loader-%d" % i, sku_name="LOADER-%d" % i) for i in range(3)]
+    session.add_all(products)
+    session.flush()
+
+    instance = Order(order_no="LOADER-ORDER")
+    instance.order_lines = [OrderLine(product_id=products[i % 3].id, price=1, quantities=i) for i in range(9)]
+    session.add(instance)
+    session.commit()
+    # 每个测试的app context结束时session会被移除, 只返回需要的值
+    lines = sorted(instance.order_lines, key=lambda line: line.id)
+    return SimpleNamespace(id=instance.id, line_ids=[line.id for line in lines],
+                           product_ids=[line.product_id for line in lines])
+
+
+@pytest.fixture
+def statements():
+    executed = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        executed.append(statement)
+
+    event.listen(db.engine, "before_cursor_execute", capture)
+    yield executed
+    event.remove(db.engine, "before_cursor_execute", capture)
+
+
+@pytest.mark.parametrize("limit", [1, 4, 9])
+def test_fixed_queries_per_page(order, statements, limit):
+    schema = OrderLineLoaderSchema()
+    with app.app_context(), app.test_request_context():
+        rows = schema.load({"limit": limit, "offset": 0, "order_id": order.id})
+        del statements[:]
+        dumped = schema.dump(rows, many=True)
+        # 每个Loader字段一条IN查询, 和这一页的行数无关
+        assert len(statements) == 3
+
+        # 同一个请求中已经查询过的key不会再查询
+        del statements[:]
+        assert schema.dump(rows, many=True) == dumped
+        assert statements == []
+
+    for row in dumped:
+        row["siblings"].sort()
+    assert dumped == [dict(id=line_id, product_id=product_id, product_name="loader-%d" % (i % 3),
+                           order_no="LOADER-ORDER", siblings=order.line_ids)
+                      for i, (line_id, product_id) in enumerate(zip(order.line_ids[:limit], order.product_ids))]
+
+
+def test_default(order, statements):
+    missing = SimpleNamespace(id=0, product_id=-1, order_id=-1)
+    with app.app_context(), app.test_request_context():
+        dumped = OrderLineLoaderSchema().dump(missing)
+    assert dumped == dict(id=0, product_id=-1, product_name="unknown", order_no=None, siblings=[])
+
+
+def test_only(order, statements):
+    line = SimpleNamespace(id=order.line_ids[0], product_id=order.product_ids[0], order_id=order.id)
+    with app.app_context(), app.test_request_context():
+        dumped = OrderLineLoaderSchema(only=("id", "order_no")).dump(line)
+    assert dumped == dict(id=line.id, order_no="LOADER-ORDER")
+    assert len(statements) == 1
@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+"""
+测试BulkMutationMixin批量修改和删除, 没有过滤条件时拒绝, 执行之后检查实际影响的行数, 以及移出片段缓存
+
+"""
+import pytest
+from marshmallow import fields
+from marshmallow.exceptions import ValidationError
+from sqlalchemy.sql.operators import eq, like_op
+
+from flask_serializer.func_field.filter import Filter
+from flask_serializer.mixins.fragment import FragmentCacheMixin
+from flask_serializer.mixins.mutation import BulkMutationMixin, MutationResult
+from test.test_app import fs, session
+from test.test_models import OrderLine, Product
+
+SKU_PREFIX = "MUTATION-"
+
+
+class ProductDeactivateSchema(BulkMutationMixin, fs.Schema):
+    __model__ = Product
+    update_values = {"is_active": False}
+    mutation_max_rows = 5
+
+    sku_name = fields.String(filter=Filter(like_op))
+
+
+class ProductDeleteSchema(BulkMutationMixin, fs.Schema):
+    __model__ = Product
+    mutation = "delete"
+    mutation_chunk_size = 3
+
+    sku_name = fields.String(filter=Filter(like_op))
+    is_active = fields.Boolean(filter=Filter(eq))
+
+
+class ProductJoinDeactivateSchema(ProductDeactivateSchema):
+    mutation_max_rows = None
+
+    def modify_before_query(self, query, data):
+        return query.outerjoin(OrderLine, OrderLine.product_id == Product.id)
+
+
+class ProductAllSchema(ProductDeactivateSchema):
+    mutation_max_rows = None
+    mutation_allow_all = True
+
+
+class ProductFragmentSchema(FragmentCacheMixin, fs.Schema):
+    __model__ = Product
+
+    id = fields.Integer()
+    is_active = fields.Boolean()
+
+
+@pytest.fixture(autouse=True)
+def products():
+    session.add_all([Product(product_name="mutation-%02d" % i, sku_name="%s%d-%02d" % (SKU_PREFIX, i % 3, i))
+                     for i in range(12)])
+    session.commit()
+    yield
+    session.rollback()
+    session.query(Product).filter(Product.sku_name.like(SKU_PREFIX + "%")).delete(synchronize_session=False)
+    session.commit()
+
+
+def active(prefix=SKU_PREFIX):
+    return session.query(Product).filter(Product.sku_name.like(prefix + "%"), Product.is_active.is_(True)).count()
+
+
+def test_update_and_dry_run():
+    data = {"sku_name": SKU_PREFIX + "1"}
+    assert ProductDeactivateSchema().load(dict(data, dry_run=True)) == MutationResult(4, True)
+    assert active() == 12
+
+    assert ProductDeactivateSchema().load(data) == MutationResult(4, False)
+    session.commit()
+    assert active() == 8
+    assert active(SKU_PREFIX + "1") == 0
+
+
+def test_max_rows():
+    with pytest.raises(ValidationError):
+        ProductDeactivateSchema().load({"sku_name": SKU_PREFIX})
+    assert active() == 12
+
+
+def test_max_rows_checked_after_execute(monkeypatch):
+    # 计数之后又有新的数据满足条件
+    monkeypatch.setattr(ProductDeactivateSchema, "mutation_count", lambda self, data: 0)
+    # 调用者还没有提交的修改
+    session.add(Product(product_name="mutation-pending", sku_name=SKU_PREFIX + "PENDING"))
+    with pytest.raises(ValidationError):
+        ProductDeactivateSchema().load({"sku_name": SKU_PREFIX})
+    # 只回滚到执行之前的SAVEPOINT
+    assert active() == 13
+    session.commit()
+    assert active(SKU_PREFIX + "PENDING") == 1
+
+
+def test_chunked_delete():
+    ProductDeactivateSchema().load({"sku_name": SKU_PREFIX + "2"})
+    session.commit()
+
+    assert ProductDeleteSchema().load({"sku_name": SKU_PREFIX, "is_active": False}) == MutationResult(4, False)
+    assert session.query(Product).filter(Product.sku_name.like(SKU_PREFIX + "%")).count() == 8
+
+
+def test_join_condition():
+    assert ProductJoinDeactivateSchema().load({"sku_name": SKU_PREFIX + "0"}) == MutationResult(4, False)
+    session.commit()
+    assert active(SKU_PREFIX + "0") == 0
+    assert active() == 8
+
+
+def test_refuse_without_filters():
+    for schema in (ProductDeactivateSchema(), ProductDeleteSchema()):
+        with pytest.raises(ValidationError):
+            schema.load({})
+    assert active() == 12
+
+    # dry_run不会修改数据
+    assert ProductDeleteSchema().load({"dry_run": True}).dry_run
+
+
+def test_allow_all():
+    rows = ProductAllSchema().load({}).rows
+    assert rows == session.query(Product).count()
+    assert active() == 0
+    session.rollback()
+
+
+def test_evict_fragments():
+    products = session.query(Product).filter(Product.sku_name.like(SKU_PREFIX + "%")).order_by(Product.id).all()
+    schema = ProductFragmentSchema()
+    assert all(row["is_active"] for row in schema.dump(products, many=True))
+
+    ProductDeactivateSchema().load({"sku_name": SKU_PREFIX + "1"})
+    session.commit()
+
+    # update_date是DATE类型, 同一天内的修改只能依靠主动删除
+    dumped = {row["id"]: row["is_active"] for row in schema.dump(products, many=True)}
+    assert dumped == {product.id: not product.sku_name.startswith(SKU_PREFIX + "1") for product in products}
@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+"""
+测试PartialUpdateMixIn直接UPDATE, 乐观锁, 404以及非Column字段退回DetailMixIn的更新方式
+
+"""
+import pytest
+from marshmallow import fields
+from marshmallow.exceptions import ValidationError
+from sqlalchemy import Column, INTEGER, VARCHAR
+from werkzeug.exceptions import NotFound
+
+from flask_serializer.mixins.details import PartialUpdateMixIn
+from test.test_app import db, fs, session
+
+
+class VersionedItem(db.Model):
+    __tablename__ = "versioned_item"
+
+    id = Column(INTEGER, primary_key=True, autoincrement=True)
+    name = Column(VARCHAR(64), nullable=False)
+    version = Column(INTEGER, nullable=False, default=1)
+
+    @property
+    def label(self):
+        return self.name
+
+    @label.setter
+    def label(self, value):
+        self.name = value.upper()
+
+
+class VersionedItemSchema(PartialUpdateMixIn, fs.Schema):
+    __model__ = VersionedItem
+    version_column = "version"
+
+    id = fields.Integer()
+    name = fields.String()
+    version = fields.Integer()
+    label = fields.String(load_only=True)
+
+
+vis = VersionedItemSchema()
+
+
+@pytest.fixture(scope="module", autouse=True)
+def table():
+    VersionedItem.__table__.create(db.engine, checkfirst=True)
+    yield
+    session.remove()
+    VersionedItem.__table__.drop(db.engine)
+
+
+@pytest.fixture
+def item():
+    instance = VersionedItem(name="item")
+    session.add(instance)
+    session.commit()
+    return instance.id
+
+
+def test_partial_update(item):
+    row = vis.load(dict(id=item, name="renamed", version=1), partial=True)
+    assert (row.id, row.name, row.version) == (item, "renamed", 2)
+    session.commit()
+
+
+def test_partial_update_without_version(item):
+    row = vis.load(dict(id=item, name="renamed"), partial=True)
+    assert (row.name, row.version) == ("renamed", 1)
+    session.commit()
+
+
+def test_partial_update_stale_version(item):
+    vis.load(dict(id=item, name="first", version=1), partial=True)
+    with pytest.raises(ValidationError) as e:
+        vis.load(dict(id=item, name="second", version=1), partial=True)
+    assert "version" in e.value.messages
+    session.commit()
+    assert session.query(VersionedItem.name).filter(VersionedItem.id == item).scalar() == "first"
+
+
+def test_partial_update_not_found():
+    with pytest.raises(NotFound):
+        vis.load(dict(id=987654321, name="missing", version=1), partial=True)
+    with pytest.raises(NotFound):
+        vis.load(dict(id=987654321, name="missing"), partial=True)
+    session.rollback()
+
+
+def test_partial_update_falls_back_for_non_column(item):
+    # label不是Column, 使用DetailMixIn的方式更新, 返回模型实例
+    instance = vis.load(dict(id=item, label="label"), partial=True)
+    assert isinstance(instance, VersionedItem)
+    assert instance.name == "LABEL"
+    session.commit()
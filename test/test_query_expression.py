@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+"""
+测试Query/Filter使用表达式, 函数和关联子查询, 以及`Filter(having=True)`把条件放在HAVING中
+
+"""
+from decimal import Decimal
+
+import pytest
+from marshmallow import fields
+from sqlalchemy import func, select
+from sqlalchemy.sql.operators import ge
+
+from flask_serializer.func_field.filter import Filter
+from flask_serializer.func_field.query import Query
+from flask_serializer.mixins.lists import ListMixin
+from test.test_app import fs, session
+from test.test_models import Order, OrderLine, Product
+
+
+def line_count(model):
+    return select([func.count(OrderLine.id)]).where(OrderLine.order_id == model.id).as_scalar()
+
+
+class OrderLineTotalSchema(ListMixin, fs.Schema):
+    __model__ = OrderLine
+
+    id = fields.Integer(query=Query())
+    total_price = fields.Decimal(as_string=True, query=Query(OrderLine.price * OrderLine.quantities),
+                                 filter=Filter(ge, lambda m: m.price * m.quantities))
+
+
+class OrderLineCountSchema(ListMixin, fs.Schema):
+    __model__ = "Order"
+
+    id = fields.Integer(query=Query())
+    line_count = fields.Integer(query=Query(line_count), filter=Filter(ge, line_count))
+
+
+class OrderAmountSchema(ListMixin, fs.Schema):
+    __model__ = Order
+
+    id = fields.Integer(query=Query(Order.id))
+    amount = fields.Decimal(as_string=True, query=Query(func.sum(OrderLine.price * OrderLine.quantities)),
+                            filter=Filter(ge, func.sum(OrderLine.price * OrderLine.quantities), having=True))
+
+    def modify_before_query(self, query, data):
+        return query.join(OrderLine, OrderLine.order_id == Order.id).group_by(Order.id)
+
+    def order_by(self, data):
+        return Order.id
+
+
+PAGE = dict(limit=1000, offset=0)
+
+
+@pytest.fixture(scope="module")
+def orders():
+    """3个订单分别有1, 2, 3行, 第i行的单价为2, 数量为i"""
+    product = Product(product_name="EXPRESSION-PRODUCT", sku_name="EX0001")
+    session.add(product)
+    session.flush()
+
+    instances = []
+    for n in range(1, 4):
+        order = Order(order_no="EXPRESSION-%d" % n)
+        order.order_lines = [OrderLine(product_id=product.id, price=2, quantities=i) for i in range(1, n + 1)]
+        instances.append(order)
+    session.add_all(instances)
+    session.commit()
+    return instances
+
+
+def load(schema, **data):
+    return schema.load(dict(PAGE, **data))
+
+
+def test_expression_query(orders):
+    line_ids = {line.id for order in orders for line in order.order_lines}
+    rows = [row for row in load(OrderLineTotalSchema(), total_price="4") if row.id in line_ids]
+    assert sorted(Decimal(row.total_price) for row in rows) == [Decimal(4), Decimal(4), Decimal(6)]
+
+
+def test_correlated_subquery(orders):
+    order_ids = {order.id: len(order.order_lines) for order in orders}
+    rows = [row for row in load(OrderLineCountSchema(), line_count=2) if row.id in order_ids]
+    assert sorted((row.id, row.line_count) for row in rows) == [(order.id, len(order.order_lines))
+                                                                for order in orders[1:]]
+    assert all(order_ids[row.id] == row.line_count for row in rows)
+
+
+def test_having(orders):
+    schema = OrderAmountSchema()
+    amounts = {order.id: sum(Decimal(2) * line.quantities for line in order.order_lines) for order in orders}
+
+    rows = [row for row in load(schema, amount="6") if row.id in amounts]
+    # 金额分别为2, 6, 12
+    assert [(row.id, Decimal(row.amount)) for row in rows] == [(order.id, amounts[order.id]) for order in orders[1:]]
+
+    sql = str(schema.to_sql(schema.load_data(dict(PAGE, amount="6"))))
+    assert "sum(" not in sql.split("WHERE")[1].split("GROUP BY")[0]
+    assert "HAVING sum(order_line.price * order_line.quantities) >=" in sql
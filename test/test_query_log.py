@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+"""
+测试schema执行的SQL带有sqlcommenter注释, 超过阈值的查询会记录慢查询日志, 以及计时不会残留在连接上
+
+"""
+import pytest
+from marshmallow import fields
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.sql.operators import eq
+
+from flask_serializer.func_field.filter import Filter
+from flask_serializer.func_field.query import Query
+from flask_serializer.mixins.lists import ListMixin
+from flask_serializer.utils import query_log
+from test.test_app import db, fs
+from test.test_models import Product
+
+
+class ProductLogSchema(ListMixin, fs.Schema):
+    __model__ = Product
+
+    id = fields.Integer(query=Query())
+    sku_name = fields.String(filter=Filter(eq))
+
+
+@pytest.fixture(scope="module")
+def statements():
+    # 注释只会加在sql_context中执行的SQL上, 不影响其它测试
+    query_log.install(db.engine, comment=True)
+
+    executed = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        executed.append(statement)
+
+    event.listen(db.engine, "after_cursor_execute", capture)
+    yield executed
+    event.remove(db.engine, "after_cursor_execute", capture)
+
+
+def test_load_sql_comment(statements):
+    del statements[:]
+    ProductLogSchema().load({"sku_name": "sku", "limit": 10, "offset": 0})
+
+    assert statements
+    for statement in statements:
+        assert statement.endswith("/*mixin='ListMixin',schema='ProductLogSchema'*/")
+
+
+def test_no_comment_outside_schema(statements):
+    del statements[:]
+    db.session.execute(text("SELECT 1"))
+    assert statements == ["SELECT 1"]
+
+
+@pytest.mark.parametrize("threshold, logged", [(0, True), (60, False)])
+def test_slow_query_log(caplog, threshold, logged):
+    engine = create_engine(db.engine.url)
+    query_log.install(engine, comment=False, slow_threshold=threshold)
+
+    with caplog.at_level("WARNING", logger="flask_serializer.sql"):
+        with query_log.sql_context(ProductLogSchema()):
+            engine.execute(text("SELECT 1"))
+
+    records = [record for record in caplog.records if record.name == "flask_serializer.sql"]
+    assert bool(records) is logged
+    if logged:
+        message = records[0].getMessage()
+        assert message.startswith("慢查询")
+        assert "'schema': 'ProductLogSchema'" in message
+        assert "SELECT 1" in message
+    engine.dispose()
+
+
+def test_slow_query_timer_not_leaked():
+    engine = create_engine(db.engine.url)
+    query_log.install(engine, comment=False, slow_threshold=60)
+
+    # 后面的before_cursor_execute抛出异常时, after_cursor_execute和handle_error都不会执行
+    @event.listens_for(engine, "before_cursor_execute")
+    def refuse(conn, cursor, statement, parameters, context, executemany):
+        if "refused" in statement:
+            raise RuntimeError("refused")
+
+    with engine.connect() as connection:
+        for _ in range(3):
+            with pytest.raises(RuntimeError):
+                connection.execute(text("SELECT 'refused'"))
+        assert connection.execute(text("SELECT 1")).scalar() == 1
+        assert not any(key.startswith("flask_serializer") for key in connection.info)
+    engine.dispose()
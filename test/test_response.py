@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+"""
+测试dump_response根据Accept选择格式, Decimal/date的编码, 以及stream=True的输出和一次性输出相同
+
+"""
+import datetime
+import decimal
+import json
+
+import pytest
+from marshmallow import Schema, fields
+
+from flask_serializer.utils import response
+from flask_serializer.utils.response import JSON, MSGPACK, ENCODERS, dump_response
+from test.test_app import app
+
+
+class ItemSchema(Schema):
+    id = fields.Integer()
+    name = fields.String()
+    price = fields.Decimal()
+    # Raw字段不做转换, 由编码器处理date/datetime
+    day = fields.Raw()
+    created = fields.Raw()
+
+
+ITEMS = [dict(id=i, name="商品-%d" % i, price=decimal.Decimal("%d.10" % i),
+              day=datetime.date(2020, 9, i % 28 + 1), created=datetime.datetime(2020, 9, 16, 12, 0, i % 60))
+         for i in range(25)]
+
+
+def respond(headers=None, **kwargs):
+    with app.test_request_context(headers=headers or {}):
+        resp = dump_response(ItemSchema(), ITEMS, many=True, **kwargs)
+        return resp.mimetype, b"".join(resp.response)
+
+
+def test_default_json():
+    mimetype, body = respond()
+    assert mimetype == JSON
+    assert json.loads(body.decode("utf-8"))[1] == dict(id=1, name="商品-1", price="1.10", day="2020-09-02",
+                                                       created="2020-09-16T12:00:01")
+
+
+def test_json_without_orjson(monkeypatch):
+    expected = respond()[1]
+    monkeypatch.setattr(response, "orjson", None)
+    assert json.loads(respond()[1].decode("utf-8")) == json.loads(expected.decode("utf-8"))
+
+
+def test_accept_negotiation(monkeypatch):
+    monkeypatch.setitem(ENCODERS, "application/x-test", lambda obj: b"x-test")
+
+    assert respond({"Accept": "application/x-test"}) == ("application/x-test", b"x-test")
+    assert respond({"Accept": "application/x-test;q=0.5, application/json"})[0] == JSON
+    # 不支持的格式使用JSON
+    assert respond({"Accept": "text/html"})[0] == JSON
+    # 显式传入的mimetype优先
+    assert respond({"Accept": "application/x-test"}, mimetype=JSON)[0] == JSON
+
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 25, 1000])
+def test_stream_equals_non_stream(chunk_size):
+    assert respond(stream=True, chunk_size=chunk_size) == respond()
+
+
+def test_stream_empty():
+    with app.test_request_context():
+        resp = dump_response(ItemSchema(), [], many=True, stream=True)
+        assert b"".join(resp.response) == b"[]"
+
+
+@pytest.mark.skipif(MSGPACK not in ENCODERS, reason="没有安装msgpack")
+def test_msgpack():
+    import msgpack
+
+    headers = {"Accept": MSGPACK}
+    mimetype, body = respond(headers)
+    assert mimetype == MSGPACK
+    assert msgpack.unpackb(body, raw=False)[1]["price"] == "1.10"
+    assert respond(headers, stream=True, chunk_size=7) == (mimetype, body)
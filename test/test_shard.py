@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+"""
+测试ShardMixin: SQLALCHEMY_BINDS指向多个SQLite文件, 多路归并之后的顺序和offset/limit, 计数相加, 以及分片键路由
+
+"""
+import os
+
+import pytest
+from marshmallow import fields
+from sqlalchemy import desc, event
+from sqlalchemy.orm import Session
+from sqlalchemy.sql.operators import eq
+
+from flask_serializer.func_field.filter import Filter
+from flask_serializer.func_field.query import Query
+from flask_serializer.mixins.lists import CountMixin, ListMixin, ListModelMixin
+from flask_serializer.mixins.shard import ShardMixin
+from test.test_app import app, db, fs
+from test.test_models import Product
+
+SHARDS = ("shard_a", "shard_b", "shard_c")
+
+
+class ShardedProductMixin(object):
+    __model__ = Product
+    shard_binds = SHARDS
+    shard_key = "sku_name"
+    shard_map = {"a": "shard_a", "b": "shard_b", "c": "shard_c"}
+
+
+class ProductShardModelSchema(ShardedProductMixin, ShardMixin, ListModelMixin, fs.Schema):
+    id = fields.Integer()
+    product_name = fields.String()
+    sku_name = fields.String(filter=Filter(eq))
+
+    def order_by(self, data):
+        return desc(Product.product_name)
+
+
+class ProductShardListSchema(ShardedProductMixin, ShardMixin, ListMixin, fs.Schema):
+    id = fields.Integer(query=Query())
+    product_name = fields.String(query=Query())
+    sku_name = fields.String(query=Query(), filter=Filter(eq))
+
+    def order_by(self, data):
+        return Product.product_name
+
+
+class ProductShardCountSchema(ShardedProductMixin, ShardMixin, CountMixin, fs.Schema):
+    sku_name = fields.String(filter=Filter(eq))
+
+
+@pytest.fixture(scope="module")
+def shards(tmpdir_factory):
+    """每个分片10行, product_name在分片之间交错, sku_name是分片的名字"""
+    tmpdir = tmpdir_factory.mktemp("shards")
+    binds = app.config.get("SQLALCHEMY_BINDS")
+    app.config["SQLALCHEMY_BINDS"] = {bind: "sqlite:///" + os.path.join(str(tmpdir), bind + ".db") for bind in SHARDS}
+
+    rows = []
+    for i, bind in enumerate(SHARDS):
+        engine = db.get_engine(app, bind=bind)
+        Product.__table__.create(engine)
+        session = Session(bind=engine)
+        for k in range(10):
+            product = Product(id=i * 100 + k, product_name="product-%02d" % (k * 3 + i), sku_name=bind[-1])
+            session.add(product)
+            rows.append((product.product_name, product.id))
+        session.commit()
+        session.close()
+
+    yield sorted(rows)
+
+    for bind in SHARDS:
+        db.get_engine(app, bind=bind).dispose()
+    app.config["SQLALCHEMY_BINDS"] = binds
+
+
+@pytest.fixture
+def executed(shards):
+    """:return: {bind: 执行的SQL数量}"""
+    counts = dict.fromkeys(SHARDS, 0)
+    listeners = []
+    for bind in SHARDS:
+        def count(conn, cursor, statement, parameters, context, executemany, bind=bind):
+            counts[bind] += 1
+
+        engine = db.get_engine(app, bind=bind)
+        event.listen(engine, "before_cursor_execute", count)
+        listeners.append((engine, count))
+    yield counts
+    for engine, count in listeners:
+        event.remove(engine, "before_cursor_execute", count)
+
+
+@pytest.mark.parametrize("limit, offset", [(7, 0), (7, 4), (5, 26), (10, 40)])
+def test_merge_order(shards, executed, limit, offset):
+    expected = [product_id for _, product_id in reversed(shards)][offset:offset + limit]
+    with app.app_context():
+        rows = ProductShardModelSchema().load({"limit": limit, "offset": offset})
+    assert [row.id for row in rows] == expected
+    assert all(count == 1 for count in executed.values())
+
+
+def test_merge_rows(shards):
+    with app.app_context():
+        schema = ProductShardListSchema()
+        dumped = schema.dump(schema.load({"limit": 4, "offset": 2}), many=True)
+    assert dumped == [{"id": product_id, "product_name": name, "sku_name": "abc"[product_id // 100]}
+                      for name, product_id in shards[2:6]]
+
+
+def test_count(shards):
+    with app.app_context():
+        assert ProductShardCountSchema().load({}) == 30
+        assert ProductShardCountSchema().load({"sku_name": "b"}) == 10
+        # 不能确定分片时查询所有的分片
+        assert ProductShardCountSchema().load({"sku_name": "z"}) == 0
+
+
+def test_route_by_shard_key(shards, executed):
+    with app.app_context():
+        rows = ProductShardModelSchema().load({"limit": 3, "offset": 0, "sku_name": "b"})
+    assert [row.id for row in rows] == [109, 108, 107]
+    assert executed == {"shard_a": 0, "shard_b": 1, "shard_c": 0}
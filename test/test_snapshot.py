@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+"""
+测试SnapshotMixin翻页时顺序不受新插入数据的影响, 超过snapshot_max_rows时标记为截断, 以及过滤条件和创建快照时不一致时拒绝
+
+"""
+import pytest
+from marshmallow import fields
+from marshmallow.exceptions import ValidationError
+from sqlalchemy import desc
+from sqlalchemy.sql.operators import eq
+
+from flask_serializer.func_field.filter import Filter
+from flask_serializer.func_field.query import Query
+from flask_serializer.mixins.lists import ListMixin, ListModelMixin
+from flask_serializer.mixins.snapshot import SnapshotMixin
+from test.test_app import fs, session
+from test.test_models import Product
+
+SKU_PREFIX = "SNAPSHOT-"
+
+
+class ProductSnapshotModelSchema(SnapshotMixin, ListModelMixin, fs.Schema):
+    __model__ = Product
+
+    id = fields.Integer()
+    product_name = fields.String()
+    sku_name = fields.String(filter=Filter(eq))
+
+    def order_by(self, data):
+        return desc(Product.product_name)
+
+
+class ProductSnapshotListSchema(SnapshotMixin, ListMixin, fs.Schema):
+    __model__ = Product
+
+    id = fields.Integer(query=Query())
+    product_name = fields.String(query=Query())
+    sku_name = fields.String(query=Query(), filter=Filter(eq))
+
+    def order_by(self, data):
+        return desc(Product.product_name)
+
+
+@pytest.fixture(autouse=True)
+def products():
+    session.add_all([Product(product_name="snapshot-%02d" % i, sku_name="%s%d" % (SKU_PREFIX, i % 2))
+                     for i in range(10)])
+    session.commit()
+    yield
+    session.query(Product).filter(Product.sku_name.like(SKU_PREFIX + "%")).delete(synchronize_session=False)
+    session.commit()
+    # 批量删除不会同步identity map, SQLite会重复使用被删除的主键
+    session.remove()
+
+
+@pytest.mark.parametrize("schema_class", [ProductSnapshotModelSchema, ProductSnapshotListSchema])
+def test_snapshot_pages(schema_class):
+    schema = schema_class()
+    data = {"page": 1, "size": 3, "sku_name": SKU_PREFIX + "0"}
+    first = schema.load(data)
+    assert first.total == 5
+    assert [row.product_name for row in first.rows] == ["snapshot-08", "snapshot-06", "snapshot-04"]
+
+    # 新插入的数据排在最前面, 不会使快照的分页错位
+    session.add(Product(product_name="snapshot-99", sku_name=SKU_PREFIX + "0"))
+    session.commit()
+
+    second = schema.load(dict(data, page=2, snapshot=first.snapshot))
+    assert (second.snapshot, second.total) == (first.snapshot, 5)
+    assert [row.product_name for row in second.rows] == ["snapshot-02", "snapshot-00"]
+
+    assert schema.load(data).total == 6
+    assert not first.truncated
+
+
+@pytest.mark.parametrize("schema_class", [ProductSnapshotModelSchema, ProductSnapshotListSchema])
+def test_snapshot_truncated(schema_class, monkeypatch):
+    monkeypatch.setattr(schema_class, "snapshot_max_rows", 4)
+    schema = schema_class()
+    data = {"page": 1, "size": 3, "sku_name": SKU_PREFIX + "0"}
+    first = schema.load(data)
+    assert (first.total, first.truncated) == (4, True)
+
+    second = schema.load(dict(data, page=2, snapshot=first.snapshot))
+    assert (second.total, second.truncated) == (4, True)
+    assert [row.product_name for row in second.rows] == ["snapshot-02"]
+
+    # 正好等于snapshot_max_rows时没有被截断
+    monkeypatch.setattr(schema_class, "snapshot_max_rows", 5)
+    assert (schema.load(data).total, schema.load(data).truncated) == (5, False)
+
+
+@pytest.mark.parametrize("schema_class", [ProductSnapshotModelSchema, ProductSnapshotListSchema])
+def test_snapshot_rejects_other_filters(schema_class):
+    schema = schema_class()
+    first = schema.load({"page": 1, "size": 3, "sku_name": SKU_PREFIX + "0"})
+
+    for data in ({"page": 2, "size": 3, "snapshot": first.snapshot},
+                 {"page": 2, "size": 3, "snapshot": first.snapshot, "sku_name": SKU_PREFIX + "1"}):
+        with pytest.raises(ValidationError) as e:
+            schema.load(data)
+        assert "snapshot" in e.value.messages
+
+
+def test_snapshot_expired():
+    with pytest.raises(ValidationError) as e:
+        ProductSnapshotModelSchema().load({"page": 1, "size": 3, "snapshot": "expired"})
+    assert "snapshot" in e.value.messages
@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+"""
+测试语句超时: 有超时的schema完整地执行完(包括yield_per), 慢查询被数据库中断并抛出StatementTimeout,
+以及超时的设置不会影响load之后的语句
+
+"""
+import time
+
+import pytest
+from marshmallow import fields
+from sqlalchemy import literal_column, text
+from sqlalchemy.sql.operators import like_op
+
+from flask_serializer.func_field.filter import Filter
+from flask_serializer.func_field.query import Query
+from flask_serializer.mixins.lists import ListMixin, ListModelMixin
+from flask_serializer.utils import timeout
+from flask_serializer.utils.timeout import StatementTimeout, timeout_stats
+from test.test_app import db, fs, session
+from test.test_models import Product
+
+DIALECT = db.engine.dialect.name
+
+# 执行大约seconds秒的标量子查询
+SLOW_SQL = {
+    "sqlite": "(WITH RECURSIVE c(x) AS (SELECT 1 UNION ALL SELECT x + 1 FROM c WHERE x < %d) SELECT count(*) FROM c)",
+    "postgresql": "(SELECT count(*) FROM pg_sleep(%s))",
+}
+
+pytestmark = pytest.mark.skipif(DIALECT not in SLOW_SQL, reason="%s没有测试用的慢查询" % DIALECT)
+
+SKU_PREFIX = "TIMEOUT-"
+
+
+def slow_sql(seconds):
+    if DIALECT == "sqlite":
+        return SLOW_SQL[DIALECT] % (seconds * 10000000)
+    return SLOW_SQL[DIALECT] % seconds
+
+
+class ProductTimedSchema(ListModelMixin, fs.Schema):
+    __model__ = Product
+    statement_timeout = 5
+
+    id = fields.Integer()
+    product_name = fields.String()
+    sku_name = fields.String(filter=Filter(like_op))
+
+    def order_by(self, data):
+        return Product.id
+
+
+class ProductStreamSchema(ProductTimedSchema):
+    """yield_per在PostgreSQL中使用服务端游标"""
+
+    def to_sql(self, data):
+        return super(ProductStreamSchema, self).to_sql(data).yield_per(2)
+
+
+class ProductSlowSchema(ListMixin, fs.Schema):
+    __model__ = Product
+    statement_timeout = 0.2
+
+    id = fields.Integer(query=Query())
+    slow = fields.Integer(query=Query(lambda model: literal_column(slow_sql(10))))
+    sku_name = fields.String(filter=Filter(like_op))
+
+
+@pytest.fixture(scope="module", autouse=True)
+def products():
+    session.add_all([Product(product_name="timeout-%02d" % i, sku_name="%s%02d" % (SKU_PREFIX, i)) for i in range(7)])
+    session.commit()
+    yield
+    session.rollback()
+    session.query(Product).filter(Product.sku_name.like(SKU_PREFIX + "%")).delete(synchronize_session=False)
+    session.commit()
+    # 批量删除不会同步identity map, SQLite会重复使用被删除的主键
+    session.remove()
+
+
+def expected():
+    return ["timeout-%02d" % i for i in range(7)]
+
+
+@pytest.mark.parametrize("schema_class", [ProductTimedSchema, ProductStreamSchema])
+def test_timed_load_completes(schema_class):
+    rows = schema_class().load({"limit": 10, "offset": 0, "sku_name": SKU_PREFIX})
+    assert [row.product_name for row in rows] == expected()
+    assert db.engine in timeout._installed
+    session.commit()
+
+
+def test_timeout_not_leaked():
+    if DIALECT == "postgresql":
+        before = session.execute(text("SHOW statement_timeout")).scalar()
+
+    ProductTimedSchema().load({"limit": 10, "offset": 0, "sku_name": SKU_PREFIX}, timeout=0.1)
+
+    if DIALECT == "postgresql":
+        assert session.execute(text("SHOW statement_timeout")).scalar() == before
+    # load之后的语句不受限制
+    assert session.execute(text("SELECT " + slow_sql(0.3))).scalar()
+    session.commit()
+
+
+def test_statement_timeout():
+    start = time.time()
+    with pytest.raises(StatementTimeout) as e:
+        ProductSlowSchema().load({"limit": 1, "offset": 0, "sku_name": SKU_PREFIX})
+    assert time.time() - start < 5
+    assert e.value.code == 504
+    assert e.value.schema_name == "ProductSlowSchema"
+    assert (("ProductSlowSchema", ("limit", "offset", "sku_name")), 1) in timeout_stats()
+
+    # 回滚之后连接可以继续使用
+    session.rollback()
+    assert ProductTimedSchema().load({"limit": 10, "offset": 0, "sku_name": SKU_PREFIX})
+
+
+def test_timeout_per_load():
+    with pytest.raises(StatementTimeout) as e:
+        ProductSlowSchema().load({"limit": 1, "offset": 0, "sku_name": SKU_PREFIX}, timeout=0.1)
+    assert e.value.timeout == 0.1
+    session.rollback()
@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+"""
+测试UpsertMixIn一条语句完成创建和更新
+
+"""
+import pytest
+from marshmallow import fields
+
+from flask_serializer.mixins.details import UpsertMixIn, sqlite_insert
+from test.test_app import db, fs, session
+from test.test_models import Product
+
+DIALECT = db.engine.dialect.name
+
+pytestmark = pytest.mark.skipif(
+    DIALECT not in ("postgresql", "mysql", "sqlite") or (DIALECT == "sqlite" and sqlite_insert is None),
+    reason="%s不支持upsert" % DIALECT)
+
+
+class ProductUpsertSchema(UpsertMixIn, fs.Schema):
+    __model__ = Product
+
+    id = fields.Integer()
+    product_name = fields.String(required=True)
+    sku_name = fields.String(required=True)
+    standard_price = fields.Float()
+
+
+pus = ProductUpsertSchema()
+
+
+def test_upsert_create_and_update():
+    row = pus.load(dict(product_name="UPSERT-PRODUCT", sku_name="UP0001", standard_price=10))
+    assert row.product_name == "UPSERT-PRODUCT"
+
+    updated = pus.load(dict(id=row.id, product_name="UPSERT-PRODUCT-2", sku_name="UP0001"))
+    assert updated.id == row.id
+    assert updated.product_name == "UPSERT-PRODUCT-2"
+    assert updated.standard_price == row.standard_price
+    session.commit()
+
+
+def test_upsert_many():
+    row = pus.load(dict(product_name="UPSERT-PRODUCT", sku_name="UP0002"))
+    rows = pus.load([
+        dict(id=row.id, product_name="UPSERT-PRODUCT-3", sku_name="UP0002"),
+        dict(product_name="UPSERT-PRODUCT-4", sku_name="UP0003"),
+    ], many=True)
+    assert [r.product_name for r in rows] == ["UPSERT-PRODUCT-3", "UPSERT-PRODUCT-4"]
+    assert rows[0].id == row.id
+    session.commit()
+
+
+def test_upsert_many_rows_follow_data():
+    created = pus.load([dict(product_name="UPSERT-ORDER", sku_name="UP01%02d" % i) for i in range(5)], many=True)
+    # 主键倒序, 返回的行依然要和data一一对应
+    data = [dict(id=r.id, product_name="UPSERT-ORDER-%d" % r.id, sku_name=r.sku_name) for r in reversed(created)]
+    rows = pus.load(data, many=True)
+    assert [(r.id, r.product_name) for r in rows] == [(d["id"], d["product_name"]) for d in data]
+    session.commit()
+
+
+def test_match_returning_rows():
+    # RETURNING返回的顺序和VALUES不一致
+    values = [dict(id=1, sku_name="a"), dict(id=2, sku_name="b"), dict(id=3, sku_name="c")]
+    rows = [dict(id=3, sku_name="c"), dict(id=1, sku_name="a"), dict(id=2, sku_name="b")]
+    assert UpsertMixIn._match_rows(rows, values, [Product.__table__.c.id]) == values
@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+"""
+测试warmup时拼接SQL出现的配置错误会被记录, 依赖请求参数的schema会被跳过
+
+"""
+from marshmallow import fields
+from sqlalchemy.exc import InvalidRequestError
+from sqlalchemy.sql.operators import eq
+
+from flask_serializer import WarmupResult
+from flask_serializer.func_field.filter import Filter
+from flask_serializer.func_field.query import Query
+from flask_serializer.mixins.lists import ListMixin
+from test.test_app import fs
+from test.test_models import Order, Product
+
+
+class ProductWarmupSchema(ListMixin, fs.Schema):
+    __model__ = Product
+
+    id = fields.Integer(query=Query())
+    product_name = fields.String(filter=Filter(eq))
+
+
+class ProductNeedsDataSchema(ProductWarmupSchema):
+
+    def modify_before_query(self, query, data):
+        return query.filter(Product.sku_name == data["sku_name"])
+
+
+class ProductBrokenSchema(ProductWarmupSchema):
+
+    def modify_before_query(self, query, data):
+        # Product和Order之间没有外键, 是配置错误
+        return query.join(Order)
+
+
+def test_warmup_report(caplog):
+    with caplog.at_level("ERROR", logger="flask_serializer"):
+        report = fs.warmup()
+
+    assert isinstance(report[ProductWarmupSchema], WarmupResult)
+    assert report[ProductWarmupSchema].error is None
+    assert report[ProductNeedsDataSchema].error is None
+
+    error = report[ProductBrokenSchema].error
+    assert isinstance(error, InvalidRequestError)
+    messages = [record.getMessage() for record in caplog.records if record.name == "flask_serializer"]
+    assert "warmup ProductBrokenSchema时拼接SQL失败" in messages
+    assert "warmup ProductNeedsDataSchema时拼接SQL失败" not in messages